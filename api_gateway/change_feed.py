@@ -0,0 +1,303 @@
+# api_gateway/change_feed.py
+"""
+In-process pub/sub behind the push stream (`GET /api/stream`).
+
+Every data-version bump – from the scheduler or from the API itself –
+raises a Postgres NOTIFY (trigger from migration 4). `ChangeHub` LISTENs on
+one asyncpg connection and, for users with at least one open stream, loads
+the delta once and fans it out to all of that user's subscribers:
+
+    orders     rows whose last_updated moved (new orders, status changes)
+    trades     new fills
+    positions  the user's open positions
+    snapshot   the latest account snapshot
+    runners    the user's runners (activation changes)
+
+Events get a per-user sequence number and the last `STREAM_REPLAY_SIZE`
+are kept, so a client reconnecting with `Last-Event-ID` resumes without
+gaps; when that is not possible it gets a `reset` event and refetches over
+REST. Each subscriber has a bounded queue: a consumer that falls behind is
+not allowed to grow memory, its backlog is dropped and replaced by `reset`.
+
+The same connection LISTENs for user changes (migration 6) and drops the
+changed user from `principal_cache`, so a password or credential change made
+by any process takes effect here at once.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import secrets
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+import asyncpg
+import orjson
+from sqlalchemy.engine import make_url
+
+from api_gateway.security.auth import principal_cache
+from database import data_versions as dv
+from database.async_db_manager import AsyncDBManager
+from database.db_core import DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", 256))          # events per subscriber
+STREAM_REPLAY_SIZE = int(os.getenv("STREAM_REPLAY_SIZE", 512))        # events kept per user
+STREAM_FEED_LINGER = float(os.getenv("STREAM_FEED_LINGER", 300))      # s a feed survives its last subscriber
+STREAM_LISTEN_RETRY = float(os.getenv("STREAM_LISTEN_RETRY", 5))
+
+# writers stamp rows with their own clock and commit in any order: re-read
+# this far behind the watermark and drop what was already sent
+ORDER_OVERLAP = timedelta(seconds=5)
+TRADE_ID_OVERLAP = 256
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    seq: int
+    kind: str
+    data: Any
+
+    def sse(self, stream_id: str) -> bytes:
+        return b"id: %s:%d\nevent: %s\ndata: %s\n\n" % (
+            stream_id.encode(), self.seq, self.kind.encode(), orjson.dumps(self.data)
+        )
+
+
+class Subscription:
+    """One open stream. Iterate `get()`; `reset` events mean "refetch over REST"."""
+
+    def __init__(self, hub: "ChangeHub", user_id: int, stream_id: str, maxsize: int) -> None:
+        self.hub = hub
+        self.user_id = user_id
+        self.stream_id = stream_id               # prefix of this feed's event ids
+        self.queue: asyncio.Queue[ChangeEvent] = asyncio.Queue(maxsize)
+        self._overflowed = False
+
+    def push(self, event: ChangeEvent) -> None:
+        if self._overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # slow consumer: drop its backlog instead of buffering without bound
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(ChangeEvent(event.seq, "reset", {"reason": "overflow"}))
+            self._overflowed = True
+            logger.warning("stream of user=%s overflowed; sent reset", self.user_id)
+
+    async def get(self) -> ChangeEvent:
+        event = await self.queue.get()
+        if event.kind == "reset":
+            self._overflowed = False
+        return event
+
+
+class _UserFeed:
+    def __init__(self, user_id: int, stream_id: str) -> None:
+        self.user_id = user_id
+        self.stream_id = stream_id
+        self.seq = 0
+        self.replay: deque[ChangeEvent] = deque(maxlen=STREAM_REPLAY_SIZE)
+        self.subscribers: set[Subscription] = set()
+        self.idle_since: Optional[float] = None
+        self.ready = asyncio.Event()
+        # watermarks at subscribe time: older rows are never sent
+        self.order_base: Optional[datetime] = None
+        self.trade_base = 0
+        self.order_since: Optional[datetime] = None
+        self.sent_orders: dict[int, datetime] = {}
+        self.trade_after = 0
+        self.sent_trades: set[int] = set()
+        self.dirty: set[str] = set()
+        self.task: Optional[asyncio.Task] = None
+
+
+class ChangeHub:
+    def __init__(self, dsn: str = DATABASE_URL) -> None:
+        self.dsn = make_url(dsn).set(drivername="postgresql").render_as_string(hide_password=False)
+        # ids from another process, or from a feed since pruned, cannot resume
+        self._prefix = secrets.token_hex(4)
+        self._epochs = itertools.count(1)
+        self._feeds: dict[int, _UserFeed] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    # ───────────────────── lifecycle ─────────────────────
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._listen(), name="change-hub")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for feed in self._feeds.values():
+            if feed.task is not None:
+                feed.task.cancel()
+
+    async def _listen(self) -> None:
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(self.dsn)
+                await conn.add_listener(dv.CHANGE_CHANNEL, self._on_notify)
+                await conn.add_listener(dv.USER_CHANNEL, self._on_user_change)
+                logger.info("change hub listening on %r, %r", dv.CHANGE_CHANNEL, dv.USER_CHANNEL)
+                # anything committed while we were not listening is lost
+                self._reset_all("listener reconnected")
+                principal_cache.invalidate()
+                while not conn.is_closed():
+                    await asyncio.sleep(STREAM_LISTEN_RETRY)
+                    self._prune()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("change hub listener failed: %s", e)
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(STREAM_LISTEN_RETRY)
+
+    # ───────────────────── subscribe ─────────────────────
+    async def subscribe(self, user_id: int, last_event_id: Optional[str] = None) -> Subscription:
+        feed = self._feeds.get(user_id)
+        if feed is None:
+            feed = self._feeds[user_id] = _UserFeed(user_id, f"{self._prefix}.{next(self._epochs)}")
+            try:
+                async with AsyncDBManager() as db:
+                    feed.order_since, feed.trade_after = await db.get_change_watermarks(user_id=user_id)
+            except BaseException:
+                del self._feeds[user_id]
+                feed.ready.set()
+                raise
+            feed.order_base, feed.trade_base = feed.order_since, feed.trade_after
+            feed.ready.set()
+        await feed.ready.wait()
+        if self._feeds.get(user_id) is not feed:
+            return await self.subscribe(user_id, last_event_id)
+
+        sub = Subscription(self, user_id, feed.stream_id, STREAM_QUEUE_SIZE)
+        feed.subscribers.add(sub)
+        feed.idle_since = None
+        if last_event_id:
+            for event in self._resume(feed, last_event_id):
+                sub.push(event)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        feed = self._feeds.get(sub.user_id)
+        if feed is not None:
+            feed.subscribers.discard(sub)
+            if not feed.subscribers:
+                feed.idle_since = time.monotonic()
+
+    def _resume(self, feed: _UserFeed, last_event_id: str) -> list[ChangeEvent]:
+        stream, _, seq = last_event_id.partition(":")
+        try:
+            seq = int(seq)
+        except ValueError:
+            seq = -1
+        oldest = feed.replay[0].seq if feed.replay else feed.seq + 1
+        if stream != feed.stream_id or seq < oldest - 1 or seq > feed.seq:
+            return [ChangeEvent(feed.seq, "reset", {"reason": "cannot resume"})]
+        return [e for e in feed.replay if e.seq > seq]
+
+    # ───────────────────── publish ─────────────────────
+    def publish(self, user_id: int, kind: str, data: Any) -> None:
+        """Append an event to the user's feed (no-op without a feed)."""
+        feed = self._feeds.get(user_id)
+        if feed is None:
+            return
+        feed.seq += 1
+        event = ChangeEvent(feed.seq, kind, data)
+        feed.replay.append(event)
+        for sub in list(feed.subscribers):
+            sub.push(event)
+
+    def _reset_all(self, reason: str) -> None:
+        for user_id in list(self._feeds):
+            self.publish(user_id, "reset", {"reason": reason})
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for user_id, feed in list(self._feeds.items()):
+            if feed.idle_since is not None and now - feed.idle_since > STREAM_FEED_LINGER:
+                if feed.task is not None:
+                    feed.task.cancel()
+                del self._feeds[user_id]
+
+    def _on_notify(self, conn, pid, channel, payload: str) -> None:
+        try:
+            msg = json.loads(payload)
+            feed = self._feeds.get(int(msg["user_id"]))
+            resource = msg["resource"]
+        except (ValueError, KeyError, TypeError):
+            logger.warning("bad change notification %r", payload)
+            return
+        if feed is None or not feed.ready.is_set():
+            return
+        # bursts of bumps collapse into one load per resource
+        feed.dirty.add(resource)
+        if feed.task is None or feed.task.done():
+            feed.task = asyncio.create_task(self._drain(feed))
+
+    @staticmethod
+    def _on_user_change(conn, pid, channel, username: str) -> None:
+        principal_cache.invalidate(username)
+
+    async def _drain(self, feed: _UserFeed) -> None:
+        while feed.dirty:
+            resource = feed.dirty.pop()
+            try:
+                await self._load(feed, resource)
+            except Exception:
+                logger.exception("change feed load user=%s resource=%s failed", feed.user_id, resource)
+                self.publish(feed.user_id, "reset", {"reason": "load failed"})
+
+    async def _load(self, feed: _UserFeed, resource: str) -> None:
+        uid = feed.user_id
+        async with AsyncDBManager() as db:
+            if resource == dv.ORDERS:
+                since = feed.order_since - ORDER_OVERLAP if feed.order_since else None
+                rows = [r._asdict() for r in await db.get_orders_updated_since(user_id=uid, since=since)]
+                fresh = [r for r in rows if feed.sent_orders.get(r["id"]) != r["last_updated"]
+                         and (feed.order_base is None or r["last_updated"] > feed.order_base)]
+                stamps = [r["last_updated"] for r in rows if r["last_updated"] is not None]
+                if stamps:
+                    feed.order_since = max(stamps + ([feed.order_since] if feed.order_since else []))
+                    floor = feed.order_since - ORDER_OVERLAP
+                    feed.sent_orders = {r["id"]: r["last_updated"] for r in rows
+                                        if r["last_updated"] is not None and r["last_updated"] >= floor}
+                if fresh:
+                    self.publish(uid, "orders", fresh)
+            elif resource == dv.TRADES:
+                rows = await db.get_trades_after(user_id=uid, after_id=max(feed.trade_after - TRADE_ID_OVERLAP, 0))
+                fresh = [r._asdict() for r in rows if r.id > feed.trade_base and r.id not in feed.sent_trades]
+                if rows:
+                    feed.trade_after = max(feed.trade_after, rows[-1].id)
+                    floor = feed.trade_after - TRADE_ID_OVERLAP
+                    feed.sent_trades = {r.id for r in rows if r.id > floor}
+                if fresh:
+                    self.publish(uid, "trades", fresh)
+            elif resource == dv.POSITIONS:
+                self.publish(uid, "positions", [r._asdict() for r in await db.get_open_position_rows(user_id=uid)])
+            elif resource == dv.SNAPSHOT:
+                row = await db.get_latest_snapshot_row(user_id=uid)
+                if row is not None:
+                    self.publish(uid, "snapshot", row._asdict())
+            elif resource == dv.RUNNERS:
+                self.publish(uid, "runners", [r._asdict() for r in await db.get_runner_rows(user_id=uid)])
+
+
+change_hub = ChangeHub()
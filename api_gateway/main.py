@@ -1,8 +1,25 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from api_gateway.routes import runner_routes, auth_routes
+from api_gateway.change_feed import change_hub
+from api_gateway.routes import runner_routes, auth_routes, stream_routes
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await runner_routes.ib_pool.start()
+    await runner_routes.gateway_health.start()
+    await change_hub.start()
+    try:
+        yield
+    finally:
+        await change_hub.close()
+        await runner_routes.gateway_health.close()
+        await runner_routes.ib_pool.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -10,8 +27,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # Mount all routers under /api
 app.include_router(auth_routes.router,   prefix="/api")
-app.include_router(runner_routes.router, prefix="/api")
\ No newline at end of file
+app.include_router(runner_routes.router, prefix="/api")
+app.include_router(stream_routes.router, prefix="/api")
\ No newline at end of file
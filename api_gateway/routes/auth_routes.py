@@ -3,7 +3,7 @@ from fastapi import APIRouter, HTTPException, status, Depends
 
 from api_gateway.routes.schemas.auth import UserCreate, UserLogin, Token, UserPublic
 from api_gateway.security.auth import create_access_token, get_current_user
-from database.db_manager import DBManager
+from database.async_db_manager import AsyncDBManager
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,10 +11,10 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 
 # ───────── signup ─────────
 @router.post("/signup", response_model=UserPublic, status_code=201)
-def signup(payload: UserCreate):
-    with DBManager() as db:
+async def signup(payload: UserCreate):
+    async with AsyncDBManager() as db:
         try:
-            user = db.create_user(**payload.model_dump())
+            user = await db.create_user(**payload.model_dump())
             return user      # FastAPI converts via response_model
         except ValueError as e:
             raise HTTPException(status.HTTP_400_BAD_REQUEST, str(e))
@@ -24,9 +24,9 @@ def signup(payload: UserCreate):
 
 # ───────── login ─────────
 @router.post("/login", response_model=Token)
-def login(payload: UserLogin):
-    with DBManager() as db:
-        if (user := db.authenticate(**payload.model_dump())) is None:
+async def login(payload: UserLogin):
+    async with AsyncDBManager() as db:
+        if (user := await db.authenticate(**payload.model_dump())) is None:
             raise HTTPException(status.HTTP_401_UNAUTHORIZED,
                                 "Incorrect username or password")
         token = create_access_token(user.username)
@@ -34,5 +34,5 @@ def login(payload: UserLogin):
 
 # ───────── handy “who-am-I” endpoint ─────────
 @router.get("/me", response_model=UserPublic)
-def me(current=Depends(get_current_user)):
+async def me(current=Depends(get_current_user)):
     return current
\ No newline at end of file
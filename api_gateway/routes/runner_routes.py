@@ -1,23 +1,39 @@
 from __future__ import annotations
+import asyncio
 import socket
 from starlette.status import HTTP_200_OK
 import logging
-from datetime import datetime
-from typing import List
+from dataclasses import replace
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence
 
-from fastapi import APIRouter, Depends, HTTPException, Path
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response
+from fastapi.responses import ORJSONResponse
 from starlette.status import HTTP_504_GATEWAY_TIMEOUT
 
 from api_gateway.security.auth import get_current_user, User
 from api_gateway.routes.schemas.runner import RunnerCreate, RunnerIds
-from database.db_manager import DBManager
+from api_gateway.snapshot_service import SnapshotError, SnapshotService
+from database import data_versions as dv
+from database.async_db_manager import AsyncDBManager
+from database.history import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, Cursor, HistoryFilter
+from sqlalchemy import Row
 from sqlalchemy.inspection import inspect as sqla_inspect
 
-from ib_manager.ib_connector import IBBusinessManager
+from ib_manager.connection_pool import IBConnectionPool
+from ib_manager.gateway_health import GatewayHealthRegistry
+from strategy_engine.backtester import BacktestConfig, backtest_runner as run_runner_backtest
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# API-side IB connections; client ids are offset so they never collide with
+# the scheduler's (which uses `user.id`). Started/stopped by `main.lifespan`.
+IB_API_CLIENT_ID_OFFSET = 100
+ib_pool = IBConnectionPool(client_id_offset=IB_API_CLIENT_ID_OFFSET, idle_timeout=15 * 60)
+gateway_health = GatewayHealthRegistry(ib_pool)
+snapshot_service = SnapshotService(ib_pool)
+
 
 # ───────────────── helpers ──────────────────────────────────────────
 def to_dict(obj):
@@ -34,122 +50,186 @@ def _log_call(name: str, *, user: User, extra: str | None = None) -> None:
     )
 
 
+def _naive_utc(ts: Optional[datetime]) -> Optional[datetime]:
+    # columns hold naive UTC
+    if ts is None or ts.tzinfo is None:
+        return ts
+    return ts.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def history_page(
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE,
+                       description="page size; X-Next-Cursor is set while more rows remain"),
+    symbol: Optional[str] = Query(None),
+    since: Optional[datetime] = Query(None, description="inclusive"),
+    until: Optional[datetime] = Query(None, description="exclusive"),
+) -> HistoryFilter:
+    try:
+        after = Cursor.decode(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return HistoryFilter(symbol=symbol, since=_naive_utc(since), until=_naive_utc(until),
+                         cursor=after, limit=limit)
+
+
+def order_page(
+    page: HistoryFilter = Depends(history_page),
+    status: Optional[str] = Query(None, description="IB order status, e.g. Filled"),
+) -> HistoryFilter:
+    return replace(page, status=status)
+
+
+def _next_cursor(rows, page: HistoryFilter, ts_attr: str) -> dict[str, str]:
+    if page.limit is not None and len(rows) == page.limit:
+        return {"X-Next-Cursor": Cursor.after(rows, ts_attr).encode()}
+    return {}
+
+
+def rows_response(rows: Sequence[Row], headers: Optional[dict] = None) -> ORJSONResponse:
+    """Projected rows → JSON list via orjson, bypassing `to_dict` and `jsonable_encoder`."""
+    fields = rows[0]._fields if rows else ()
+    return ORJSONResponse([dict(zip(fields, r)) for r in rows], headers=headers)
+
+
+# browsers keep the body but revalidate every time (If-None-Match → 304)
+CACHE_CONTROL = "private, no-cache"
+
+
+def _matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    opaque = etag.removeprefix("W/")
+    return any(t == "*" or t.strip().removeprefix("W/") == opaque for t in header.split(","))
+
+
+async def conditional(
+    db: AsyncDBManager, request: Request, *, user_id: int, resources: tuple[str, ...], salt: tuple[str, ...] = ()
+) -> tuple[dict[str, str], Optional[Response]]:
+    """
+    ETag from the user's data versions (one primary-key lookup). Returns the
+    caching headers and, when the client already has this version, the 304
+    to send instead of running the query.
+    """
+    versions = await db.get_data_versions(user_id=user_id, resources=resources)
+    etag = dv.etag(user_id, versions, request.url.path, request.url.query, *salt)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if _matches(request, etag):
+        return headers, Response(status_code=304, headers=headers)
+    return headers, None
+
+
 # ───────────────── account info ─────────────────────────────────────
 @router.get("/account/snapshot")
-async def get_account_snapshot(current: User = Depends(get_current_user)):
+async def get_account_snapshot(
+    request: Request, response: Response, current: User = Depends(get_current_user)
+):
     """
-    Return today’s account snapshot if we already stored one;
-    otherwise pull it via the user’s dedicated IB-Gateway container
-    (`ib-gateway-<user-id>` on port 4004) and persist it.
+    Return the user's latest account snapshot (see `snapshot_service`):
+    fresh ones as is, stale ones while a background refresh runs; only
+    without any usable snapshot do we wait for the pooled IB-Gateway
+    connection, sharing that round trip with concurrent requests.
     """
     _log_call("GET /snapshot", user=current)
 
-    business_manager = None
-    
-    with DBManager() as db:
-        try:
-            snap = db.get_today_snapshot(user_id=current.id)
-            if snap is not None:
-                logger.debug("snapshot cached → rows=#1")
-                return to_dict(snap)
-
-            # pull live from gateway
-            from ib_manager.ib_connector import IBBusinessManager
-
-            gateway_host = f"ib-gateway-{current.id}"
-            logger.info(
-                "connecting IB gateway host=%s port=%s cid=%s",
-                gateway_host,
-                4004,
-                100 + current.id,
-            )
-            business_manager = IBBusinessManager(current)
-            await business_manager.connect()  
-            data = await business_manager.get_account_information()
-            
-            logger.debug("ib.get_account_information returned keys=%d", len(data))
-
-            if not data:
-                raise HTTPException(500, "Failed to fetch data from IB")
-
-            snap = db.create_account_snapshot(user_id=current.id, snapshot_data=data)
-            if not snap:
-                raise HTTPException(500, "Failed to store snapshot")
-
-            logger.info("snapshot persisted id=%s", snap.id)
-            return to_dict(snap)
-
-        except RuntimeError as e:  # raised by IBManager after all retries
-            logger.warning("gateway not ready for user=%s: %s", current.id, e)
-            raise HTTPException(
-                status_code=HTTP_504_GATEWAY_TIMEOUT,
-                detail="IB-Gateway not ready, please retry in a minute.",
-            )
-        except HTTPException:
-            raise
-        except Exception:
-            logger.exception("unhandled error in /account/snapshot")
-            raise HTTPException(500, "Internal server error")
-        finally:
-            if business_manager and business_manager.ib.isConnected():
-                business_manager.disconnect()
+    try:
+        async with AsyncDBManager() as db:
+            headers, unchanged = await conditional(db, request, user_id=current.id, resources=(dv.SNAPSHOT,))
+        if unchanged is not None:
+            snapshot_service.revalidate(current)
+            return unchanged
+        snap = await snapshot_service.get(current)
+        response.headers.update(headers)
+        return snap
+
+    except (RuntimeError, ConnectionError) as e:  # pool could not (re)connect in time
+        logger.warning("gateway not ready for user=%s: %s", current.id, e)
+        raise HTTPException(
+            status_code=HTTP_504_GATEWAY_TIMEOUT,
+            detail="IB-Gateway not ready, please retry in a minute.",
+        )
+    except SnapshotError as e:
+        raise HTTPException(500, str(e))
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("unhandled error in /account/snapshot")
+        raise HTTPException(500, "Internal server error")
 
 
 @router.get("/account/positions")
-def get_open_positions(current: User = Depends(get_current_user)):
+async def get_open_positions(request: Request, current: User = Depends(get_current_user)):
     _log_call("GET /positions", user=current)
-    with DBManager() as db:
-        rows = [to_dict(p) for p in db.get_open_positions(user_id=current.id)]
-        logger.debug("positions rows=%d", len(rows))
-        return rows
+    async with AsyncDBManager() as db:
+        headers, unchanged = await conditional(db, request, user_id=current.id, resources=(dv.POSITIONS,))
+        if unchanged is not None:
+            return unchanged
+        rows = await db.get_open_position_rows(user_id=current.id)
+    logger.debug("positions rows=%d", len(rows))
+    return rows_response(rows, headers)
 
 
 # ───────────────── orders & trades ────────────────────────────────
 @router.get("/orders")
-def get_all_orders(current: User = Depends(get_current_user)):
+async def get_all_orders(
+    request: Request,
+    page: HistoryFilter = Depends(order_page),
+    current: User = Depends(get_current_user),
+):
     _log_call("GET /orders", user=current)
-    with DBManager() as db:
-        rows = [to_dict(o) for o in db.get_all_orders(user_id=current.id)]
-        logger.debug("orders rows=%d", len(rows))
-        return rows
+    async with AsyncDBManager() as db:
+        headers, unchanged = await conditional(db, request, user_id=current.id, resources=(dv.ORDERS,))
+        if unchanged is not None:
+            return unchanged
+        rows = await db.get_all_order_rows(user_id=current.id, page=page)
+    logger.debug("orders rows=%d", len(rows))
+    return rows_response(rows, {**headers, **_next_cursor(rows, page, "created_at")})
 
 
 @router.get("/executed-trades")
-def get_all_executed_trades(current: User = Depends(get_current_user)):
+async def get_all_executed_trades(
+    request: Request,
+    page: HistoryFilter = Depends(history_page),
+    current: User = Depends(get_current_user),
+):
     _log_call("GET /trades", user=current)
-    with DBManager() as db:
-        rows = [to_dict(t) for t in db.get_all_executed_trades(user_id=current.id)]
-        logger.debug("trades rows=%d", len(rows))
-        return rows
+    async with AsyncDBManager() as db:
+        headers, unchanged = await conditional(db, request, user_id=current.id, resources=(dv.TRADES,))
+        if unchanged is not None:
+            return unchanged
+        rows = await db.get_all_executed_trade_rows(user_id=current.id, page=page)
+    logger.debug("trades rows=%d", len(rows))
+    return rows_response(rows, {**headers, **_next_cursor(rows, page, "fill_time")})
 
 
 # ───────────────── runners CRUD ───────────────────────────────────
 @router.post("/runners", status_code=201)
-def create_runner(
+async def create_runner(
     runner: RunnerCreate, current: User = Depends(get_current_user)
 ):
     _log_call("POST /runners", user=current, extra=f"name={runner.name!r}")
-    with DBManager() as db:
-        obj = db.create_runner(
+    async with AsyncDBManager() as db:
+        obj = await db.create_runner(
             user_id=current.id, data=runner.model_dump(exclude={"id", "created_at"})
         )
         return to_dict(obj)
 
 
 @router.delete("/runners")
-def delete_runners(payload: RunnerIds, current: User = Depends(get_current_user)):
+async def delete_runners(payload: RunnerIds, current: User = Depends(get_current_user)):
     _log_call("DEL /runners", user=current, extra=f"ids={payload.ids}")
-    with DBManager() as db:
-        deleted = db.delete_runners(user_id=current.id, ids=payload.ids)
+    async with AsyncDBManager() as db:
+        deleted = await db.delete_runners(user_id=current.id, ids=payload.ids)
         logger.info("deleted runners=%d", deleted)
         return {"deleted": deleted}
 
 
 @router.post("/runners/activate")
-def activate_runners(payload: RunnerIds, current: User = Depends(get_current_user)):
+async def activate_runners(payload: RunnerIds, current: User = Depends(get_current_user)):
     _log_call("ACT /runners", user=current, extra=f"ids={payload.ids}")
-    with DBManager() as db:
-        updated = db.update_runners_activation(
+    async with AsyncDBManager() as db:
+        updated = await db.update_runners_activation(
             user_id=current.id, ids=payload.ids, activation="active"
         )
         logger.info("activated runners=%d", updated)
@@ -157,10 +237,10 @@ def activate_runners(payload: RunnerIds, current: User = Depends(get_current_use
 
 
 @router.post("/runners/deactivate")
-def deactivate_runners(payload: RunnerIds, current: User = Depends(get_current_user)):
+async def deactivate_runners(payload: RunnerIds, current: User = Depends(get_current_user)):
     _log_call("DEACT /runners", user=current, extra=f"ids={payload.ids}")
-    with DBManager() as db:
-        updated = db.update_runners_activation(
+    async with AsyncDBManager() as db:
+        updated = await db.update_runners_activation(
             user_id=current.id, ids=payload.ids, activation="inactive"
         )
         logger.info("deactivated runners=%d", updated)
@@ -169,60 +249,81 @@ def deactivate_runners(payload: RunnerIds, current: User = Depends(get_current_u
 
 # ───────── runner-scoped helpers ────────────────────────────────
 @router.get("/runners/{runner_id}/orders")
-def get_runner_orders(
-    runner_id: int = Path(..., gt=0), current: User = Depends(get_current_user)
+async def get_runner_orders(
+    request: Request,
+    runner_id: int = Path(..., gt=0),
+    page: HistoryFilter = Depends(order_page),
+    current: User = Depends(get_current_user),
 ):
     _log_call("RUNNER orders", user=current, extra=f"rid={runner_id}")
-    with DBManager() as db:
-        rows = [
-            to_dict(o) for o in db.get_runner_orders(user_id=current.id, runner_id=runner_id)
-        ]
-        logger.debug("runner orders rows=%d", len(rows))
-        return rows
+    async with AsyncDBManager() as db:
+        headers, unchanged = await conditional(db, request, user_id=current.id, resources=(dv.ORDERS,))
+        if unchanged is not None:
+            return unchanged
+        rows = await db.get_runner_order_rows(user_id=current.id, runner_id=runner_id, page=page)
+    logger.debug("runner orders rows=%d", len(rows))
+    return rows_response(rows, {**headers, **_next_cursor(rows, page, "created_at")})
 
 
 @router.get("/runners/{runner_id}/trades")
-def get_runner_trades(
-    runner_id: int = Path(..., gt=0), current: User = Depends(get_current_user)
+async def get_runner_trades(
+    request: Request,
+    runner_id: int = Path(..., gt=0),
+    page: HistoryFilter = Depends(history_page),
+    current: User = Depends(get_current_user),
 ):
     _log_call("RUNNER trades", user=current, extra=f"rid={runner_id}")
-    with DBManager() as db:
-        rows = [
-            to_dict(t) for t in db.get_runner_trades(user_id=current.id, runner_id=runner_id)
-        ]
-        logger.debug("runner trades rows=%d", len(rows))
-        return rows
+    async with AsyncDBManager() as db:
+        headers, unchanged = await conditional(db, request, user_id=current.id, resources=(dv.ORDERS, dv.TRADES))
+        if unchanged is not None:
+            return unchanged
+        rows = await db.get_runner_trade_rows(user_id=current.id, runner_id=runner_id, page=page)
+    logger.debug("runner trades rows=%d", len(rows))
+    return rows_response(rows, {**headers, **_next_cursor(rows, page, "fill_time")})
+
+
+@router.get("/runners/{runner_id}/backtest")
+async def backtest_runner(
+    runner_id: int = Path(..., gt=0),
+    start: Optional[datetime] = Query(None, description="defaults to the runner's time_range_from, else 1 year ago"),
+    end: Optional[datetime] = Query(None, description="defaults to the runner's time_range_to, else now"),
+    max_points: int = Query(1000, ge=10, le=100_000, description="equity-curve points returned"),
+    current: User = Depends(get_current_user),
+):
+    _log_call("RUNNER backtest", user=current, extra=f"rid={runner_id}")
+    async with AsyncDBManager() as db:
+        runner = await db.get_runner(user_id=current.id, runner_id=runner_id)
+        if runner is None:
+            raise HTTPException(404, "Runner not found")
+        config = BacktestConfig.from_runner(runner)
+    try:
+        # CPU-bound; keep it off the event loop
+        result = await asyncio.to_thread(run_runner_backtest, config, start=start, end=end)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except RuntimeError as e:
+        raise HTTPException(404, str(e))
+    logger.debug("backtest trades=%d bars=%d", result.stats["trades"], result.stats["bars"])
+    return result.to_dict(max_points=max_points)
 
 
 @router.get("/runners/active")
-def get_active_runners(current: User = Depends(get_current_user)):
+async def get_active_runners(request: Request, current: User = Depends(get_current_user)):
     _log_call("GET /runners/active", user=current)
-    with DBManager() as db:
-        rows = [to_dict(r) for r in db.get_active_runners(user_id=current.id)]
-        logger.debug("active runners rows=%d", len(rows))
-        return rows
+    async with AsyncDBManager() as db:
+        headers, unchanged = await conditional(db, request, user_id=current.id, resources=(dv.RUNNERS,))
+        if unchanged is not None:
+            return unchanged
+        rows = await db.get_active_runner_rows(user_id=current.id)
+    logger.debug("active runners rows=%d", len(rows))
+    return rows_response(rows, headers)
 
 @router.get("/ib/status", status_code=HTTP_200_OK)
 async def ib_connection_status(current: User = Depends(get_current_user)):
     """
-    A lightweight check to ensure IB Gateway is alive.
-    Tries to fetch a small piece of data (e.g., account summary).
+    Health of the user's IB Gateway from the background registry
+    (`gateway_health`): connection state, heartbeat latency percentiles,
+    last success / error and container state. `connected` is kept for
+    existing clients.
     """
-    try:
-        # Initialize the IBBusinessManager to connect to IB Gateway
-        business_manager = IBBusinessManager(current)
-        await business_manager.connect()  # Attempt connection to IB Gateway
-        account_info = await business_manager.get_account_information()  # Fetch some data
-
-        # If we get a valid response, the connection is alive
-        if account_info:
-            return {"connected": True}
-    except Exception as e:
-        logger.error(f"Error checking IB Gateway status for user {current.id}: {e}")
-        return {"connected": False}
-    finally:
-        # Ensure we disconnect from the IB Gateway after the check
-        if business_manager and business_manager.ib.isConnected():
-            business_manager.disconnect()
-
-    return {"connected": False}
\ No newline at end of file
+    return await gateway_health.status(current)
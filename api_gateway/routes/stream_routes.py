@@ -0,0 +1,66 @@
+# api_gateway/routes/stream_routes.py
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import StreamingResponse
+
+from api_gateway.change_feed import change_hub
+from api_gateway.security.auth import (
+    STREAM_TICKET_TTL,
+    User,
+    create_stream_ticket,
+    get_current_user,
+    get_stream_user,
+)
+
+logger = logging.getLogger(__name__)
+router = APIRouter(tags=["stream"])
+
+STREAM_KEEPALIVE = float(os.getenv("STREAM_KEEPALIVE", 15))      # s between SSE comments
+STREAM_RETRY_MS = int(os.getenv("STREAM_RETRY_MS", 3000))        # EventSource reconnect delay
+
+
+# ───────── server-sent events ─────────
+@router.post("/stream/ticket")
+async def stream_ticket(current: User = Depends(get_current_user)):
+    """Ticket for `GET /stream?ticket=…`; EventSource cannot send the Authorization header."""
+    return {"ticket": create_stream_ticket(current.username), "expires_in": STREAM_TICKET_TTL}
+
+
+@router.get("/stream")
+async def stream_changes(
+    current: User = Depends(get_stream_user),
+    last_event_id: Optional[str] = Header(None),
+    since: Optional[str] = Query(None, description="event id to resume after (for clients without Last-Event-ID)"),
+):
+    """
+    text/event-stream of the user's changes: `orders`, `trades`, `positions`,
+    `snapshot` and `runners` events carrying the changed rows, and `reset`
+    when the client has to refetch over REST. EventSource reconnects send
+    `Last-Event-ID` and continue where they left off.
+    """
+    sub = await change_hub.subscribe(current.id, last_event_id or since)
+    logger.info("stream open user=%s resume=%s", current.id, last_event_id or since)
+
+    async def events():
+        try:
+            yield f"retry: {STREAM_RETRY_MS}\n\n".encode()
+            while True:
+                try:
+                    event = await asyncio.wait_for(sub.get(), STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                yield event.sse(sub.stream_id)
+        finally:
+            change_hub.unsubscribe(sub)
+            logger.info("stream closed user=%s", current.id)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,11 +1,16 @@
 # api_gateway/security/auth.py
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 
 from jose import jwt, JWTError          # pip install python-jose
 from passlib.context import CryptContext  # pip install passlib[bcrypt]
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 
@@ -15,10 +20,20 @@ from database.models import User
 SECRET_KEY  = "CHANGE_ME"                # env: AUTH_SECRET_KEY
 ALGORITHM   = "HS256"
 ACCESS_TTL  = 60 * 24                    # minutes (1 day)
+STREAM_TICKET_TTL = int(os.getenv("STREAM_TICKET_TTL", 60))            # seconds
+STREAM_SCOPE = "stream"
+
+PRINCIPAL_CACHE_TTL  = float(os.getenv("PRINCIPAL_CACHE_TTL", 60))     # seconds
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 4096))
+BCRYPT_WORKERS       = int(os.getenv("BCRYPT_WORKERS", min(4, os.cpu_count() or 1)))
 
 pwd_ctx  = CryptContext(schemes=["bcrypt"], deprecated="auto")
 bearer   = HTTPBearer(auto_error=False)  # we’ll raise ourselves
 
+# bcrypt is ~100–300 ms of CPU; a login burst queues here instead of
+# blocking the event loop or draining the default threadpool
+_bcrypt_pool = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+
 # ───── helpers ───────────────────────────────────────────────────────
 def hash_password(pw: str) -> str:
     return pwd_ctx.hash(pw)
@@ -26,33 +41,112 @@ def hash_password(pw: str) -> str:
 def verify_password(plain: str, hashed: str) -> bool:
     return pwd_ctx.verify(plain, hashed)
 
+async def hash_password_async(pw: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_bcrypt_pool, hash_password, pw)
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(_bcrypt_pool, verify_password, plain, hashed)
+
 def create_access_token(sub: str, ttl_minutes: int = ACCESS_TTL) -> str:
     exp = datetime.utcnow() + timedelta(minutes=ttl_minutes)
     to_encode = {"sub": sub, "exp": exp}
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def decode_token(token: str) -> Optional[str]:
+def create_stream_ticket(sub: str, ttl_seconds: int = STREAM_TICKET_TTL) -> str:
+    """Short-lived token that opens `GET /api/stream` and nothing else."""
+    exp = datetime.utcnow() + timedelta(seconds=ttl_seconds)
+    return jwt.encode({"sub": sub, "exp": exp, "scope": STREAM_SCOPE}, SECRET_KEY, algorithm=ALGORITHM)
+
+def decode_token(token: str, *, scope: Optional[str] = None) -> Optional[str]:
+    """Subject of a valid token of `scope` (None: a regular access token)."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload.get("sub")
     except JWTError:
         return None
+    if payload.get("scope") != scope:
+        return None
+    return payload.get("sub")
+
+# ───── principal cache ──────────────────────────────────────────────
+class PrincipalCache:
+    """
+    LRU of authenticated users keyed by token subject (username), each entry
+    valid for `ttl` seconds. Cached users are detached ORM rows – read-only.
+    Call `invalidate` after changing a user. Every change, from any process,
+    also arrives through the `user_changes` NOTIFY that `ChangeHub` listens
+    to; without that listener an entry lives until it expires.
+    """
+
+    def __init__(self, *, ttl: float = PRINCIPAL_CACHE_TTL, maxsize: int = PRINCIPAL_CACHE_SIZE) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, tuple[float, User]] = OrderedDict()
+
+    def get(self, sub: str) -> Optional[User]:
+        entry = self._entries.get(sub)
+        if entry is None:
+            return None
+        expires, user = entry
+        if expires <= time.monotonic():
+            del self._entries[sub]
+            return None
+        self._entries.move_to_end(sub)
+        return user
+
+    def put(self, sub: str, user: User) -> None:
+        if self.ttl <= 0:
+            return
+        self._entries[sub] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(sub)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, sub: Optional[str] = None) -> None:
+        """Drop one subject, or everything when `sub` is None."""
+        if sub is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(sub, None)
+
+
+principal_cache = PrincipalCache()
 
 # ───── FastAPI dependency: current user (rejects 401) ───────────────
-def get_current_user(
-    cred: HTTPAuthorizationCredentials = Depends(bearer),
-) -> User:
-    if cred is None:
+async def _user_for_token(token: Optional[str], *, scope: Optional[str] = None) -> User:
+    if token is None:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Not authenticated")
 
-    uid = decode_token(cred.credentials)
+    uid = decode_token(token, scope=scope)
     if not uid:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Invalid token")
+
+    if (user := principal_cache.get(uid)) is not None:
+        return user
+
+    from database.async_db_manager import AsyncDBManager
     
-    from database.db_manager import DBManager
-    
-    with DBManager() as db:
-        user = db.get_user_by_username(uid)
+    async with AsyncDBManager() as db:
+        user = await db.get_user_by_username(uid)
         if user is None:
             raise HTTPException(status.HTTP_401_UNAUTHORIZED, "User not found")
-        return user
+    principal_cache.put(uid, user)
+    return user
+
+
+async def get_current_user(
+    cred: HTTPAuthorizationCredentials = Depends(bearer),
+) -> User:
+    return await _user_for_token(cred.credentials if cred else None)
+
+
+# EventSource clients cannot set headers. Instead of the day-long access
+# token (which would end up in access logs and browser history) they pass a
+# ticket from `POST /api/stream/ticket`: valid `STREAM_TICKET_TTL` seconds
+# and for the stream only
+async def get_stream_user(
+    cred: HTTPAuthorizationCredentials = Depends(bearer),
+    ticket: Optional[str] = Query(None),
+) -> User:
+    if cred:
+        return await _user_for_token(cred.credentials)
+    return await _user_for_token(ticket, scope=STREAM_SCOPE)
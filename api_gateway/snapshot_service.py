@@ -0,0 +1,112 @@
+# api_gateway/snapshot_service.py
+"""
+Account snapshots for `GET /api/account/snapshot`: single-flight refreshes
+and stale-while-revalidate.
+
+A snapshot taken in the current refresh interval (`database.snapshots`) is
+fresh and served as is. An older one, up to `SNAPSHOT_MAX_STALE`, is still
+served immediately while a background task pulls a new one from IB. Only a
+user without any usable snapshot waits for the gateway.
+
+Per user at most one refresh is in flight in this process; concurrent
+requests await the same task instead of each opening a gateway round trip.
+Across processes the (user_id, bucket) unique index keeps it to one row per
+interval. A failed refresh backs off `SNAPSHOT_RETRY` seconds before stale
+reads trigger the next one.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from functools import partial
+
+from database.async_db_manager import AsyncDBManager
+from database.snapshots import current_bucket
+from ib_manager.connection_pool import IBConnectionPool
+from ib_manager.ib_connector import IBBusinessManager
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAX_STALE = timedelta(seconds=float(os.getenv("SNAPSHOT_MAX_STALE", 24 * 3600)))
+SNAPSHOT_RETRY = float(os.getenv("SNAPSHOT_RETRY", 60))      # s between failed background refreshes
+
+
+class SnapshotError(Exception):
+    """The gateway answered, but no snapshot could be produced or stored."""
+
+
+class SnapshotService:
+    def __init__(self, ib_pool: IBConnectionPool) -> None:
+        self.ib_pool = ib_pool
+        self._flights: dict[int, asyncio.Task] = {}
+        self._fresh: dict[int, int] = {}             # user_id → bucket of its latest snapshot
+        self._retry_at: dict[int, float] = {}
+
+    # ───────────────────── reads ─────────────────────
+    async def get(self, user) -> dict:
+        """Latest usable snapshot of `user`, refreshing it when due."""
+        async with AsyncDBManager() as db:
+            row = await db.get_latest_snapshot_row(user_id=user.id)
+        if row is not None:
+            if row.bucket == current_bucket():
+                self._fresh[user.id] = row.bucket
+                return row._asdict()
+            if row.timestamp is not None and datetime.utcnow() - row.timestamp <= SNAPSHOT_MAX_STALE:
+                self.revalidate(user)
+                return row._asdict()
+        # nothing to serve: wait for the (shared) refresh; a client hanging up
+        # must not cancel it for the others
+        return await asyncio.shield(self._flight(user))
+
+    def revalidate(self, user) -> None:
+        """Start a background refresh unless the snapshot is fresh, one runs, or we are backing off."""
+        if self._fresh.get(user.id) == current_bucket():
+            return
+        if time.monotonic() < self._retry_at.get(user.id, 0):
+            return
+        self._flight(user)
+
+    # ───────────────────── refresh ─────────────────────
+    def _flight(self, user) -> asyncio.Task:
+        task = self._flights.get(user.id)
+        if task is None:
+            task = self._flights[user.id] = asyncio.create_task(self._refresh(user), name=f"snapshot-{user.id}")
+            task.add_done_callback(partial(self._landed, user.id))
+        return task
+
+    def _landed(self, user_id: int, task: asyncio.Task) -> None:
+        self._flights.pop(user_id, None)
+        if task.cancelled():
+            return
+        if (e := task.exception()) is not None:
+            self._retry_at[user_id] = time.monotonic() + SNAPSHOT_RETRY
+            logger.warning("snapshot refresh user=%s failed: %r", user_id, e)
+        else:
+            self._retry_at.pop(user_id, None)
+
+    async def _refresh(self, user) -> dict:
+        bucket = current_bucket()
+        async with AsyncDBManager() as db:
+            row = await db.get_latest_snapshot_row(user_id=user.id)
+        if row is not None and row.bucket == bucket:
+            # another worker or the scheduler got there first
+            self._fresh[user.id] = bucket
+            return row._asdict()
+
+        # no DB session is held across the gateway round trip
+        async with self.ib_pool.lease(user) as ib:
+            data = await IBBusinessManager(user, ib=ib).get_account_information()
+        logger.debug("ib.get_account_information returned keys=%d", len(data or {}))
+        if not data:
+            raise SnapshotError("Failed to fetch data from IB")
+
+        async with AsyncDBManager() as db:
+            snap = await db.create_account_snapshot(user_id=user.id, snapshot_data=data)
+        if snap is None:
+            raise SnapshotError("Failed to store snapshot")
+        logger.info("snapshot persisted user=%s id=%s bucket=%s", user.id, snap.id, snap.bucket)
+        self._fresh[user.id] = snap.bucket
+        return {c.key: getattr(snap, c.key) for c in snap.__table__.columns}
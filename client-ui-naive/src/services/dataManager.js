@@ -22,20 +22,26 @@ export async function fetchOpenPositions() {
   }
 }
 
-export async function fetchOrders() {
+/* Order and trade history comes newest first, one page per call:
+   `nextCursor` (the X-Next-Cursor header) fetches the next, older page and
+   is null on the last one. */
+async function fetchHistoryPage(path, cursor) {
+  const response = await axios.get(path, { params: cursor ? { cursor } : {} });
+  return { rows: response.data, nextCursor: response.headers["x-next-cursor"] ?? null };
+}
+
+export async function fetchOrders(cursor = null) {
   try {
-    const response = await axios.get(`/api/orders`);
-    return response.data;
+    return await fetchHistoryPage(`/api/orders`, cursor);
   } catch (error) {
     console.error('Error fetching orders:', error);
     return null;
   }
 }
 
-export async function fetchExecutedTrades() {
+export async function fetchExecutedTrades(cursor = null) {
   try {
-    const response = await axios.get(`/api/executed-trades`);
-    return response.data;
+    return await fetchHistoryPage(`/api/executed-trades`, cursor);
   } catch (error) {
     console.error('Error fetching executed trades:', error);
     return null;
@@ -94,4 +100,50 @@ export async function fetchIbStatus() {
     console.error('Error fetching IB status:', err);
     return false;                 // pessimistic fallback
   }
-}
\ No newline at end of file
+}
+/* Live updates: `handlers` maps event kinds (orders, trades, positions,
+   snapshot, runners, reset) to callbacks receiving the parsed payload.
+   The stream is opened with a short-lived ticket, not the access token; when
+   the server refuses a reconnect (ticket expired) a new ticket is fetched and
+   the stream resumes after the last event seen.
+   Returns a function that closes the stream. */
+export function subscribeChanges(handlers) {
+  let source = null;
+  let lastEventId = null;
+  let closed = false;
+
+  async function open() {
+    let ticket;
+    try {
+      ({ data: { ticket } } = await axios.post(`/api/stream/ticket`));
+    } catch (error) {
+      console.error('Error fetching stream ticket:', error);
+      if (!closed) setTimeout(open, 5000);
+      return;
+    }
+    if (closed) return;
+    const params = new URLSearchParams({ ticket });
+    if (lastEventId) params.set('since', lastEventId);
+    source = new EventSource(`/api/stream?${params}`);
+    for (const [kind, handler] of Object.entries(handlers)) {
+      source.addEventListener(kind, (ev) => {
+        if (ev.lastEventId) lastEventId = ev.lastEventId;
+        handler(JSON.parse(ev.data));
+      });
+    }
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED) {
+        source = null;
+        if (!closed) setTimeout(open, 3000);
+      } else {
+        console.warn('Change stream interrupted; reconnecting…');
+      }
+    };
+  }
+
+  open();
+  return () => {
+    closed = true;
+    source?.close();
+  };
+}
@@ -0,0 +1,75 @@
+import os
+import logging
+from typing import Optional
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from database.db_core import (
+    DATABASE_URL,
+    DB_ECHO,
+    DB_MAX_OVERFLOW,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+# asyncpg caches prepared statements per connection; SQLAlchemy keeps its
+# own LRU of prepared statements on top of it
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 500))
+DB_ASYNC_POOL_SIZE = int(os.getenv("DB_ASYNC_POOL_SIZE", DB_POOL_SIZE * 2))
+
+
+def async_url(url: str):
+    """
+    Same database, async driver: `postgresql[+psycopg2]://` → `postgresql+asyncpg://`,
+    `sqlite://` → `sqlite+aiosqlite://`; anything else is left as is.
+    """
+    u = make_url(url)
+    backend = u.get_backend_name()
+    if backend == "sqlite":
+        return u.set(drivername="sqlite+aiosqlite")
+    if backend != "postgresql":
+        return u
+    return u.set(drivername="postgresql+asyncpg").update_query_dict(
+        {"prepared_statement_cache_size": str(DB_STATEMENT_CACHE_SIZE)}
+    )
+
+
+ASYNC_DATABASE_URL = async_url(DATABASE_URL)
+
+# Created on first use: importing this module (e.g. for `python -m
+# database.history` on SQLite) must not need the async driver or a server
+_async_engine: Optional[AsyncEngine] = None
+_async_sessions: Optional[async_sessionmaker] = None
+
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine
+    if _async_engine is None:
+        pool = {}
+        if ASYNC_DATABASE_URL.get_backend_name() == "postgresql":
+            pool = dict(
+                pool_size=DB_ASYNC_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_recycle=DB_POOL_RECYCLE,
+                connect_args={"statement_cache_size": DB_STATEMENT_CACHE_SIZE},
+            )
+        try:
+            _async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=DB_ECHO, pool_pre_ping=True, **pool)
+        except Exception:
+            logger.exception("Failed to create the async database engine.")
+            raise
+        logger.info("Async database engine ready (%s).", ASYNC_DATABASE_URL.drivername)
+    return _async_engine
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    """New session on the shared async engine (same role as `db_core.SessionLocal`)."""
+    global _async_sessions
+    if _async_sessions is None:
+        _async_sessions = async_sessionmaker(get_async_engine(), autoflush=False, expire_on_commit=False)
+    return _async_sessions()
@@ -0,0 +1,351 @@
+# database/async_db_manager.py
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import date, datetime
+from typing import List, Sequence
+
+from sqlalchemy import Row, delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api_gateway.security.auth import hash_password_async, principal_cache, verify_password_async
+from database import data_versions as dv
+from database.async_db_core import AsyncSessionLocal
+from database.history import HistoryFilter, orders_stmt, trades_stmt
+from database.snapshots import snapshot_values, upsert_stmt
+from database.models import (
+    AccountSnapshot,
+    ExecutedTrade,
+    OpenPosition,
+    Order,
+    Runner,
+    User,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDBManager:
+    """
+    asyncio counterpart of `DBManager` for the API gateway (asyncpg).
+    Same method names and keyword-only `user_id`; every query is awaited on
+    the event loop instead of occupying a threadpool worker.
+    """
+
+    # ───────────────────── lifecycle ─────────────────────
+    def __init__(self, db_session: AsyncSession | None = None) -> None:
+        self._own_session = db_session is None
+        self.db: AsyncSession = db_session or AsyncSessionLocal()
+
+    async def __aenter__(self) -> "AsyncDBManager":
+        return self
+
+    async def __aexit__(self, exc_t, exc_v, tb) -> None:
+        try:
+            if exc_t:
+                await self.db.rollback()
+            else:
+                await self.db.commit()
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        if self._own_session:
+            await self.db.close()
+
+    # ------------------------------------------------------------------
+    async def _commit(self, msg: str) -> bool:
+        try:
+            await self.db.commit()
+            logger.info("%s – OK", msg)
+            return True
+        except Exception:
+            logger.exception("%s – FAILED", msg)
+            await self.db.rollback()
+            return False
+
+    async def _bump_versions(self, user_ids, *resources: str) -> None:
+        """Bump data versions inside the current transaction (committed by the caller)."""
+        if keys := dv.pairs(user_ids, *resources):
+            await self.db.execute(dv.bump_stmt(keys))
+
+    async def get_data_versions(self, *, user_id: int, resources: Sequence[str]) -> dict[str, int]:
+        """Current version per resource; never-written resources are 0."""
+        found = dict((await self.db.execute(dv.versions_stmt(user_id, resources))).all())
+        return {r: found.get(r, 0) for r in resources}
+
+    # ───────────────────── users ─────────────────────
+    async def get_user_by_username(self, username: str) -> User | None:
+        return await self.db.scalar(select(User).where(User.username == username).limit(1))
+
+    async def get_user_by_email(self, email: str) -> User | None:
+        return await self.db.scalar(select(User).where(User.email == email).limit(1))
+
+    async def create_user(self, *, username: str, email: str, password: str, ib_username: str | None = None, ib_password: str | None = None,) -> User:
+        if await self.get_user_by_username(username) or await self.get_user_by_email(email):
+            raise ValueError("Username or e-mail already taken")
+
+        user = User(
+            username=username,
+            email=email,
+            hashed_password=await hash_password_async(password),
+            ib_username=ib_username,
+            ib_password=ib_password,
+        )
+        self.db.add(user)
+        await self._commit("Create user")
+        principal_cache.invalidate(username)
+        return user
+
+    async def update_user(self, *, user_id: int, **fields) -> User | None:
+        """Update profile / IB credential columns (`password` is re-hashed)."""
+        user = await self.db.get(User, user_id)
+        if user is None:
+            return None
+        if "password" in fields:
+            fields["hashed_password"] = await hash_password_async(fields.pop("password"))
+        # read before committing: a failed commit expires `user`, and lazy
+        # loads do not work on an AsyncSession
+        usernames = {user.username, fields.get("username", user.username)}
+        for key, value in fields.items():
+            setattr(user, key, value)
+        user.updated_at = datetime.utcnow()
+        ok = await self._commit(f"Update user {user_id}")
+        for username in usernames:
+            principal_cache.invalidate(username)
+        return user if ok else None
+
+    async def authenticate(self, *, username: str, password: str) -> User | None:
+        user = await self.get_user_by_username(username)
+        if user and await verify_password_async(password, user.hashed_password):
+            return user
+        return None
+
+    # ─────────────────── account snapshots ───────────────────
+    async def get_today_snapshot(self, user_id: int) -> AccountSnapshot | None:
+        return await self.db.scalar(
+            select(AccountSnapshot)
+            .where(
+                AccountSnapshot.user_id == user_id,
+                func.date(AccountSnapshot.timestamp) == date.today(),
+            )
+            .limit(1)
+        )
+
+    async def get_latest_snapshot_row(self, *, user_id: int) -> Row | None:
+        return (
+            await self.db.execute(
+                select(*AccountSnapshot.__table__.columns)
+                .where(AccountSnapshot.user_id == user_id)
+                .order_by(AccountSnapshot.timestamp.desc())
+                .limit(1)
+            )
+        ).first()
+
+    async def create_account_snapshot(
+        self, *, user_id: int, snapshot_data: dict
+    ) -> AccountSnapshot | None:
+        """Store a snapshot; one taken earlier in the same refresh interval is overwritten."""
+        snap = await self.db.scalar(
+            upsert_stmt(snapshot_values(user_id, snapshot_data)).returning(AccountSnapshot),
+            execution_options={"populate_existing": True},
+        )
+        await self._bump_versions([user_id], dv.SNAPSHOT)
+        return snap if await self._commit("Upsert snapshot") else None
+
+    # ─────────────────── open positions ───────────────────
+    async def get_open_positions(self, *, user_id: int) -> Sequence[OpenPosition]:
+        return (await self.db.scalars(select(OpenPosition).where(OpenPosition.user_id == user_id))).all()
+
+    # ─────────────────── runners ───────────────────
+    async def create_runner(self, *, user_id: int, data: dict) -> Runner:
+        runner = Runner(user_id=user_id, **data)
+        self.db.add(runner)
+        await self._bump_versions([user_id], dv.RUNNERS)
+        try:
+            await self.db.commit()
+            logger.info("Create runner – OK")
+            return runner
+        except IntegrityError:
+            await self.db.rollback()
+            raise ValueError("Runner name already exists")
+        except Exception:
+            await self.db.rollback()
+            logger.exception("Create runner – FAILED")
+            raise
+
+    async def delete_runners(self, *, user_id: int, ids: List[int]) -> int:
+        result = await self.db.execute(
+            delete(Runner).where(Runner.user_id == user_id, Runner.id.in_(ids))
+        )
+        if result.rowcount:
+            # their orders go with them (ON DELETE CASCADE), fills lose the link
+            await self._bump_versions([user_id], dv.RUNNERS, dv.ORDERS, dv.TRADES)
+        await self._commit(f"Delete {result.rowcount} runner(s)")
+        return result.rowcount
+
+    async def update_runners_activation(
+        self, *, user_id: int, ids: List[int], activation: str
+    ) -> int:
+        result = await self.db.execute(
+            update(Runner)
+            .where(Runner.user_id == user_id, Runner.id.in_(ids))
+            .values(activation=activation, updated_at=datetime.utcnow())
+        )
+        if result.rowcount:
+            await self._bump_versions([user_id], dv.RUNNERS)
+        await self._commit(f"{activation.capitalize()} {result.rowcount} runner(s)")
+        return result.rowcount
+
+    async def get_active_runners(self, *, user_id: int) -> Sequence[Runner]:
+        return (
+            await self.db.scalars(
+                select(Runner).where(Runner.user_id == user_id, Runner.activation == "active")
+            )
+        ).all()
+
+    async def get_runner(self, *, user_id: int, runner_id: int) -> Runner | None:
+        return await self.db.scalar(
+            select(Runner).where(Runner.user_id == user_id, Runner.id == runner_id).limit(1)
+        )
+
+    # ─────────────────── read helpers ───────────────────
+    async def get_all_orders(self, *, user_id: int, page: HistoryFilter = HistoryFilter()) -> Sequence[Order]:
+        return (await self.db.scalars(orders_stmt(user_id=user_id, f=page))).all()
+
+    async def get_all_executed_trades(
+        self, *, user_id: int, page: HistoryFilter = HistoryFilter()
+    ) -> Sequence[ExecutedTrade]:
+        return (await self.db.scalars(trades_stmt(user_id=user_id, f=page))).all()
+
+    # runner-scoped
+    async def get_runner_orders(
+        self, *, user_id: int, runner_id: int, page: HistoryFilter = HistoryFilter()
+    ) -> Sequence[Order]:
+        return (await self.db.scalars(orders_stmt(user_id=user_id, runner_id=runner_id, f=page))).all()
+
+    async def get_runner_trades(
+        self, *, user_id: int, runner_id: int, page: HistoryFilter = HistoryFilter()
+    ) -> Sequence[ExecutedTrade]:
+        return (await self.db.scalars(trades_stmt(user_id=user_id, runner_id=runner_id, f=page))).all()
+
+
+    # ─────────────────── projected rows (list endpoints) ───────────────────
+    # same filters as above, but plain column tuples: no ORM instances,
+    # identity map or per-row `inspect` when serialising large histories
+    async def _rows(self, stmt) -> Sequence[Row]:
+        return (await self.db.execute(stmt)).all()
+
+    async def get_all_order_rows(self, *, user_id: int, page: HistoryFilter = HistoryFilter()) -> Sequence[Row]:
+        return await self._rows(orders_stmt(user_id=user_id, f=page, projected=True))
+
+    async def get_all_executed_trade_rows(self, *, user_id: int, page: HistoryFilter = HistoryFilter()) -> Sequence[Row]:
+        return await self._rows(trades_stmt(user_id=user_id, f=page, projected=True))
+
+    async def get_runner_order_rows(
+        self, *, user_id: int, runner_id: int, page: HistoryFilter = HistoryFilter()
+    ) -> Sequence[Row]:
+        return await self._rows(orders_stmt(user_id=user_id, runner_id=runner_id, f=page, projected=True))
+
+    async def get_runner_trade_rows(
+        self, *, user_id: int, runner_id: int, page: HistoryFilter = HistoryFilter()
+    ) -> Sequence[Row]:
+        return await self._rows(trades_stmt(user_id=user_id, runner_id=runner_id, f=page, projected=True))
+
+    async def get_open_position_rows(self, *, user_id: int) -> Sequence[Row]:
+        return await self._rows(
+            select(*OpenPosition.__table__.columns).where(OpenPosition.user_id == user_id)
+        )
+
+    async def get_active_runner_rows(self, *, user_id: int) -> Sequence[Row]:
+        return await self._rows(
+            select(*Runner.__table__.columns).where(Runner.user_id == user_id, Runner.activation == "active")
+        )
+
+
+    # ─────────────────── change feed (push stream) ───────────────────
+    async def get_change_watermarks(self, *, user_id: int) -> tuple[datetime | None, int]:
+        """(latest order `last_updated`, highest fill id) – where a new stream starts."""
+        since = await self.db.scalar(select(func.max(Order.last_updated)).where(Order.user_id == user_id))
+        after = await self.db.scalar(select(func.max(ExecutedTrade.id)).where(ExecutedTrade.user_id == user_id))
+        return since, after or 0
+
+    async def get_orders_updated_since(self, *, user_id: int, since: datetime | None) -> Sequence[Row]:
+        stmt = select(*Order.__table__.columns).where(Order.user_id == user_id)
+        if since is not None:
+            stmt = stmt.where(Order.last_updated >= since)
+        return await self._rows(stmt.order_by(Order.last_updated, Order.id))
+
+    async def get_trades_after(self, *, user_id: int, after_id: int) -> Sequence[Row]:
+        return await self._rows(
+            select(*ExecutedTrade.__table__.columns)
+            .where(ExecutedTrade.user_id == user_id, ExecutedTrade.id > after_id)
+            .order_by(ExecutedTrade.id)
+        )
+
+    async def get_runner_rows(self, *, user_id: int) -> Sequence[Row]:
+        return await self._rows(select(*Runner.__table__.columns).where(Runner.user_id == user_id))
+
+
+if __name__ == "__main__":
+    # Load test: the same read as GET /orders, issued by `concurrency` clients
+    # at once – sync DBManager on a 40-thread pool (FastAPI's default for
+    # `def` handlers) against AsyncDBManager on the event loop.
+    # usage: python -m database.async_db_manager <username> [requests] [concurrency]
+    import sys
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    import numpy as np
+
+    from database.async_db_core import get_async_engine
+    from database.db_manager import DBManager
+
+    username = sys.argv[1]
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+
+    with DBManager() as db:
+        user = db.get_user_by_username(username)
+    if user is None:
+        sys.exit(f"no user {username!r}")
+
+    def sync_request() -> None:
+        with DBManager() as db:
+            db.get_user_by_username(username)
+            db.get_all_orders(user_id=user.id)
+
+    async def async_request() -> None:
+        async with AsyncDBManager() as db:
+            await db.get_user_by_username(username)
+            await db.get_all_orders(user_id=user.id)
+
+    async def run(request) -> list[float]:
+        gate = asyncio.Semaphore(concurrency)
+
+        async def one() -> float:
+            async with gate:
+                t0 = time.perf_counter()          # includes waiting for a worker thread
+                await request()
+                return time.perf_counter() - t0
+
+        return await asyncio.gather(*(one() for _ in range(total)))
+
+    async def main() -> None:
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=40))
+        await run(lambda: asyncio.to_thread(sync_request))          # warm both pools
+        await run(async_request)
+
+        for name, request in (("sync + threadpool", lambda: asyncio.to_thread(sync_request)),
+                              ("asyncpg", async_request)):
+            t0 = time.perf_counter()
+            lat = np.asarray(await run(request)) * 1e3
+            wall = time.perf_counter() - t0
+            print(f"{name:18s} {total / wall:8.0f} req/s   p50 {np.percentile(lat, 50):6.1f} ms"
+                  f"   p99 {np.percentile(lat, 99):6.1f} ms")
+        await get_async_engine().dispose()
+
+    asyncio.run(main())
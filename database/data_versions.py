@@ -0,0 +1,61 @@
+# database/data_versions.py
+"""
+Per-user, per-resource change counters.
+
+Every DBManager write path that changes what an API list returns bumps the
+matching counter in the same transaction; the API derives its ETag from the
+counters alone, so a conditional request is answered with a primary-key
+lookup instead of the list query.
+"""
+from __future__ import annotations
+
+import hashlib
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import Select, select
+from sqlalchemy.dialects.postgresql import Insert, insert
+
+from database.models import DataVersion
+
+ORDERS = "orders"
+TRADES = "trades"
+POSITIONS = "positions"
+SNAPSHOT = "snapshot"
+RUNNERS = "runners"
+
+# NOTIFY channel fed by a trigger on data_versions (migration 4): every bump,
+# from any process, reaches the API's push stream
+CHANGE_CHANNEL = "data_changes"
+# username of every updated / deleted user (migration 6), whichever process
+# wrote it: drops that principal from the API's cache
+USER_CHANNEL = "user_changes"
+
+
+def pairs(user_ids: Iterable[int], *resources: str) -> list[tuple[int, str]]:
+    """Sorted, so concurrent bumpers lock rows in the same order."""
+    return sorted({(uid, r) for uid in user_ids if uid is not None for r in resources})
+
+
+def bump_stmt(keys: list[tuple[int, str]]) -> Insert:
+    """PostgreSQL upsert incrementing (or creating at 1) every (user_id, resource)."""
+    now = datetime.utcnow()
+    stmt = insert(DataVersion).values(
+        [{"user_id": uid, "resource": r, "version": 1, "updated_at": now} for uid, r in keys]
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "resource"],
+        set_={"version": DataVersion.version + 1, "updated_at": stmt.excluded.updated_at},
+    )
+
+
+def versions_stmt(user_id: int, resources: Iterable[str]) -> Select:
+    return select(DataVersion.resource, DataVersion.version).where(
+        DataVersion.user_id == user_id, DataVersion.resource.in_(list(resources))
+    )
+
+
+def etag(user_id: int, versions: dict[str, int], *salt: str) -> str:
+    """Weak ETag over the user, the resource versions and anything else the body depends on."""
+    key = "|".join([str(user_id), *(f"{r}={v}" for r, v in sorted(versions.items())), *salt])
+    return f'W/"{hashlib.blake2b(key.encode(), digest_size=12).hexdigest()}"'
@@ -2,27 +2,37 @@
 from __future__ import annotations
 
 import logging
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from sqlite3 import IntegrityError
 from typing import List, Sequence
 
-from sqlalchemy import func
+from sqlalchemy import and_, case, func, literal_column, or_, select
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 
 from api_gateway.security.auth import hash_password, verify_password
+from database import data_versions as dv
 from database.db_core import SessionLocal
+from database.history import HistoryFilter, orders_stmt, trades_stmt
+from database.snapshots import snapshot_values, upsert_stmt
 from database.models import (
     AccountSnapshot,
+    DataVersion,
     ExecutedTrade,
     OpenPosition,
     Order,
+    QualifiedContract,
     Runner,
+    SchedulerReplica,
     User,
+    UserLease,
 )
 
 logger = logging.getLogger(__name__)
 
+# net quantities at or below this count as flat (float fill quantities)
+FLAT_QUANTITY = 1e-9
+
 
 class DBManager:
     """
@@ -63,6 +73,27 @@ class DBManager:
             self.db.rollback()
             return False
 
+    def _bump_versions(self, user_ids, *resources: str) -> None:
+        """Bump data versions inside the current transaction (committed by the caller)."""
+        keys = dv.pairs(user_ids, *resources)
+        if not keys:
+            return
+        if self.db.bind.dialect.name == "postgresql":
+            self.db.execute(dv.bump_stmt(keys))
+            return
+        for uid, resource in keys:
+            row = self.db.get(DataVersion, (uid, resource))
+            if row is None:
+                self.db.add(DataVersion(user_id=uid, resource=resource, version=1))
+            else:
+                row.version += 1
+                row.updated_at = datetime.utcnow()
+
+    def get_data_versions(self, *, user_id: int, resources: Sequence[str]) -> dict[str, int]:
+        """Current version per resource; never-written resources are 0."""
+        found = dict(self.db.execute(dv.versions_stmt(user_id, resources)).all())
+        return {r: found.get(r, 0) for r in resources}
+
     # ───────────────────── users ─────────────────────
     def get_user_by_username(self, username: str) -> User | None:
         return self.db.query(User).filter(User.username == username).first()
@@ -109,24 +140,38 @@ class DBManager:
             .first()
         )
 
+    def get_latest_snapshot(self, *, user_id: int) -> AccountSnapshot | None:
+        return (
+            self.db.query(AccountSnapshot)
+            .filter(AccountSnapshot.user_id == user_id)
+            .order_by(AccountSnapshot.timestamp.desc())
+            .first()
+        )
+
     def create_account_snapshot(
         self, *, user_id: int, snapshot_data: dict
     ) -> AccountSnapshot | None:
-        snap = AccountSnapshot(
-            user_id=user_id,
-            timestamp=datetime.utcnow(),
-            total_cash_value=snapshot_data.get("TotalCashValue (USD)"),
-            net_liquidation=snapshot_data.get("NetLiquidation (USD)"),
-            available_funds=snapshot_data.get("AvailableFunds (USD)"),
-            buying_power=snapshot_data.get("BuyingPower (USD)"),
-            unrealized_pnl=snapshot_data.get("UnrealizedPnL (USD)"),
-            realized_pnl=snapshot_data.get("RealizedPnL (USD)"),
-            excess_liquidity=snapshot_data.get("ExcessLiquidity (USD)"),
-            gross_position_value=snapshot_data.get("GrossPositionValue (USD)"),
-            account=snapshot_data.get("account"),
-        )
-        self.db.add(snap)
-        return snap if self._commit("Insert snapshot") else None
+        """Store a snapshot; one taken earlier in the same refresh interval is overwritten."""
+        values = snapshot_values(user_id, snapshot_data)
+        if self.db.bind.dialect.name == "postgresql":
+            snap = self.db.scalar(
+                upsert_stmt(values).returning(AccountSnapshot),
+                execution_options={"populate_existing": True},
+            )
+        else:
+            snap = (
+                self.db.query(AccountSnapshot)
+                .filter_by(user_id=user_id, bucket=values["bucket"])
+                .first()
+            )
+            if snap is None:
+                snap = AccountSnapshot(**values)
+                self.db.add(snap)
+            else:
+                for key, value in values.items():
+                    setattr(snap, key, value)
+        self._bump_versions([user_id], dv.SNAPSHOT)
+        return snap if self._commit("Upsert snapshot") else None
 
     # ─────────────────── open positions ───────────────────
     def update_open_positions(self, *, user_id: int, positions: list[dict]) -> None:
@@ -141,6 +186,7 @@ class DBManager:
             )
             for p in positions
         )
+        self._bump_versions([user_id], dv.POSITIONS)
         self._commit("Update open positions")
 
     def get_open_positions(self, *, user_id: int) -> Sequence[OpenPosition]:
@@ -150,6 +196,7 @@ class DBManager:
     def create_runner(self, *, user_id: int, data: dict) -> Runner:
         runner = Runner(user_id=user_id, **data)
         self.db.add(runner)
+        self._bump_versions([user_id], dv.RUNNERS)
         try:
             self.db.commit()
             logger.info("Create runner – OK")
@@ -168,6 +215,9 @@ class DBManager:
             .filter(Runner.user_id == user_id, Runner.id.in_(ids))
             .delete(synchronize_session=False)
         )
+        if rows:
+            # their orders go with them (ON DELETE CASCADE), fills lose the link
+            self._bump_versions([user_id], dv.RUNNERS, dv.ORDERS, dv.TRADES)
         self._commit(f"Delete {rows} runner(s)")
         return rows
 
@@ -182,6 +232,8 @@ class DBManager:
                 synchronize_session=False,
             )
         )
+        if rows:
+            self._bump_versions([user_id], dv.RUNNERS)
         self._commit(f"{activation.capitalize()} {rows} runner(s)")
         return rows
 
@@ -191,6 +243,68 @@ class DBManager:
             .filter(Runner.user_id == user_id, Runner.activation == "active")
             .all()
         )
+    def get_runner(self, *, user_id: int, runner_id: int) -> Runner | None:
+        return (
+            self.db.query(Runner)
+            .filter(Runner.user_id == user_id, Runner.id == runner_id)
+            .first()
+        )
+
+    def get_all_active_runners(self) -> Sequence[Runner]:
+        return self.db.query(Runner).filter(Runner.activation == "active").all()
+
+    def get_runner_positions(self, *, runner_ids: List[int]) -> dict[int, dict]:
+        """
+        Net filled quantity, average entry price of the open lot and number
+        of working orders per runner, derived from the runner's orders.
+        The average only covers buys after the position was last flat, so a
+        re-opened position is not measured against closed lots.
+        """
+        if not runner_ids:
+            return {}
+        filled = func.coalesce(Order.filled_quantity, 0)
+        in_sequence = dict(partition_by=Order.runner_id, order_by=(Order.created_at, Order.id))
+        ledger = (
+            select(
+                Order.runner_id.label("runner_id"),
+                (Order.action == "BUY").label("is_buy"),
+                filled.label("qty"),
+                func.coalesce(Order.avg_fill_price, 0).label("price"),
+                Order.status.label("status"),
+                func.row_number().over(**in_sequence).label("seq"),
+                # net position right after this order
+                func.sum(case((Order.action == "BUY", filled), else_=-filled)).over(**in_sequence).label("running"),
+            )
+            .where(Order.runner_id.in_(runner_ids))
+            .subquery()
+        )
+        last_flat = (
+            select(ledger.c.runner_id, func.max(ledger.c.seq).label("seq"))
+            .where(ledger.c.running <= FLAT_QUANTITY)
+            .group_by(ledger.c.runner_id)
+            .subquery()
+        )
+        open_buy = and_(ledger.c.is_buy, ledger.c.seq > func.coalesce(last_flat.c.seq, 0))
+        buy_qty = func.sum(case((open_buy, ledger.c.qty), else_=0))
+        buy_cost = func.sum(case((open_buy, ledger.c.qty * ledger.c.price), else_=0))
+        working = func.sum(
+            case((ledger.c.status.in_(("PendingSubmit", "PreSubmitted", "Submitted")), 1), else_=0)
+        )
+        rows = self.db.execute(
+            select(
+                ledger.c.runner_id,
+                func.sum(case((ledger.c.is_buy, ledger.c.qty), else_=-ledger.c.qty)),
+                buy_cost / func.nullif(buy_qty, 0),
+                working,
+            )
+            .select_from(ledger.outerjoin(last_flat, last_flat.c.runner_id == ledger.c.runner_id))
+            .group_by(ledger.c.runner_id)
+        ).all()
+        return {
+            rid: {"quantity": qty or 0.0, "avg_price": avg or 0.0, "pending_orders": pend or 0}
+            for rid, qty, avg, pend in rows
+        }
+
     def get_existing_runner_id(self, user_id: int) -> int:
         runner = (
             self.db.query(Runner.id)
@@ -205,11 +319,17 @@ class DBManager:
             raise ValueError("order_data must include user_id")
         obj = Order(**order_data)
         self.db.add(obj)
+        self._bump_versions([order_data["user_id"]], dv.ORDERS)
         return obj if self._commit("Insert order") else None
 
-    def sync_orders(self, orders: List[dict]) -> None:
+    def sync_orders(self, orders: List[dict]) -> bool:
+        """
+        Upsert orders on `ibkr_perm_id`. Existing rows are only rewritten when
+        status / filled quantity / avg fill price actually changed, and a
+        stored `runner_id` is never replaced by NULL.
+        """
         if not orders:
-            return
+            return True
         if self.db.bind.dialect.name == "postgresql":
             insert_stmt = insert(Order).values(orders)
             update_cols = {
@@ -217,11 +337,24 @@ class DBManager:
                 for c in Order.__table__.columns
                 if c.name not in ("id", "ibkr_perm_id", "created_at")
             }
-            stmt = insert_stmt.on_conflict_do_update(
-                index_elements=["ibkr_perm_id"], set_=update_cols
+            # rows coming from IB carry no runner – keep the one we stored
+            update_cols["runner_id"] = func.coalesce(
+                insert_stmt.excluded.runner_id, Order.runner_id
             )
-            self.db.execute(stmt)
+            stmt = insert_stmt.on_conflict_do_update(
+                index_elements=["ibkr_perm_id"],
+                set_=update_cols,
+                where=or_(
+                    Order.status.is_distinct_from(insert_stmt.excluded.status),
+                    Order.filled_quantity.is_distinct_from(insert_stmt.excluded.filled_quantity),
+                    Order.avg_fill_price.is_distinct_from(insert_stmt.excluded.avg_fill_price),
+                    Order.runner_id.is_(None) & insert_stmt.excluded.runner_id.isnot(None),
+                ),
+            ).returning(Order.user_id)
+            # only users whose rows were actually inserted / rewritten
+            changed = set(self.db.scalars(stmt))
         else:
+            changed = {o["user_id"] for o in orders}
             for data in orders:
                 obj = (
                     self.db.query(Order)
@@ -230,26 +363,164 @@ class DBManager:
                 )
                 if obj:
                     for k, v in data.items():
+                        if k == "runner_id" and v is None:
+                            continue
                         setattr(obj, k, v)
                 else:
                     self.db.add(Order(**data))
-        self._commit(f"Sync {len(orders)} order(s)")
+        self._bump_versions(changed, dv.ORDERS)
+        return self._commit(f"Sync {len(orders)} order(s)")
 
-    # ─────────────────── executed trades ───────────────────
-    def sync_executed_trades(self, trades: List[dict]) -> None:
-        if not trades:
-            return
+    def get_order_fingerprints(self, *, user_id: int) -> dict[int, tuple]:
+        """`ibkr_perm_id → (status, filled_quantity, avg_fill_price)` as stored."""
+        rows = (
+            self.db.query(
+                Order.ibkr_perm_id, Order.status, Order.filled_quantity, Order.avg_fill_price
+            )
+            .filter(Order.user_id == user_id)
+            .all()
+        )
+        return {pid: (status, filled, avg) for pid, status, filled, avg in rows}
+
+    # ─────────────────── contracts ───────────────────
+    def get_qualified_contracts(self) -> Sequence[QualifiedContract]:
+        return self.db.query(QualifiedContract).all()
+
+    def upsert_qualified_contracts(self, contracts: List[dict]) -> bool:
+        """Insert or refresh contracts on (symbol, sec_type, exchange, currency)."""
+        if not contracts:
+            return True
         if self.db.bind.dialect.name == "postgresql":
-            insert_stmt = insert(ExecutedTrade).values(trades)
-            update_cols = {
-                c.name: getattr(insert_stmt.excluded, c.name)
-                for c in ExecutedTrade.__table__.columns
-                if c.name not in ("id", "perm_id", "fill_time")
-            }
+            insert_stmt = insert(QualifiedContract).values(contracts)
             stmt = insert_stmt.on_conflict_do_update(
-                constraint="uix_perm_id_fill_time", set_=update_cols
+                constraint="uix_contract_key",
+                set_={
+                    c: getattr(insert_stmt.excluded, c)
+                    for c in ("con_id", "primary_exchange", "local_symbol", "trading_class", "qualified_at")
+                },
             )
             self.db.execute(stmt)
+        else:
+            for data in contracts:
+                obj = (
+                    self.db.query(QualifiedContract)
+                    .filter_by(**{k: data[k] for k in ("symbol", "sec_type", "exchange", "currency")})
+                    .first()
+                )
+                if obj:
+                    for k, v in data.items():
+                        setattr(obj, k, v)
+                else:
+                    self.db.add(QualifiedContract(**data))
+        return self._commit(f"Upsert {len(contracts)} contract(s)")
+
+    # ─────────────────── scheduler sharding ───────────────────
+    def _db_now(self) -> datetime:
+        """The database's clock as naive UTC: one clock for every replica's heartbeats and leases."""
+        if self.db.bind.dialect.name == "postgresql":
+            return self.db.scalar(select(func.timezone("UTC", func.now())))
+        return self.db.scalar(select(func.current_timestamp()))
+
+    def heartbeat_replica(self, *, replica_id: str) -> None:
+        now = self._db_now()
+        obj = self.db.get(SchedulerReplica, replica_id)
+        if obj is None:
+            self.db.add(SchedulerReplica(replica_id=replica_id, started_at=now, heartbeat_at=now))
+        else:
+            obj.heartbeat_at = now
+        self._commit(f"Heartbeat {replica_id}")
+
+    def get_live_replicas(self, *, ttl: float) -> list[str]:
+        cutoff = self._db_now() - timedelta(seconds=ttl)
+        rows = (
+            self.db.query(SchedulerReplica.replica_id)
+            .filter(SchedulerReplica.heartbeat_at >= cutoff)
+            .all()
+        )
+        return [rid for (rid,) in rows]
+
+    def acquire_user_leases(self, *, replica_id: str, user_ids: List[int], ttl: float) -> list[int]:
+        """
+        Take or renew the lease of each user that is free, expired or already
+        ours; returns the user ids this replica now holds.
+        """
+        if not user_ids:
+            return []
+        now = self._db_now()
+        expires = now + timedelta(seconds=ttl)
+        if self.db.bind.dialect.name == "postgresql":
+            insert_stmt = insert(UserLease).values(
+                [{"user_id": uid, "replica_id": replica_id, "expires_at": expires} for uid in user_ids]
+            )
+            stmt = insert_stmt.on_conflict_do_update(
+                index_elements=["user_id"],
+                set_={"replica_id": insert_stmt.excluded.replica_id, "expires_at": insert_stmt.excluded.expires_at},
+                where=or_(UserLease.replica_id == insert_stmt.excluded.replica_id, UserLease.expires_at < now),
+            ).returning(UserLease.user_id)
+            held = [uid for (uid,) in self.db.execute(stmt)]
+        else:
+            held = []
+            for uid in user_ids:
+                obj = self.db.get(UserLease, uid)
+                if obj is None:
+                    self.db.add(UserLease(user_id=uid, replica_id=replica_id, expires_at=expires))
+                elif obj.replica_id == replica_id or obj.expires_at < now:
+                    obj.replica_id, obj.expires_at = replica_id, expires
+                else:
+                    continue
+                held.append(uid)
+        return held if self._commit(f"Lease {len(held)}/{len(user_ids)} user(s) to {replica_id}") else []
+
+    def release_user_leases(self, *, replica_id: str, keep: Sequence[int] = ()) -> int:
+        """Drop this replica's leases except `keep`; returns how many were released."""
+        q = self.db.query(UserLease).filter(UserLease.replica_id == replica_id)
+        if keep:
+            q = q.filter(UserLease.user_id.notin_(list(keep)))
+        released = q.delete(synchronize_session=False)
+        self._commit(f"Release {released} lease(s) of {replica_id}")
+        return released
+
+    def remove_replica(self, *, replica_id: str) -> None:
+        self.db.query(UserLease).filter(UserLease.replica_id == replica_id).delete(synchronize_session=False)
+        self.db.query(SchedulerReplica).filter(SchedulerReplica.replica_id == replica_id).delete(
+            synchronize_session=False
+        )
+        self._commit(f"Remove replica {replica_id}")
+
+    # ─────────────────── executed trades ───────────────────
+    def sync_executed_trades(
+        self, trades: List[dict], *, chunk_size: int = 1000
+    ) -> tuple[int, int]:
+        """
+        Upsert fills on (perm_id, fill_time), `chunk_size` rows per statement,
+        all in one transaction. Returns `(inserted, updated)`.
+        """
+        if not trades:
+            return 0, 0
+        inserted = updated = 0
+        changed: set[int] = set()
+        if self.db.bind.dialect.name == "postgresql":
+            for i in range(0, len(trades), chunk_size):
+                insert_stmt = insert(ExecutedTrade).values(trades[i : i + chunk_size])
+                update_cols = {
+                    c.name: getattr(insert_stmt.excluded, c.name)
+                    for c in ExecutedTrade.__table__.columns
+                    if c.name not in ("id", "perm_id", "fill_time")
+                }
+                # a re-synced fill that changed nothing is neither written nor
+                # returned, so it bumps no version; xmax = 0 only for rows
+                # this statement freshly inserted
+                stmt = insert_stmt.on_conflict_do_update(
+                    constraint="uix_perm_id_fill_time",
+                    set_=update_cols,
+                    where=or_(*(getattr(ExecutedTrade, c).is_distinct_from(v) for c, v in update_cols.items())),
+                ).returning(literal_column("(xmax = 0)"), ExecutedTrade.user_id)
+                for was_inserted, user_id in self.db.execute(stmt):
+                    changed.add(user_id)
+                    if was_inserted:
+                        inserted += 1
+                    else:
+                        updated += 1
         else:
             for t in trades:
                 obj = (
@@ -261,49 +532,42 @@ class DBManager:
                     .first()
                 )
                 if obj:
+                    if all(getattr(obj, k) == v for k, v in t.items()):
+                        continue
                     for k, v in t.items():
                         setattr(obj, k, v)
+                    updated += 1
                 else:
                     self.db.add(ExecutedTrade(**t))
-        self._commit(f"Sync {len(trades)} trade(s)")
-
-    # ─────────────────── read helpers ───────────────────
-    def get_all_orders(self, *, user_id: int) -> Sequence[Order]:
-        return (
-            self.db.query(Order)
-            .filter(Order.user_id == user_id)
-            .order_by(Order.created_at.desc())
-            .all()
-        )
+                    inserted += 1
+                changed.add(t["user_id"])
+        self._bump_versions(changed, dv.TRADES)
+        if not self._commit(f"Sync {len(trades)} trade(s) (+{inserted} ~{updated})"):
+            return 0, 0
+        return inserted, updated
 
-    def get_all_executed_trades(self, *, user_id: int) -> Sequence[ExecutedTrade]:
-        return (
-            self.db.query(ExecutedTrade)
+    def get_fill_watermarks(self, *, user_id: int) -> dict[str, datetime]:
+        """Latest stored `fill_time` per account for `user_id`."""
+        rows = (
+            self.db.query(ExecutedTrade.account, func.max(ExecutedTrade.fill_time))
             .filter(ExecutedTrade.user_id == user_id)
-            .order_by(ExecutedTrade.fill_time.desc())
+            .group_by(ExecutedTrade.account)
             .all()
         )
+        return {account or "": ts for account, ts in rows if ts is not None}
+
+    # ─────────────────── read helpers ───────────────────
+    def get_all_orders(self, *, user_id: int, page: HistoryFilter = HistoryFilter()) -> Sequence[Order]:
+        return self.db.scalars(orders_stmt(user_id=user_id, f=page)).all()
+
+    def get_all_executed_trades(self, *, user_id: int, page: HistoryFilter = HistoryFilter()) -> Sequence[ExecutedTrade]:
+        return self.db.scalars(trades_stmt(user_id=user_id, f=page)).all()
 
     # runner-scoped
-    def get_runner_orders(self, *, user_id: int, runner_id: int) -> Sequence[Order]:
-        return (
-            self.db.query(Order)
-            .filter(Order.user_id == user_id, Order.runner_id == runner_id)
-            .order_by(Order.created_at.desc())
-            .all()
-        )
+    def get_runner_orders(self, *, user_id: int, runner_id: int, page: HistoryFilter = HistoryFilter()) -> Sequence[Order]:
+        return self.db.scalars(orders_stmt(user_id=user_id, runner_id=runner_id, f=page)).all()
 
     def get_runner_trades(
-        self, *, user_id: int, runner_id: int
+        self, *, user_id: int, runner_id: int, page: HistoryFilter = HistoryFilter()
     ) -> Sequence[ExecutedTrade]:
-        subq = (
-            self.db.query(Order.ibkr_perm_id)
-            .filter(Order.user_id == user_id, Order.runner_id == runner_id)
-            .subquery()
-        )
-        return (
-            self.db.query(ExecutedTrade)
-            .filter(ExecutedTrade.user_id == user_id, ExecutedTrade.perm_id.in_(subq))
-            .order_by(ExecutedTrade.fill_time.desc())
-            .all()
-        )
+        return self.db.scalars(trades_stmt(user_id=user_id, runner_id=runner_id, f=page)).all()
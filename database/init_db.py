@@ -1,8 +1,8 @@
 import time
 import logging
 from sqlalchemy.exc import OperationalError
-from database.models import Base
 from database.db_core import engine
+from database.migrations import migrate
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -13,9 +13,9 @@ def create_tables():
 
     for attempt in range(1, max_retries + 1):
         try:
-            logger.info(f"Attempt {attempt} of {max_retries}: Creating tables via Base.metadata.create_all...")
-            Base.metadata.create_all(bind=engine)
-            logger.info("Table creation completed.")
+            logger.info(f"Attempt {attempt} of {max_retries}: Applying schema migrations...")
+            migrate(engine)
+            logger.info("Schema migration completed.")
             return
         except OperationalError as e:
             logger.warning(f"DB not ready yet: {e}")
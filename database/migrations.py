@@ -0,0 +1,125 @@
+# database/migrations.py
+"""
+Versioned schema migrations, applied in order by `init_db`.
+
+Version 1 is the historical `Base.metadata.create_all` (it creates whatever
+tables are missing); every later schema change is a numbered step here, so
+existing databases get ALTERs / indexes that `create_all` would never add.
+Applied versions are recorded in `schema_migrations`; all pending steps run
+in one transaction under an advisory lock, so concurrent starts are safe.
+"""
+import logging
+from typing import Callable, NamedTuple
+
+from sqlalchemy import Connection, Engine, Index, insert, inspect, select, text
+
+from database.data_versions import CHANGE_CHANNEL, USER_CHANNEL
+from database.models import AccountSnapshot, Base, DataVersion, ExecutedTrade, Order, SchemaMigration
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_LOCK_ID = 0x1B4D_0001          # pg_advisory_xact_lock key
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[Connection], None]
+
+
+def _index(model, name: str) -> Index:
+    return next(ix for ix in model.__table__.indexes if ix.name == name)
+
+
+# ───────────────────── steps ─────────────────────
+def _baseline(conn: Connection) -> None:
+    Base.metadata.create_all(conn)
+
+
+def _history_indexes(conn: Connection) -> None:
+    for model, name in (
+        (Order, "ix_orders_user_created"),
+        (Order, "ix_orders_user_symbol_created"),
+        (Order, "ix_orders_runner_created"),
+        (ExecutedTrade, "ix_trades_user_fill"),
+        (ExecutedTrade, "ix_trades_user_symbol_fill"),
+    ):
+        _index(model, name).create(conn, checkfirst=True)
+
+
+def _data_versions(conn: Connection) -> None:
+    DataVersion.__table__.create(conn, checkfirst=True)
+
+
+def _change_notify(conn: Connection) -> None:
+    if conn.dialect.name != "postgresql":
+        return
+    conn.execute(text(f"""
+        CREATE OR REPLACE FUNCTION notify_data_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('{CHANGE_CHANNEL}', json_build_object(
+                'user_id', NEW.user_id, 'resource', NEW.resource, 'version', NEW.version)::text);
+            RETURN NEW;
+        END $$ LANGUAGE plpgsql
+    """))
+    conn.execute(text("DROP TRIGGER IF EXISTS data_versions_notify ON data_versions"))
+    conn.execute(text(
+        "CREATE TRIGGER data_versions_notify AFTER INSERT OR UPDATE ON data_versions "
+        "FOR EACH ROW EXECUTE FUNCTION notify_data_change()"
+    ))
+
+
+def _user_notify(conn: Connection) -> None:
+    if conn.dialect.name != "postgresql":
+        return
+    conn.execute(text(f"""
+        CREATE OR REPLACE FUNCTION notify_user_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('{USER_CHANNEL}', OLD.username);
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql
+    """))
+    conn.execute(text("DROP TRIGGER IF EXISTS users_notify ON users"))
+    conn.execute(text(
+        "CREATE TRIGGER users_notify AFTER UPDATE OR DELETE ON users "
+        "FOR EACH ROW EXECUTE FUNCTION notify_user_change()"
+    ))
+
+
+def _snapshot_buckets(conn: Connection) -> None:
+    # existing rows keep a NULL bucket: NULLs never collide in a unique index
+    if "bucket" not in {c["name"] for c in inspect(conn).get_columns("account_snapshots")}:
+        conn.execute(text("ALTER TABLE account_snapshots ADD COLUMN bucket BIGINT"))
+    for name in ("uix_snapshots_user_bucket", "ix_snapshots_user_time"):
+        _index(AccountSnapshot, name).create(conn, checkfirst=True)
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "baseline", _baseline),
+    Migration(2, "order/trade history keyset indexes", _history_indexes),
+    Migration(3, "per-user data versions", _data_versions),
+    Migration(4, "notify on data version bumps", _change_notify),
+    Migration(5, "one account snapshot per refresh interval", _snapshot_buckets),
+    Migration(6, "notify on user changes", _user_notify),
+]
+
+
+# ───────────────────── runner ─────────────────────
+def migrate(engine: Engine) -> list[int]:
+    """Apply pending migrations; returns the versions applied."""
+    applied = []
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_ID})
+        SchemaMigration.__table__.create(conn, checkfirst=True)
+        done = set(conn.scalars(select(SchemaMigration.version)))
+        for m in sorted(MIGRATIONS, key=lambda m: m.version):
+            if m.version in done:
+                continue
+            logger.info("Applying migration %d: %s", m.version, m.name)
+            m.apply(conn)
+            conn.execute(insert(SchemaMigration).values(version=m.version, name=m.name))
+            applied.append(m.version)
+    if not applied:
+        logger.info("Schema is up to date (version %d).", max(done, default=0))
+    return applied
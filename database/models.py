@@ -3,10 +3,12 @@ from __future__ import annotations
 
 from datetime import datetime
 from sqlalchemy import (
+    BigInteger,
     Column,
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     UniqueConstraint,
@@ -40,12 +42,20 @@ class User(Base):
 # ───────────────────── Account snapshots ─────────────────────
 class AccountSnapshot(Base):
     __tablename__ = "account_snapshots"
+    __table_args__ = (
+        # at most one snapshot per user and refresh interval
+        Index("uix_snapshots_user_bucket", "user_id", "bucket", unique=True),
+        Index("ix_snapshots_user_time", "user_id", "timestamp"),
+    )
 
     id        = Column(Integer, primary_key=True, index=True)
     user_id   = Column(
         Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
     )
     timestamp = Column(DateTime, default=datetime.utcnow)
+    # refresh interval the snapshot was taken in (see database.snapshots);
+    # NULL on rows written before migration 5
+    bucket    = Column(BigInteger)
     account   = Column(String, nullable=False)
 
     total_cash_value     = Column(Float)
@@ -107,9 +117,34 @@ class Runner(Base):
         passive_deletes=True,
     )
 
+# ──────────────────── Qualified contracts ────────────────────
+class QualifiedContract(Base):
+    __tablename__  = "qualified_contracts"
+    __table_args__ = (
+        UniqueConstraint("symbol", "sec_type", "exchange", "currency", name="uix_contract_key"),
+    )
+
+    id       = Column(Integer, primary_key=True)
+    symbol   = Column(String, nullable=False)
+    sec_type = Column(String, nullable=False)
+    exchange = Column(String, nullable=False)
+    currency = Column(String, nullable=False)
+
+    con_id           = Column(Integer, nullable=False)
+    primary_exchange = Column(String)
+    local_symbol     = Column(String)
+    trading_class    = Column(String)
+    qualified_at     = Column(DateTime, default=datetime.utcnow, nullable=False)
+
 # ─────────────────────────── Order ────────────────────────────
 class Order(Base):
-    __tablename__ = "orders"
+    __tablename__  = "orders"
+    __table_args__ = (
+        # keyset pages of `database.history`: newest first on (created_at, id)
+        Index("ix_orders_user_created", "user_id", "created_at", "id"),
+        Index("ix_orders_user_symbol_created", "user_id", "symbol", "created_at", "id"),
+        Index("ix_orders_runner_created", "runner_id", "created_at", "id"),
+    )
 
     id        = Column(Integer, primary_key=True, index=True)
     user_id   = Column(
@@ -148,6 +183,8 @@ class ExecutedTrade(Base):
     __tablename__  = "executed_trades"
     __table_args__ = (
         UniqueConstraint("perm_id", "fill_time", name="uix_perm_id_fill_time"),
+        Index("ix_trades_user_fill", "user_id", "fill_time", "id"),
+        Index("ix_trades_user_symbol_fill", "user_id", "symbol", "fill_time", "id"),
     )
 
     id      = Column(Integer, primary_key=True)
@@ -166,3 +203,40 @@ class ExecutedTrade(Base):
     price      = Column(Float)
     fill_time  = Column(DateTime)
     account    = Column(String)
+
+# ─────────────────── Scheduler sharding ───────────────────
+class SchedulerReplica(Base):
+    __tablename__ = "scheduler_replicas"
+
+    replica_id   = Column(String, primary_key=True)
+    started_at   = Column(DateTime, default=datetime.utcnow, nullable=False)
+    heartbeat_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+class UserLease(Base):
+    __tablename__ = "user_leases"
+
+    user_id    = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    replica_id = Column(String, nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False)
+
+# ───────────────────── Schema migrations ─────────────────────
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+
+    version    = Column(Integer, primary_key=True)
+    name       = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+# ───────────────────── Data versions ─────────────────────
+class DataVersion(Base):
+    """Per-user change counter of one API resource (ETag source)."""
+    __tablename__ = "data_versions"
+
+    user_id    = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    resource   = Column(String, primary_key=True)
+    version    = Column(BigInteger, nullable=False, default=1)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
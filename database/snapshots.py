@@ -0,0 +1,58 @@
+# database/snapshots.py
+"""
+Account snapshot refresh intervals.
+
+A snapshot belongs to the interval it was taken in: `bucket` is the UTC
+epoch divided by `SNAPSHOT_REFRESH_INTERVAL`, and (user_id, bucket) is
+unique. However many writers race – API requests, several API workers,
+the scheduler – a user gets at most one row per interval; later writers in
+the same interval overwrite it (`upsert_stmt`).
+"""
+from __future__ import annotations
+
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy.dialects.postgresql import Insert, insert
+
+from database.models import AccountSnapshot
+
+SNAPSHOT_REFRESH_INTERVAL = int(os.getenv("SNAPSHOT_REFRESH_INTERVAL", 15 * 60))   # s
+
+# column ← key of `IBBusinessManager.get_account_information()`
+FIELDS = {
+    "total_cash_value": "TotalCashValue (USD)",
+    "net_liquidation": "NetLiquidation (USD)",
+    "available_funds": "AvailableFunds (USD)",
+    "buying_power": "BuyingPower (USD)",
+    "unrealized_pnl": "UnrealizedPnL (USD)",
+    "realized_pnl": "RealizedPnL (USD)",
+    "excess_liquidity": "ExcessLiquidity (USD)",
+    "gross_position_value": "GrossPositionValue (USD)",
+    "account": "account",
+}
+
+
+def bucket_of(ts: datetime) -> int:
+    """Refresh interval of a naive-UTC timestamp."""
+    return int(ts.replace(tzinfo=timezone.utc).timestamp()) // SNAPSHOT_REFRESH_INTERVAL
+
+
+def current_bucket() -> int:
+    return bucket_of(datetime.utcnow())
+
+
+def snapshot_values(user_id: int, snapshot_data: dict, now: Optional[datetime] = None) -> dict:
+    now = now or datetime.utcnow()
+    values = {col: snapshot_data.get(key) for col, key in FIELDS.items()}
+    return {"user_id": user_id, "timestamp": now, "bucket": bucket_of(now), **values}
+
+
+def upsert_stmt(values: dict) -> Insert:
+    """PostgreSQL insert of one snapshot that overwrites the row of the same interval."""
+    stmt = insert(AccountSnapshot).values(values)
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "bucket"],
+        set_={col: stmt.excluded[col] for col in ("timestamp", *FIELDS)},
+    )
@@ -0,0 +1,194 @@
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from functools import partial
+from typing import Callable, Optional
+
+from eventkit import Event
+from ib_insync import IB, Stock
+
+from ib_manager.contract_cache import ContractKey, contract_cache
+from ib_manager.session_calendar import EASTERN
+
+# ──────────── Setup Logging ────────────
+log = logging.getLogger("IBKR-Bar-Aggregator")
+
+REALTIME_BAR_SECONDS = 5        # the only size IB serves for real-time bars
+DAY_SECONDS = 86_400
+
+
+@dataclass(frozen=True)
+class ClosedBar:
+    symbol: str
+    time_frame: int               # minutes
+    t: int                        # bar start, epoch seconds
+    o: float
+    h: float
+    l: float
+    c: float
+    v: float
+
+
+def bucket_bounds(t: int, time_frame: int) -> tuple[int, int]:
+    """
+    [start, end) of the `time_frame`-minute bar containing epoch second `t`.
+    Intraday bars are epoch-aligned (like Finnhub candles and `resample`);
+    daily and longer bars are aligned to US/Eastern midnight.
+    """
+    seconds = time_frame * 60
+    if seconds < DAY_SECONDS:
+        start = t - t % seconds
+        return start, start + seconds
+    # the wall-clock date at `t`, then the real instants of its midnights –
+    # days around a DST switch are 23 / 25 hours long
+    days = seconds // DAY_SECONDS
+    day = datetime.fromtimestamp(t, EASTERN).date().toordinal()
+    first = day - (day - _EPOCH_ORDINAL) % days
+    return _eastern_midnight(first), _eastern_midnight(first + days)
+
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _eastern_midnight(ordinal: int) -> int:
+    return int(EASTERN.localize(datetime.combine(date.fromordinal(ordinal), time())).timestamp())
+
+
+class _Bucket:
+    """The bar being built for one (symbol, time frame)."""
+
+    __slots__ = ("time_frame", "start", "end", "o", "h", "l", "c", "v")
+
+    def __init__(self, time_frame: int) -> None:
+        self.time_frame = time_frame
+        self.start = self.end = -1
+        self.o = self.h = self.l = self.c = self.v = 0.0
+
+    def is_open(self) -> bool:
+        return self.start >= 0
+
+    def reset(self, t: int, o: float, h: float, l: float, c: float, v: float) -> None:
+        self.start, self.end = bucket_bounds(t, self.time_frame)
+        self.o, self.h, self.l, self.c, self.v = o, h, l, c, v
+
+    def add(self, h: float, l: float, c: float, v: float) -> None:
+        if h > self.h:
+            self.h = h
+        if l < self.l:
+            self.l = l
+        self.c = c
+        self.v += v
+
+    def close(self, symbol: str) -> ClosedBar:
+        bar = ClosedBar(symbol, self.time_frame, self.start, self.o, self.h, self.l, self.c, self.v)
+        self.start = self.end = -1
+        return bar
+
+
+class BarAggregator:
+    """
+    Rolls IB 5-second real-time bars into every runner time frame.
+
+    One `reqRealTimeBars` subscription per symbol, whatever the number of
+    time frames or runners; each update touches one `_Bucket` per distinct
+    time frame of that symbol (O(1) per update). A bar is published on
+    `closedBarEvent` as soon as the 5-second bar that ends it arrives, or
+    when the first update of the next bar shows it is over (gaps, session
+    ends, daily bars).
+    """
+
+    def __init__(self, ib: IB, *, what_to_show: str = "TRADES", use_rth: bool = False) -> None:
+        self.ib = ib
+        self.what_to_show = what_to_show
+        self.use_rth = use_rth
+        self.closedBarEvent = Event("closedBarEvent")
+        self._subs: dict[str, object] = {}
+        self._handlers: dict[str, Callable] = {}
+        self._buckets: dict[str, dict[int, _Bucket]] = {}
+        # IB drops market data subscriptions with the socket; the pool
+        # reconnects the same `IB` object, so re-request them when it does
+        ib.connectedEvent += self._resubscribe
+
+    # ───────────────────── subscriptions ─────────────────────
+    def sync(self, wanted: dict[str, set[int]]) -> None:
+        """Make the subscriptions match `symbol → {time frames}`."""
+        for symbol in list(self._subs):
+            if symbol not in wanted:
+                self.unsubscribe(symbol)
+        for symbol, frames in wanted.items():
+            self.subscribe(symbol, frames)
+
+    def subscribe(self, symbol: str, time_frames: set[int]) -> None:
+        symbol = symbol.upper()
+        buckets = self._buckets.setdefault(symbol, {})
+        for tf in set(buckets) - set(time_frames):
+            del buckets[tf]
+        for tf in time_frames:
+            buckets.setdefault(tf, _Bucket(tf))
+
+        if symbol not in self._subs:
+            self._request(symbol)
+            log.info("Subscribed to real-time bars for %s → %s min", symbol, sorted(time_frames))
+
+    def _request(self, symbol: str) -> None:
+        contract = contract_cache.get(ContractKey.stock(symbol)) or Stock(symbol, "SMART", "USD")
+        bars = self.ib.reqRealTimeBars(contract, REALTIME_BAR_SECONDS, self.what_to_show, self.use_rth)
+        handler = self._handlers[symbol] = partial(self._on_update, symbol)
+        bars.updateEvent += handler
+        self._subs[symbol] = bars
+
+    def _detach(self, symbol: str, bars) -> None:
+        handler = self._handlers.pop(symbol, None)
+        if handler is not None:
+            bars.updateEvent -= handler
+
+    def _resubscribe(self) -> None:
+        # the old lists are dead after a reconnect; stop listening to them
+        for symbol, bars in list(self._subs.items()):
+            self._detach(symbol, bars)
+            self._request(symbol)
+        if self._subs:
+            log.info("Re-requested real-time bars for %d symbol(s) after reconnect", len(self._subs))
+
+    def unsubscribe(self, symbol: str) -> None:
+        bars = self._subs.pop(symbol, None)
+        self._buckets.pop(symbol, None)
+        if bars is not None:
+            self._detach(symbol, bars)
+            try:
+                self.ib.cancelRealTimeBars(bars)
+            except Exception as e:
+                log.warning("Cancelling real-time bars for %s failed: %s", symbol, e)
+            log.info("Unsubscribed from real-time bars for %s", symbol)
+
+    def close(self) -> None:
+        self.ib.connectedEvent -= self._resubscribe
+        for symbol in list(self._subs):
+            self.unsubscribe(symbol)
+
+    @property
+    def symbols(self) -> set[str]:
+        return set(self._subs)
+
+    # ───────────────────── aggregation ─────────────────────
+    def _on_update(self, symbol: str, bars, has_new_bar: bool) -> None:
+        if not has_new_bar or not bars:
+            return
+        b = bars[-1]
+        self.update(symbol, int(b.time.timestamp()), b.open_, b.high, b.low, b.close, float(b.volume))
+
+    def update(self, symbol: str, t: int, o: float, h: float, l: float, c: float, v: float) -> None:
+        """Feed one 5-second bar starting at epoch second `t`."""
+        buckets: Optional[dict[int, _Bucket]] = self._buckets.get(symbol)
+        if not buckets:
+            return
+        bar_end = t + REALTIME_BAR_SECONDS
+        for bucket in buckets.values():
+            if bucket.is_open() and t >= bucket.end:
+                self.closedBarEvent.emit(bucket.close(symbol))
+            if bucket.is_open():
+                bucket.add(h, l, c, v)
+            else:
+                bucket.reset(t, o, h, l, c, v)
+            if bar_end >= bucket.end:
+                self.closedBarEvent.emit(bucket.close(symbol))
@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BAR_STORE_DIR = Path(os.getenv("BAR_STORE_DIR", "data/bars"))
+
+COLUMNS = ("t", "o", "h", "l", "c", "v")
+DTYPES = {"t": np.int64, "o": np.float64, "h": np.float64, "l": np.float64, "c": np.float64, "v": np.float64}
+
+# fetch(symbol, resolution, start, end) → {"t": [...], "o": [...], ...} (may be empty) or None on failure
+BarFetcher = Callable[[str, str, int, int], Optional[dict]]
+
+
+def resolution_seconds(resolution: str) -> int:
+    """Finnhub resolution ('1', '5', …, 'D', 'W', 'M') → bar length in seconds."""
+    if resolution.isdigit():
+        return int(resolution) * 60
+    return {"D": 86_400, "W": 7 * 86_400, "M": 30 * 86_400}[resolution]
+
+
+def _merge_intervals(intervals: list[list[int]]) -> list[list[int]]:
+    out: list[list[int]] = []
+    for a, b in sorted(intervals):
+        if out and a <= out[-1][1]:
+            out[-1][1] = max(out[-1][1], b)
+        else:
+            out.append([a, b])
+    return out
+
+
+_GENERATION_FILE = re.compile(r"^([a-z])(?:\.(\d+))?\.npy$")
+
+
+class _Series:
+    """
+    Memory-mapped columns plus the time ranges already fetched for one key.
+
+    Column files are never rewritten in place: a merge writes a new
+    generation (`c.<gen>.npy`) and then switches `meta.json` to it, so slices
+    handed out earlier keep reading the old, unchanged maps. Superseded
+    generations are deleted once nothing maps them any more – on Windows a
+    mapped file cannot be removed, so that is retried on later merges.
+    """
+
+    __slots__ = ("path", "cols", "coverage", "generation", "lock")
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.cols: dict[str, np.ndarray] = {}
+        self.coverage: list[list[int]] = []
+        self.generation = 0
+        meta = path / "meta.json"
+        if meta.exists():
+            info = json.loads(meta.read_text())
+            self.coverage = info["coverage"]
+            self.generation = info.get("generation", 0)      # 0: files from before generations
+            self.cols = self._open(self.generation)
+        else:
+            self.cols = {c: np.empty(0, dtype=DTYPES[c]) for c in COLUMNS}
+
+    def _file(self, column: str, generation: int) -> Path:
+        return self.path / (f"{column}.npy" if generation == 0 else f"{column}.{generation}.npy")
+
+    def _open(self, generation: int) -> dict[str, np.ndarray]:
+        return {c: np.load(self._file(c, generation), mmap_mode="r") for c in COLUMNS}
+
+    def _remove_stale(self) -> None:
+        for f in self.path.glob("*.npy*"):
+            m = _GENERATION_FILE.match(f.name)
+            if m and int(m.group(2) or 0) == self.generation:
+                continue
+            try:
+                f.unlink()
+            except OSError:      # still mapped (Windows) – next merge tries again
+                pass
+
+    def missing(self, start: int, end: int, min_gap: int) -> list[tuple[int, int]]:
+        gaps, cursor = [], start
+        for a, b in self.coverage:
+            if b < cursor:
+                continue
+            if a > end:
+                break
+            if a > cursor:
+                gaps.append((cursor, a))
+            cursor = max(cursor, b)
+        if cursor < end:
+            gaps.append((cursor, end))
+        return [(a, b) for a, b in gaps if b - a >= min_gap]
+
+    def merge(self, chunks: list[dict], covered: list[tuple[int, int]]) -> None:
+        parts = [self.cols] + [
+            {c: np.asarray(ch.get(c, ()), dtype=DTYPES[c]) for c in COLUMNS} for ch in chunks
+        ]
+        merged = {c: np.concatenate([p[c] for p in parts]) for c in COLUMNS}
+        # keep the *last* occurrence of each timestamp – newer data wins
+        t = merged["t"]
+        order = np.argsort(t, kind="stable")
+        t_sorted = t[order]
+        keep = np.ones(len(t_sorted), dtype=bool)
+        keep[:-1] = t_sorted[1:] != t_sorted[:-1]
+        idx = order[keep]
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        generation = max([self.generation] + [
+            int(m.group(2)) for f in self.path.glob("*.npy")
+            if (m := _GENERATION_FILE.match(f.name)) and m.group(2)
+        ]) + 1
+        for c in COLUMNS:
+            with open(self._file(c, generation), "wb") as fh:
+                np.save(fh, np.ascontiguousarray(merged[c][idx]))
+        coverage = _merge_intervals(self.coverage + [list(r) for r in covered])
+        # the pointer switch is the only replace, and meta.json is never mapped
+        tmp = self.path / "meta.json.tmp"
+        tmp.write_text(json.dumps({"coverage": coverage, "generation": generation}))
+        os.replace(tmp, self.path / "meta.json")
+        self.coverage, self.generation = coverage, generation
+        self.cols = self._open(generation)
+        self._remove_stale()
+
+    def slice(self, start: int, end: int) -> dict[str, np.ndarray]:
+        t = self.cols["t"]
+        lo, hi = np.searchsorted(t, start, "left"), np.searchsorted(t, end, "right")
+        return {c: self.cols[c][lo:hi] for c in COLUMNS}
+
+
+class BarStore:
+    """
+    Persistent OHLCV store keyed by (symbol, resolution).
+
+    Each key is a directory of one `.npy` file per column (t, o, h, l, c, v),
+    read back memory-mapped, plus `meta.json` listing the time ranges already
+    fetched (closed-market ranges included, so they are never re-requested).
+    `get()` fetches only the uncovered parts of the requested window, merges
+    them in, and returns read-only column views of the window.
+    """
+
+    def __init__(self, root: Path = BAR_STORE_DIR) -> None:
+        self.root = Path(root)
+        self._series: dict[tuple[str, str], _Series] = {}
+        self._lock = threading.Lock()
+
+    def _get_series(self, symbol: str, resolution: str) -> _Series:
+        key = (symbol.upper(), resolution)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                safe = re.sub(r"[^A-Za-z0-9_.-]", "_", key[0])
+                series = self._series[key] = _Series(self.root / safe / key[1])
+            return series
+
+    def get(
+        self, symbol: str, resolution: str, start: int, end: int, fetch: BarFetcher
+    ) -> Optional[dict[str, np.ndarray]]:
+        """Bars with `start <= t <= end` (epoch seconds); None if a needed fetch failed."""
+        bar = resolution_seconds(resolution)
+        series = self._get_series(symbol, resolution)
+        with series.lock:
+            gaps = series.missing(start, end, min_gap=bar)
+            if gaps:
+                # the bar still forming is stored but not marked covered, so it
+                # is re-read once it has closed
+                closed_until = int(time.time()) // bar * bar
+                chunks, covered = [], []
+                for a, b in gaps:
+                    data = fetch(symbol, resolution, max(start, a - bar), b)
+                    if data is None:
+                        return None
+                    chunks.append(data)
+                    if a < min(b, closed_until):
+                        covered.append((a, min(b, closed_until)))
+                series.merge(chunks, covered)
+                logger.info("Bar store %s [%s]: fetched %d gap(s), %d bars stored",
+                            symbol, resolution, len(gaps), len(series.cols["t"]))
+            return series.slice(start, end)
+
+
+bar_store = BarStore()
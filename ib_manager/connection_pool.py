@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Optional
+
+from ib_insync import IB
+
+# ──────────── Setup Logging ────────────
+log = logging.getLogger("IBKR-Connection-Pool")
+
+# ──────────── Constants ────────────
+IB_CONNECTION_TIMEOUT = int(os.getenv("IB_CONNECTION_TIMEOUT", 60))
+IB_POOL_HEALTH_INTERVAL = float(os.getenv("IB_POOL_HEALTH_INTERVAL", 30))
+IB_POOL_HEALTH_TIMEOUT = float(os.getenv("IB_POOL_HEALTH_TIMEOUT", 10))
+IB_POOL_BACKOFF_MIN = float(os.getenv("IB_POOL_BACKOFF_MIN", 1))
+IB_POOL_BACKOFF_MAX = float(os.getenv("IB_POOL_BACKOFF_MAX", 60))
+
+
+def gateway_address(user) -> tuple[str, int]:
+    """Host/port of the IB Gateway serving `user` (from env in production)."""
+    host = os.getenv("IB_GATEWAY_HOST", "ib-gateway-1")
+    port = int(os.getenv("IB_GATEWAY_PORT", 4004))
+    return host, port
+
+
+@dataclass(eq=False)
+class PooledConnection:
+    """One long-lived `IB` instance plus its reconnect / health bookkeeping."""
+
+    key: tuple[int, str, int, int]
+    user_id: int
+    host: str
+    port: int
+    client_id: int
+    ib: IB = field(default_factory=IB)
+
+    leases: int = 0
+    failures: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+    last_error: Optional[str] = None
+    closing: bool = False
+    connected: asyncio.Event = field(default_factory=asyncio.Event)
+    reconnect_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_connected(self) -> bool:
+        return self.ib.isConnected()
+
+
+class IBConnectionPool:
+    """
+    Long-lived pool of IB Gateway connections keyed by (user, gateway, client id).
+
+    Callers borrow a connected `IB` through `lease()`; the same instance is
+    shared by concurrent leases and kept open between them, so the API
+    handshake is paid once per gateway. Dropped connections are re-established
+    in the background with exponential backoff, and a periodic health check
+    pings every connection with `reqCurrentTime`.
+    """
+
+    def __init__(
+        self,
+        *,
+        client_id_offset: int = 0,
+        idle_timeout: Optional[float] = None,
+        health_interval: float = IB_POOL_HEALTH_INTERVAL,
+    ) -> None:
+        self.client_id_offset = client_id_offset
+        self.idle_timeout = idle_timeout
+        self.health_interval = health_interval
+        self._conns: dict[tuple[int, str, int, int], PooledConnection] = {}
+        self._health_task: Optional[asyncio.Task] = None
+
+    # ───────────────────── lifecycle ─────────────────────
+    async def start(self) -> None:
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_loop(), name="ib-pool-health")
+
+    async def close(self) -> None:
+        if self._health_task:
+            self._health_task.cancel()
+            self._health_task = None
+        for conn in list(self._conns.values()):
+            self._drop(conn)
+        self._conns.clear()
+
+    # ───────────────────── leasing ─────────────────────
+    @asynccontextmanager
+    async def lease(self, user, *, timeout: float = IB_CONNECTION_TIMEOUT) -> AsyncIterator[IB]:
+        """Borrow the pooled, connected `IB` for `user`; never disconnects on exit."""
+        conn = self._get_or_create(user)
+        conn.leases += 1
+        try:
+            if not conn.is_connected:
+                self._schedule_reconnect(conn)
+                try:
+                    await asyncio.wait_for(conn.connected.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    raise ConnectionError(
+                        f"IB Gateway {conn.host}:{conn.port} (cid={conn.client_id}) "
+                        f"not connected after {timeout:.0f}s: {conn.last_error}"
+                    ) from None
+            yield conn.ib
+        finally:
+            conn.leases -= 1
+            conn.last_used = time.monotonic()
+
+    def release(self, user_id: int) -> None:
+        """Disconnect and forget the connections of `user_id`, freeing its client ids."""
+        for conn in [c for c in self._conns.values() if c.user_id == user_id]:
+            self._drop(conn)
+            self._conns.pop(conn.key, None)
+            log.info("Pool: released user=%s cid=%s", user_id, conn.client_id)
+
+    def connections(self) -> list[PooledConnection]:
+        return list(self._conns.values())
+
+    def get(self, user) -> Optional[PooledConnection]:
+        host, port = gateway_address(user)
+        return self._conns.get(self._key(user, host, port))
+
+    # ───────────────────── internals ─────────────────────
+    def _key(self, user, host: str, port: int) -> tuple[int, str, int, int]:
+        return (user.id, host, port, self.client_id_offset + user.id)
+
+    def _get_or_create(self, user) -> PooledConnection:
+        host, port = gateway_address(user)
+        key = self._key(user, host, port)
+        conn = self._conns.get(key)
+        if conn is None:
+            conn = PooledConnection(
+                key=key, user_id=user.id, host=host, port=port, client_id=key[3]
+            )
+            conn.ib.disconnectedEvent += lambda c=conn: self._on_disconnected(c)
+            self._conns[key] = conn
+            log.info("Pool: new connection slot user=%s %s:%s cid=%s",
+                     user.id, host, port, conn.client_id)
+        return conn
+
+    def _on_disconnected(self, conn: PooledConnection) -> None:
+        conn.connected.clear()
+        if conn.closing:
+            return
+        log.warning("Pool: connection lost user=%s %s:%s cid=%s",
+                    conn.user_id, conn.host, conn.port, conn.client_id)
+        self._schedule_reconnect(conn)
+
+    def _schedule_reconnect(self, conn: PooledConnection) -> None:
+        if conn.closing:
+            return
+        if conn.reconnect_task is None or conn.reconnect_task.done():
+            conn.reconnect_task = asyncio.create_task(
+                self._reconnect(conn), name=f"ib-pool-reconnect-{conn.client_id}"
+            )
+
+    async def _reconnect(self, conn: PooledConnection) -> None:
+        while not conn.closing and not conn.is_connected:
+            try:
+                await conn.ib.connectAsync(
+                    host=conn.host,
+                    port=conn.port,
+                    clientId=conn.client_id,
+                    timeout=IB_CONNECTION_TIMEOUT,
+                )
+                if not conn.is_connected:
+                    raise ConnectionError("IB.isConnected() is False after connect")
+                conn.failures = 0
+                conn.last_error = None
+                conn.connected.set()
+                log.info("Pool: connected user=%s %s:%s cid=%s",
+                         conn.user_id, conn.host, conn.port, conn.client_id)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                conn.failures += 1
+                conn.last_error = repr(e)
+                delay = min(IB_POOL_BACKOFF_MAX, IB_POOL_BACKOFF_MIN * 2 ** (conn.failures - 1))
+                delay *= random.uniform(0.5, 1.0)
+                log.warning("Pool: connect failed user=%s cid=%s (attempt %d): %s – retry in %.1fs",
+                            conn.user_id, conn.client_id, conn.failures, e, delay)
+                conn.ib.disconnect()
+                await asyncio.sleep(delay)
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            now = time.monotonic()
+            for conn in list(self._conns.values()):
+                if (
+                    self.idle_timeout is not None
+                    and conn.leases == 0
+                    and now - conn.last_used > self.idle_timeout
+                ):
+                    log.info("Pool: evicting idle connection user=%s cid=%s",
+                             conn.user_id, conn.client_id)
+                    self._drop(conn)
+                    self._conns.pop(conn.key, None)
+                    continue
+                await self._check(conn)
+
+    async def _check(self, conn: PooledConnection) -> None:
+        if not conn.is_connected:
+            self._schedule_reconnect(conn)
+            return
+        try:
+            await asyncio.wait_for(conn.ib.reqCurrentTimeAsync(), timeout=IB_POOL_HEALTH_TIMEOUT)
+        except Exception as e:
+            conn.last_error = f"health check failed: {e!r}"
+            log.warning("Pool: health check failed user=%s cid=%s: %s",
+                        conn.user_id, conn.client_id, e)
+            conn.ib.disconnect()   # disconnectedEvent schedules the reconnect
+
+    @staticmethod
+    def _drop(conn: PooledConnection) -> None:
+        conn.closing = True
+        if conn.reconnect_task:
+            conn.reconnect_task.cancel()
+        try:
+            if conn.is_connected:
+                conn.ib.disconnect()
+        except Exception as e:
+            log.error("Pool: error disconnecting user=%s cid=%s: %s", conn.user_id, conn.client_id, e)
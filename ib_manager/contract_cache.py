@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Iterable, NamedTuple, Optional
+
+from ib_insync import IB, Contract
+
+from database.db_manager import DBManager
+
+# ──────────── Setup Logging ────────────
+log = logging.getLogger("IBKR-Contract-Cache")
+
+# ──────────── Constants ────────────
+CONTRACT_CACHE_TTL = float(os.getenv("CONTRACT_CACHE_TTL", 7 * 86_400))
+
+
+class ContractKey(NamedTuple):
+    symbol: str
+    sec_type: str = "STK"
+    exchange: str = "SMART"
+    currency: str = "USD"
+
+    @classmethod
+    def stock(cls, symbol: str) -> "ContractKey":
+        return cls(symbol.upper())
+
+
+class ContractCache:
+    """
+    Qualified contracts by (symbol, secType, exchange, currency).
+
+    Backed by the `qualified_contracts` table and loaded from it once;
+    `get` is a dict lookup, so the order path never has to qualify a symbol
+    that was warmed. `warm` qualifies what is missing or older than `ttl`
+    in one batch and writes it back; stale entries keep being served until
+    they are refreshed (a conId does not change under a listed symbol).
+    """
+
+    def __init__(self, *, ttl: float = CONTRACT_CACHE_TTL) -> None:
+        self.ttl = ttl
+        self._entries: dict[ContractKey, tuple[float, Contract]] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self) -> None:
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                with DBManager() as db:
+                    rows = db.get_qualified_contracts()
+            except Exception:
+                log.exception("Loading qualified contracts failed – starting empty")
+                rows = []
+            for r in rows:
+                key = ContractKey(r.symbol, r.sec_type, r.exchange, r.currency)
+                contract = Contract(
+                    secType=r.sec_type, conId=r.con_id, symbol=r.symbol, exchange=r.exchange,
+                    primaryExchange=r.primary_exchange or "", currency=r.currency,
+                    localSymbol=r.local_symbol or "", tradingClass=r.trading_class or "",
+                )
+                qualified_at = r.qualified_at.replace(tzinfo=timezone.utc).timestamp()
+                self._entries[key] = (qualified_at, contract)
+            self._loaded = True
+            log.info("Loaded %d qualified contract(s)", len(rows))
+
+    # ───────────────────── lookups ─────────────────────
+    def get(self, key: ContractKey) -> Optional[Contract]:
+        if not self._loaded:
+            self._load()
+        entry = self._entries.get(key)
+        return entry[1] if entry is not None else None
+
+    def stale(self, keys: Iterable[ContractKey]) -> list[ContractKey]:
+        if not self._loaded:
+            self._load()
+        now = time.time()
+        out = []
+        for key in dict.fromkeys(keys):
+            entry = self._entries.get(key)
+            if entry is None or now - entry[0] >= self.ttl:
+                out.append(key)
+        return out
+
+    # ───────────────────── qualification ─────────────────────
+    async def warm(
+        self,
+        ib: IB,
+        keys: Iterable[ContractKey],
+        *,
+        pace: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> int:
+        """Qualify every missing / stale key over `ib`; returns how many were (re)qualified."""
+        todo = await asyncio.to_thread(self.stale, keys)
+        if not todo:
+            return 0
+        contracts = [Contract(secType=k.sec_type, symbol=k.symbol, exchange=k.exchange, currency=k.currency)
+                     for k in todo]
+        if pace is not None:
+            for _ in contracts:          # one contract-details request per contract
+                await pace()
+        qualified = await ib.qualifyContractsAsync(*contracts)
+
+        now = datetime.now(timezone.utc)
+        rows = []
+        for key, contract in zip(todo, contracts):
+            if not contract.conId:
+                log.warning("Could not qualify %s", key)
+                continue
+            self._entries[key] = (now.timestamp(), contract)
+            rows.append({
+                "symbol": key.symbol, "sec_type": key.sec_type, "exchange": key.exchange,
+                "currency": key.currency, "con_id": contract.conId,
+                "primary_exchange": contract.primaryExchange, "local_symbol": contract.localSymbol,
+                "trading_class": contract.tradingClass, "qualified_at": now.replace(tzinfo=None),
+            })
+        if rows:
+            def persist():
+                with DBManager() as db:
+                    db.upsert_qualified_contracts(rows)
+
+            await asyncio.to_thread(persist)
+        log.info("Qualified %d/%d contract(s)", len(qualified), len(todo))
+        return len(rows)
+
+    async def resolve(
+        self,
+        ib: IB,
+        key: ContractKey,
+        *,
+        pace: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> Contract:
+        """The cached contract, qualifying it first on a miss."""
+        contract = self.get(key)
+        if contract is None:
+            await self.warm(ib, [key], pace=pace)
+            contract = self.get(key)
+        if contract is None:
+            raise ValueError(f"Unknown contract {key}")
+        return contract
+
+
+contract_cache = ContractCache()
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+
+from ib_manager.connection_pool import IBConnectionPool, gateway_address
+
+# ──────────── Setup Logging ────────────
+log = logging.getLogger("IBKR-Gateway-Health")
+
+# ──────────── Constants ────────────
+IB_HEALTH_INTERVAL = float(os.getenv("IB_HEALTH_INTERVAL", 10))      # s between heartbeats
+IB_HEALTH_TIMEOUT = float(os.getenv("IB_HEALTH_TIMEOUT", 5))
+IB_HEALTH_SAMPLES = int(os.getenv("IB_HEALTH_SAMPLES", 360))         # latencies kept (1h at 10s)
+IB_HEALTH_IDLE = float(os.getenv("IB_HEALTH_IDLE", 15 * 60))         # stop watching unread gateways
+DOCKER_SOCKET = os.getenv("DOCKER_SOCKET", "/var/run/docker.sock")
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat() if ts else None
+
+
+def _percentile(ordered: list[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+@dataclass(eq=False)
+class GatewayHealth:
+    """Heartbeat history of one user's gateway connection; `status` is rebuilt per beat."""
+
+    user: object
+    host: str
+    port: int
+    latencies: deque = field(default_factory=lambda: deque(maxlen=IB_HEALTH_SAMPLES))
+    beats: int = 0
+    failures: int = 0
+    last_ok: Optional[float] = None
+    last_error: Optional[str] = None
+    last_error_at: Optional[float] = None
+    container: str = "unknown"
+    last_read: float = field(default_factory=time.monotonic)
+    status: dict = field(default_factory=lambda: {"connected": False, "state": "pending"})
+    first_beat: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def summarize(self, state: str) -> None:
+        latency = None
+        if self.latencies:
+            ordered = sorted(self.latencies)
+            latency = {
+                "last": round(self.latencies[-1], 1),
+                "p50": round(_percentile(ordered, 0.50), 1),
+                "p95": round(_percentile(ordered, 0.95), 1),
+                "p99": round(_percentile(ordered, 0.99), 1),
+                "samples": len(ordered),
+            }
+        self.status = {
+            "connected": state == "connected",
+            "state": state,
+            "gateway": f"{self.host}:{self.port}",
+            "container": self.container,
+            "latency_ms": latency,
+            "last_ok": _iso(self.last_ok),
+            "last_error": self.last_error,
+            "last_error_at": _iso(self.last_error_at),
+            "heartbeats": self.beats,
+            "failures": self.failures,
+            "checked_at": _iso(time.time()),
+        }
+
+
+class GatewayHealthRegistry:
+    """
+    Background health registry of the gateways the API talks to.
+
+    A gateway is watched from the first `status()` call for its user until
+    nobody has asked for `IB_HEALTH_IDLE` seconds. Every `interval` the
+    registry leases the pooled connection (keeping it warm), times a
+    `reqCurrentTime` round trip and probes the gateway's container (Docker
+    when the socket is mounted, otherwise a TCP connect). `status()` only
+    returns the summary built by the last heartbeat – no I/O per request.
+    """
+
+    def __init__(self, ib_pool: IBConnectionPool, *, interval: float = IB_HEALTH_INTERVAL) -> None:
+        self.ib_pool = ib_pool
+        self.interval = interval
+        self._entries: dict[int, GatewayHealth] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._tasks: set[asyncio.Task] = set()
+        self._docker = None
+
+    # ───────────────────── lifecycle ─────────────────────
+    async def start(self) -> None:
+        if os.path.exists(DOCKER_SOCKET):
+            try:
+                import docker
+                self._docker = await asyncio.to_thread(docker.from_env)
+            except Exception as e:
+                log.warning("Docker unavailable, probing gateways over TCP: %s", e)
+        self._task = asyncio.create_task(self._run(), name="gateway-health")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # ───────────────────── reads ─────────────────────
+    async def status(self, user) -> dict:
+        """Cached health of `user`'s gateway; the very first call waits for one heartbeat."""
+        entry = self._entries.get(user.id)
+        if entry is None:
+            host, port = gateway_address(user)
+            entry = self._entries[user.id] = GatewayHealth(user=user, host=host, port=port)
+            task = asyncio.create_task(self._beat(entry))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        entry.last_read = time.monotonic()
+        if not entry.first_beat.is_set():
+            try:
+                await asyncio.wait_for(entry.first_beat.wait(), IB_HEALTH_TIMEOUT + 1)
+            except asyncio.TimeoutError:
+                pass
+        return entry.status
+
+    # ───────────────────── heartbeats ─────────────────────
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            for user_id, entry in list(self._entries.items()):
+                if now - entry.last_read > IB_HEALTH_IDLE:
+                    log.info("Health: no longer watching gateway of user=%s", user_id)
+                    del self._entries[user_id]
+            await asyncio.gather(*(self._beat(e) for e in list(self._entries.values())))
+
+    async def _beat(self, entry: GatewayHealth) -> None:
+        entry.beats += 1
+        state = "disconnected"
+        try:
+            async with self.ib_pool.lease(entry.user, timeout=IB_HEALTH_TIMEOUT) as ib:
+                t0 = time.perf_counter()
+                await asyncio.wait_for(ib.reqCurrentTimeAsync(), IB_HEALTH_TIMEOUT)
+                entry.latencies.append((time.perf_counter() - t0) * 1e3)
+            entry.last_ok = time.time()
+            state = "connected"
+        except Exception as e:
+            entry.failures += 1
+            conn = self.ib_pool.get(entry.user)
+            entry.last_error = (conn.last_error if conn is not None and conn.last_error else None) or repr(e)
+            entry.last_error_at = time.time()
+            if conn is not None and conn.reconnect_task is not None and not conn.reconnect_task.done():
+                state = "reconnecting"
+        entry.container = await self._container_state(entry, connected=state == "connected")
+        entry.summarize(state)
+        entry.first_beat.set()
+
+    async def _container_state(self, entry: GatewayHealth, *, connected: bool) -> str:
+        if self._docker is not None:
+            try:
+                container = await asyncio.to_thread(self._docker.containers.get, entry.host)
+                return container.status                      # running | restarting | exited …
+            except Exception as e:
+                return f"unknown ({type(e).__name__})"
+        if connected:
+            return "listening"
+        # bare TCP connect: is anything accepting on the API port at all?
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(entry.host, entry.port), IB_HEALTH_TIMEOUT)
+            writer.close()
+            return "listening"
+        except Exception as e:
+            return f"unreachable ({type(e).__name__})"
@@ -2,11 +2,14 @@ import asyncio
 import logging
 import math
 import random
+import threading
+from datetime import datetime, timezone
 from typing import Optional
-from ib_insync import IB, LimitOrder, Stock
+from ib_insync import IB
 import os
 
 from database.db_manager import DBManager
+from ib_manager.connection_pool import gateway_address
 from ib_manager.market_data_manager import MarketDataManager
 
 # ──────────── Setup Logging ────────────
@@ -16,15 +19,138 @@ log = logging.getLogger("IBKR-Business-Manager")
 IB_CONNECTION_TIMEOUT = int(os.getenv("IB_CONNECTION_TIMEOUT", 60))
 RUNNING_IN_PRODUCTION_DOCKER = os.getenv("RUNNING_ENV", "local") == "production"
 
+
+def _naive_utc(ts: datetime) -> datetime:
+    """IB fill times are tz-aware; `executed_trades.fill_time` is naive UTC."""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+class FillWatermarks:
+    """
+    Latest synchronized fill time per (user, account), seeded once per user
+    from `executed_trades` and advanced after every successful bulk sync.
+    """
+
+    def __init__(self) -> None:
+        self._marks: dict[int, dict[str, datetime]] = {}
+
+    def get(self, user_id: int) -> dict[str, datetime]:
+        if user_id not in self._marks:
+            with DBManager() as db:
+                self._marks[user_id] = {
+                    acct: _naive_utc(ts)
+                    for acct, ts in db.get_fill_watermarks(user_id=user_id).items()
+                }
+        return self._marks[user_id]
+
+    def advance(self, user_id: int, rows: list[dict]) -> None:
+        marks = self._marks.setdefault(user_id, {})
+        for row in rows:
+            acct, ts = row["account"] or "", _naive_utc(row["fill_time"])
+            if acct not in marks or ts > marks[acct]:
+                marks[acct] = ts
+
+
+fill_watermarks = FillWatermarks()
+
+
+def order_fingerprint(row: dict) -> tuple:
+    return (row.get("status"), row.get("filled_quantity"), row.get("avg_fill_price"))
+
+
+class OrderFingerprints:
+    """
+    Last written (status, filled_quantity, avg_fill_price) per permId, seeded
+    once per user from `orders`; used to upsert only orders that changed.
+    """
+
+    def __init__(self) -> None:
+        self._prints: dict[int, dict[int, tuple]] = {}
+        self._lock = threading.Lock()
+
+    def _for_user(self, user_id: int) -> dict[int, tuple]:
+        with self._lock:
+            if user_id not in self._prints:
+                with DBManager() as db:
+                    self._prints[user_id] = db.get_order_fingerprints(user_id=user_id)
+            return self._prints[user_id]
+
+    def changed(self, rows: list[dict]) -> list[dict]:
+        """Rows that are new, changed, or carry a runner attribution."""
+        out = []
+        for row in rows:
+            prints = self._for_user(row["user_id"])
+            if row.get("runner_id") is not None or prints.get(row["ibkr_perm_id"]) != order_fingerprint(row):
+                out.append(row)
+        return out
+
+    def remember(self, rows: list[dict]) -> None:
+        for row in rows:
+            self._for_user(row["user_id"])[row["ibkr_perm_id"]] = order_fingerprint(row)
+
+
+order_fingerprints = OrderFingerprints()
+
+
+def sync_changed_orders(db: DBManager, rows: list[dict]) -> int:
+    """Upsert only the orders whose fingerprint changed; returns how many were sent."""
+    changed = order_fingerprints.changed(rows)
+    if changed and db.sync_orders(changed):
+        order_fingerprints.remember(changed)
+    return len(changed)
+
+
+def order_row(tr, *, user_id: int) -> dict:
+    """`orders` row for an ib_insync Trade (runner attribution is left to the DB)."""
+    return {
+        "user_id": user_id,
+        "runner_id": None,
+        "ibkr_perm_id": tr.order.permId,
+        "symbol": tr.contract.symbol,
+        "action": tr.order.action,
+        "order_type": tr.order.orderType,
+        "quantity": tr.order.totalQuantity,
+        "limit_price": getattr(tr.order, "lmtPrice", None),
+        "stop_price": getattr(tr.order, "auxPrice", None),
+        "status": tr.orderStatus.status,
+        "filled_quantity": tr.orderStatus.filled,
+        "avg_fill_price": tr.orderStatus.avgFillPrice,
+        "account": tr.order.account or "",
+    }
+
+
+def fill_row(tr, fill, *, user_id: int) -> dict:
+    """`executed_trades` row for one ib_insync Fill of `tr`."""
+    return {
+        "user_id": user_id,
+        "perm_id": tr.order.permId,
+        "symbol": tr.contract.symbol,
+        "action": tr.order.action,
+        "order_type": tr.order.orderType,
+        "quantity": fill.execution.shares,
+        "price": fill.execution.price,
+        "fill_time": fill.time,
+        "account": fill.execution.acctNumber,
+    }
+
+
 class IBBusinessManager:
-    def __init__(self, user):
+    def __init__(self, user, ib: Optional[IB] = None):
+        """
+        `ib` may be a connection leased from `IBConnectionPool`; the manager
+        then neither connects nor disconnects it.
+        """
         self.user = user
-        self.ib = IB()
+        self._owns_connection = ib is None
+        self.ib = ib or IB()
         # In production, pull host/port from env
-        self.gateway_host = os.getenv("IB_GATEWAY_HOST", "ib-gateway-1")
-        self.gateway_port = int(os.getenv("IB_GATEWAY_PORT", 4004))
+        self.gateway_host, self.gateway_port = gateway_address(user)
 
     async def connect(self):
+        if not self._owns_connection:
+            return
         log.info(f"Connecting to IB Gateway for user {self.user.id} "
                  f"({self.user.ib_username}) at "
                  f"{self.gateway_host}:{self.gateway_port}")
@@ -55,6 +181,8 @@ class IBBusinessManager:
 
 
     def disconnect(self):
+        if not self._owns_connection:
+            return
         try:
             if self.ib.isConnected():
                 self.ib.disconnect()
@@ -106,61 +234,74 @@ class IBBusinessManager:
     async def place_test_aggressive_limit(self, *, user_id: int, runner_id: int) -> dict:
         try:
             symbol = random.choice(["AAPL", "NVDA", "TSLA", "PLTR"])
-            contract = Stock(symbol, "SMART", "USD")
 
             mdm = MarketDataManager()
             if not mdm.is_market_open():
                 log.warning("Market is closed, cannot place order")
                 return
 
-            price = mdm.get_current_price(symbol)
+            price = await mdm.get_current_price_async(symbol)
             if not price or math.isnan(price):
                 log.warning("Price unavailable for %s", symbol)
                 return
 
             lmt_px = round(price * 1.02, 2)
-            await self.ib.qualifyContractsAsync(contract)
-            order = LimitOrder("BUY", 1, lmt_px, tif="GTC", outsideRth=True)
-            trade = self.ib.placeOrder(contract, order)
-
-            for _ in range(50):
-                if trade.order.permId:
-                    break
-                await asyncio.sleep(0.1)
-
-            perm_id = trade.order.permId
-            status = trade.orderStatus.status
-
-            DBManager().save_order({
-                "user_id": user_id,
-                "runner_id": runner_id,
-                "ibkr_perm_id": perm_id,
-                "symbol": symbol,
-                "action": order.action,
-                "order_type": order.orderType,
-                "quantity": order.totalQuantity,
-                "limit_price": lmt_px,
-                "status": status,
-                "account": trade.order.account or "",
-                "filled_quantity": trade.orderStatus.filled,
-                "avg_fill_price": trade.orderStatus.avgFillPrice,
-            })
-
-            log.info("Placed test limit order: %s %s @ %.2f → %s", order.action, symbol, lmt_px, status)
-            return {"status": status, "ibkr_perm_id": perm_id, "limit_price": lmt_px}
+            return await self.place_limit_order(
+                user_id=user_id, runner_id=runner_id, symbol=symbol,
+                action="BUY", quantity=1, limit_price=lmt_px,
+            )
         except Exception:
             log.exception("Error placing test aggressive limit order")
             return {"status": "error"}
-        
 
-    async def sync_orders_from_ibkr(self, *, user_id: int) -> None:
+    async def place_order_intent(self, intent) -> dict:
+        """Place a `strategy_engine.strategy_manager.OrderIntent` as a DAY limit order."""
+        try:
+            if not MarketDataManager().is_market_open():
+                log.warning("Market is closed, cannot place %s for runner %d", intent.reason, intent.runner_id)
+                return {"status": "market_closed"}
+            return await self.place_limit_order(
+                user_id=intent.user_id, runner_id=intent.runner_id, symbol=intent.symbol,
+                action=intent.action, quantity=intent.quantity, limit_price=intent.limit_price,
+                tif="DAY",
+            )
+        except Exception:
+            log.exception("Error placing order intent %s", intent)
+            return {"status": "error"}
+
+    async def place_limit_order(
+        self,
+        *,
+        user_id: int,
+        runner_id: int,
+        symbol: str,
+        action: str,
+        quantity: float,
+        limit_price: float,
+        tif: str = "GTC",
+    ) -> dict:
+        """
+        Route a limit order through the process-wide `OrderRouter` and wait
+        for IB's acknowledgement; the router persists it with its runner.
+        """
+        from ib_manager.order_router import OrderRequest, order_router
+
+        ticket = await order_router.place(self.ib, OrderRequest(
+            user_id=user_id, runner_id=runner_id, symbol=symbol, action=action,
+            quantity=quantity, limit_price=limit_price, tif=tif,
+        ))
+        log.info("Placed limit order: %s %s %s @ %.2f → %s", action, quantity, symbol, limit_price, ticket.status)
+        return {"status": ticket.status, "ibkr_perm_id": ticket.perm_id, "limit_price": limit_price}
+
+    async def sync_orders_from_ibkr(self, *, user_id: int) -> bool:
+        """Upsert the gateway's orders; False if the sync failed (logged)."""
         try:
             log.debug("Starting synchronization of orders for user %d", user_id)
             trades = list(self.ib.trades())
 
             if not trades:
                 log.warning("No orders found for user %d", user_id)
-                return
+                return True
 
             orders_to_sync = []
 
@@ -170,76 +311,62 @@ class IBBusinessManager:
                     log.warning("Skipping trade with no permId: %s", tr)
                     continue
 
-                order_data = {
-                    "user_id": user_id,
-                    "runner_id": None, 
-                    "ibkr_perm_id": pid,
-                    "symbol": tr.contract.symbol,
-                    "action": tr.order.action,
-                    "order_type": tr.order.orderType,
-                    "quantity": tr.order.totalQuantity,
-                    "limit_price": getattr(tr.order, "lmtPrice", None),
-                    "stop_price": getattr(tr.order, "auxPrice", None),
-                    "status": tr.orderStatus.status,
-                    "filled_quantity": tr.orderStatus.filled,
-                    "avg_fill_price": tr.orderStatus.avgFillPrice,
-                    "account": tr.order.account or "",
-                }
+                order_data = order_row(tr, user_id=user_id)
 
                 orders_to_sync.append(order_data)
 
             if orders_to_sync:
-                await asyncio.to_thread(DBManager().sync_orders, orders_to_sync)
-                log.info("Synchronized %d orders from IBKR for user %d", len(orders_to_sync), user_id)
+                with DBManager() as db:
+                    sent = await asyncio.to_thread(sync_changed_orders, db, orders_to_sync)
+                log.info("Synchronized %d orders from IBKR for user %d (%d changed)",
+                         len(orders_to_sync), user_id, sent)
+            return True
 
         except Exception:
             log.exception("sync_orders_from_ibkr failed for user %d", user_id)
+            return False
 
 
 
-    def sync_executed_trades(self, *, user_id: int) -> None:
+    def sync_executed_trades(self, *, user_id: int) -> Optional[tuple[int, int]]:
+        """
+        Bulk-upsert only the fills newer than the per-account watermark.
+        Fills at exactly the watermark are re-sent (the upsert dedups them),
+        so nothing sharing a timestamp with the last stored fill is lost.
+        Returns `(inserted, updated)`, or None if the sync failed (logged).
+        """
         try:
             log.debug("Starting synchronization of executed trades for user %d", user_id)
-            count = 0
 
-            # Check if trades exist
-            trades = list(self.ib.trades())  # Convert to list to log if empty
+            trades = list(self.ib.trades())
             if not trades:
                 log.warning("No trades found for user %d", user_id)
+                return 0, 0
 
+            marks = fill_watermarks.get(user_id)
+            rows: list[dict] = []
             for tr in trades:
-                log.debug("Processing trade: %s", tr)
-
-                pid = tr.order.permId
-                if not pid:
+                if not tr.order.permId:
                     log.warning("Skipping trade with no permId: %s", tr)
                     continue
-
                 for f in tr.fills:
-                    trade_data = {
-                        "user_id": user_id,
-                        "perm_id": pid,
-                        "symbol": tr.contract.symbol,
-                        "action": tr.order.action,
-                        "order_type": tr.order.orderType,
-                        "quantity": f.execution.shares,
-                        "price": f.execution.price,
-                        "fill_time": f.time,
-                        "account": f.execution.acctNumber,
-                    }
-
-                    log.debug("Prepared executed trade data: %s", trade_data)
-
-                    # Sync executed trades to DB
-                    try:
-                        DBManager().sync_executed_trades([trade_data])
-                        log.debug("Executed trade with permId %d synchronized successfully", pid)
-                        count += 1
-                    except Exception as e:
-                        log.error("Failed to sync executed trade with permId %d: %s", pid, e)
-
-            log.debug("Synchronized %d executed trades for user %d", count, user_id)
+                    mark = marks.get(f.execution.acctNumber or "")
+                    if mark is None or _naive_utc(f.time) >= mark:
+                        rows.append(fill_row(tr, f, user_id=user_id))
+
+            if not rows:
+                log.debug("No fills past the watermark for user %d", user_id)
+                return 0, 0
+
+            with DBManager() as db:
+                inserted, updated = db.sync_executed_trades(rows)
+            if inserted or updated:
+                fill_watermarks.advance(user_id, rows)
+
+            log.info("Synchronized executed trades for user %d: %d new, %d updated (%d sent)",
+                     user_id, inserted, updated, len(rows))
+            return inserted, updated
 
         except Exception:
             log.exception("sync_executed_trades failed for user %d", user_id)
-
+            return None
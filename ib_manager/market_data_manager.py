@@ -1,18 +1,37 @@
 from datetime import datetime
 import os
 import time
-import pandas_market_calendars as mcal
 import finnhub
 import logging
 
 from dotenv import load_dotenv
 import pytz
+
+from ib_manager.bar_store import bar_store
+from ib_manager.quote_cache import QuoteCache, finnhub_limiter
+from ib_manager.session_calendar import get_session_calendar
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
 FINNHUB = os.getenv("FINNHUB_API_KEY")
 
+# Shared by every MarketDataManager in the process, so many runners trading
+# the same ticker share one upstream request per TTL. Keyed by
+# (api_key, symbol): managers only share quotes fetched with their own key.
+_quote_cache: QuoteCache[tuple[str, str], float] = QuoteCache(
+    lambda key: _default_manager()._fetch_current_price(key[1]), limiter=finnhub_limiter
+)
+_default: "MarketDataManager | None" = None
+
+
+def _default_manager() -> "MarketDataManager":
+    """Process-wide client for the configured key (the cache's own fetcher)."""
+    global _default
+    if _default is None:
+        _default = MarketDataManager()
+    return _default
+
 
 class MarketDataManager:
     def __init__(self, api_key=None):
@@ -22,7 +41,21 @@ class MarketDataManager:
     def get_current_price(self, symbol: str):
         """
         Fetches the current real-time price for a stock symbol.
+        Served from the shared TTL cache; concurrent misses for the same
+        symbol are coalesced into one rate-limited Finnhub call.
+        Blocking – call via `asyncio.to_thread` from async code.
         """
+        return _quote_cache.get((self.api_key, symbol.upper()), self._quote_fetcher())
+
+    async def get_current_price_async(self, symbol: str):
+        """`get_current_price` for async code: rate-limit waits happen on the loop, not in a thread."""
+        return await _quote_cache.get_async((self.api_key, symbol.upper()), self._quote_fetcher())
+
+    def _quote_fetcher(self):
+        # misses on a manager's own key are fetched with its own client
+        return None if self.api_key == FINNHUB else lambda key: self._fetch_current_price(key[1])
+
+    def _fetch_current_price(self, symbol: str):
         try:
             quote = self.client.quote(symbol)
             price = quote.get('c')  # 'c' = current price
@@ -41,43 +74,57 @@ class MarketDataManager:
         Fetch historical candles for a symbol.
         Resolution: '1', '5', '15', '30', '60', 'D', 'W', 'M'
         Count: number of candles
+        Served from the local bar store; only ranges not stored yet are
+        downloaded. Returns {"s": "ok", "t", "o", "h", "l", "c", "v"} with
+        read-only NumPy columns, or None.
         """
         try:
             now = int(time.time())
             delta = count * 60 * int(resolution) if resolution.isdigit() else count * 24 * 60 * 60
             start = now - delta
-            candles = self.client.stock_candles(symbol, resolution, start, now)
+            bars = bar_store.get(symbol, resolution, start, now, self._fetch_candles)
 
-            if candles.get("s") == "ok":
-                logger.info("Fetched %d candles for %s [%s min]", len(candles['c']), symbol, resolution)
-                return candles
+            if bars is not None and len(bars["c"]):
+                logger.debug("Serving %d candles for %s [%s min]", len(bars['c']), symbol, resolution)
+                return {"s": "ok", **bars}
             else:
                 logger.warning("No candle data returned for %s", symbol)
                 return None
         except Exception:
             logger.exception("Failed to get candle data for %s", symbol)
             return None
-        
+
+    def get_candles_range(self, symbol: str, resolution: str, start: int, end: int):
+        """Candles with `start <= t <= end` (epoch seconds) from the bar store, or None."""
+        try:
+            bars = bar_store.get(symbol, resolution, start, end, self._fetch_candles)
+            return None if bars is None else {"s": "ok", **bars}
+        except Exception:
+            logger.exception("Failed to get candle range for %s", symbol)
+            return None
+
+    def _fetch_candles(self, symbol: str, resolution: str, start: int, end: int):
+        """Bar-store fetcher: Finnhub candles for [start, end], {} if none, None on error."""
+        try:
+            finnhub_limiter.acquire()
+            candles = self.client.stock_candles(symbol, resolution, start, end)
+            if candles.get("s") == "ok":
+                logger.info("Fetched %d candles for %s [%s min]", len(candles['c']), symbol, resolution)
+                return candles
+            if candles.get("s") == "no_data":
+                return {}
+            logger.warning("Unexpected candle response for %s: %s", symbol, candles.get("s"))
+            return None
+        except Exception:
+            logger.exception("Failed to fetch candle data for %s", symbol)
+            return None
+
     def is_market_open(self) -> bool:
         """
         True  → US equities can trade *right now* (pre, regular, or after‑hours).
-        False → fully closed (weekend or between 20:00‑04:00 ET or holiday).
-        No external HTTP; relies on NYSE calendar + local clock.
+        False → fully closed: weekend, holiday, or before 04:00 ET / after the
+        post-market, which ends 4h after the close – 20:00 ET, 17:00 ET on
+        early-close days.
+        No external HTTP; relies on the precomputed NYSE session table + local clock.
         """
-        eastern = pytz.timezone("US/Eastern")
-        now_et  = datetime.now(eastern)
-
-        # NYSE calendar gives you the *regular* session for today
-        nyse = mcal.get_calendar('NYSE')
-        sched = nyse.schedule(start_date=now_et.date(), end_date=now_et.date())
-        if sched.empty:              # weekend or exchange holiday
-            return False
-
-        reg_open  = sched.iloc[0]['market_open'].tz_convert(eastern)
-        reg_close = sched.iloc[0]['market_close'].tz_convert(eastern)
-
-        # Extended hours window 04:00‑20:00 ET
-        ext_open  = reg_open.replace(hour=4,  minute=0)
-        ext_close = reg_close.replace(hour=20, minute=0)
-
-        return ext_open <= now_et <= ext_close
\ No newline at end of file
+        return get_session_calendar("NYSE").is_open(datetime.now(pytz.utc), extended=True)
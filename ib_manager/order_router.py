@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from ib_insync import IB, LimitOrder, OrderStatus, Trade
+
+from ib_manager.contract_cache import ContractKey, contract_cache
+from ib_manager.ib_connector import order_row
+from ib_manager.quote_cache import TokenBucket
+from ib_manager.trade_event_capture import BatchingWriter
+
+# ──────────── Setup Logging ────────────
+log = logging.getLogger("IBKR-Order-Router")
+
+# ──────────── Constants ────────────
+# IB disconnects API clients that send more than 50 messages per second
+IB_MAX_MESSAGES_PER_SECOND = float(os.getenv("IB_MAX_MESSAGES_PER_SECOND", 45))
+IB_MESSAGE_BURST = int(os.getenv("IB_MESSAGE_BURST", 10))
+IB_ORDER_ACK_TIMEOUT = float(os.getenv("IB_ORDER_ACK_TIMEOUT", 5))
+
+FAILED_STATES = OrderStatus.DoneStates - {OrderStatus.Filled} | {OrderStatus.Inactive}
+
+
+class OrderRejected(Exception):
+    """The order ended (cancelled / inactive) before the awaited state."""
+
+
+@dataclass(frozen=True)
+class OrderRequest:
+    user_id: int
+    runner_id: Optional[int]
+    symbol: str
+    action: str               # BUY | SELL
+    quantity: float
+    limit_price: float
+    tif: str = "DAY"
+    outside_rth: bool = True
+
+
+class OrderTicket:
+    """
+    Handle for a routed order. `acked` resolves with the `Trade` once IB has
+    assigned a permId; `filled` resolves when the order is completely filled.
+    Both fail with `OrderRejected` if the order is cancelled or goes inactive.
+    """
+
+    def __init__(self, request: OrderRequest, loop: asyncio.AbstractEventLoop) -> None:
+        self.request = request
+        self.trade: Optional[Trade] = None
+        self.acked: asyncio.Future = loop.create_future()
+        self.filled: asyncio.Future = loop.create_future()
+        for fut in (self.acked, self.filled):
+            fut.add_done_callback(_consume)
+
+    @property
+    def perm_id(self) -> Optional[int]:
+        return self.trade.order.permId if self.trade is not None else None
+
+    @property
+    def status(self) -> Optional[str]:
+        return self.trade.orderStatus.status if self.trade is not None else None
+
+    def fail(self, exc: BaseException) -> None:
+        for fut in (self.acked, self.filled):
+            if not fut.done():
+                fut.set_exception(exc)
+
+    def _update(self, trade: Trade) -> None:
+        status = trade.orderStatus.status
+        if trade.order.permId and not self.acked.done():
+            self.acked.set_result(trade)
+        if status == OrderStatus.Filled:
+            if not self.acked.done():
+                self.acked.set_result(trade)
+            if not self.filled.done():
+                self.filled.set_result(trade)
+        elif status in FAILED_STATES:
+            message = trade.log[-1].message if trade.log else ""
+            self.fail(OrderRejected(f"{self.request.action} {self.request.symbol} → {status} {message}".strip()))
+
+
+def _consume(fut: asyncio.Future) -> None:
+    # nobody has to await `filled`; don't log its failure as "never retrieved"
+    if not fut.cancelled():
+        fut.exception()
+
+
+class _Gateway:
+    """Send queue and message pacing of one API connection."""
+
+    def __init__(self, ib: IB, key: str, bucket: TokenBucket) -> None:
+        self.ib = ib
+        self.key = key
+        self.bucket = bucket
+        self.queue: asyncio.Queue[OrderTicket] = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+
+    async def pace(self) -> None:
+        wait = self.bucket.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class OrderRouter:
+    """
+    Places orders from many runners through per-gateway send queues.
+
+    Each API connection gets one queue drained by one task that spends a
+    token of that connection's `TokenBucket` per outgoing message (placeOrder,
+    plus qualification on a `contract_cache` miss), so bursts go out at the
+    highest rate IB tolerates without sleeping in fixed steps. Acknowledgement and fills
+    come from the `Trade` events and resolve the ticket's futures; the order
+    rows (with their runner) are persisted through a `BatchingWriter`.
+    """
+
+    def __init__(
+        self,
+        *,
+        messages_per_second: float = IB_MAX_MESSAGES_PER_SECOND,
+        burst: int = IB_MESSAGE_BURST,
+        writer: Optional[BatchingWriter] = None,
+    ) -> None:
+        self.messages_per_second = messages_per_second
+        self.burst = burst
+        self.writer = writer or BatchingWriter()
+        self._gateways: dict[str, _Gateway] = {}
+
+    @staticmethod
+    def _key(ib: IB) -> str:
+        client = ib.client
+        return f"{client.host}:{client.port}/{client.clientId}"
+
+    def _gateway(self, ib: IB) -> _Gateway:
+        key = self._key(ib)
+        gw = self._gateways.get(key)
+        if gw is None or gw.ib is not ib:
+            bucket = gw.bucket if gw is not None else TokenBucket(self.messages_per_second * 60, self.burst)
+            gw = self._gateways[key] = _Gateway(ib, key, bucket)
+        if gw.task is None or gw.task.done():
+            gw.task = asyncio.create_task(self._drain(gw), name=f"order-router-{key}")
+        return gw
+
+    # ───────────────────── public API ─────────────────────
+    def submit(self, ib: IB, request: OrderRequest) -> OrderTicket:
+        """Queue `request` on `ib`'s connection; returns immediately."""
+        ticket = OrderTicket(request, asyncio.get_running_loop())
+        self._gateway(ib).queue.put_nowait(ticket)
+        return ticket
+
+    async def place(self, ib: IB, request: OrderRequest, *, timeout: float = IB_ORDER_ACK_TIMEOUT) -> OrderTicket:
+        """Submit and wait for the acknowledgement (permId); the ticket is returned either way."""
+        ticket = self.submit(ib, request)
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.acked), timeout=timeout)
+        except asyncio.TimeoutError:
+            log.warning("No acknowledgement within %.1fs for %s %s", timeout, request.action, request.symbol)
+        except OrderRejected as e:
+            log.warning("Order rejected: %s", e)
+        return ticket
+
+    def use_writer(self, writer: BatchingWriter) -> None:
+        """Persist order rows through `writer`, e.g. the capture hub's, so one flusher writes each order."""
+        self.writer = writer
+
+    async def pace(self, ib: IB) -> None:
+        """Spend one message token of `ib`'s connection (for requests sent outside the router)."""
+        await self._gateway(ib).pace()
+
+    async def close(self) -> None:
+        for gw in self._gateways.values():
+            if gw.task is not None:
+                gw.task.cancel()
+            while not gw.queue.empty():
+                gw.queue.get_nowait().fail(ConnectionError("order router closed"))
+        self._gateways.clear()
+        await self.writer.close()
+
+    # ───────────────────── sending ─────────────────────
+    async def _drain(self, gw: _Gateway) -> None:
+        await self.writer.start()
+        while True:
+            ticket = await gw.queue.get()
+            try:
+                await self._send(gw, ticket)
+            except asyncio.CancelledError:
+                ticket.fail(ConnectionError("order router closed"))
+                raise
+            except Exception as e:
+                log.exception("Sending %s %s failed", ticket.request.action, ticket.request.symbol)
+                ticket.fail(e)
+
+    async def _send(self, gw: _Gateway, ticket: OrderTicket) -> None:
+        req = ticket.request
+        if not gw.ib.isConnected():
+            raise ConnectionError(f"gateway {gw.key} is not connected")
+
+        # warmed contracts are a dict lookup; only a miss costs a round trip
+        contract = await contract_cache.resolve(gw.ib, ContractKey.stock(req.symbol), pace=gw.pace)
+
+        order = LimitOrder(req.action, req.quantity, req.limit_price, tif=req.tif, outsideRth=req.outside_rth)
+        await gw.pace()
+        trade = gw.ib.placeOrder(contract, order)
+        ticket.trade = trade
+
+        def on_status(tr: Trade) -> None:
+            ticket._update(tr)
+            if tr.order.permId:
+                self.writer.put_order({**order_row(tr, user_id=req.user_id), "runner_id": req.runner_id})
+
+        trade.statusEvent += on_status
+        trade.filledEvent += on_status
+        on_status(trade)
+        log.info("Routed %s %s x%s @ %.2f via %s (queue %d)",
+                 req.action, req.symbol, req.quantity, req.limit_price, gw.key, gw.queue.qsize())
+
+
+order_router = OrderRouter()
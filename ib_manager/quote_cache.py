@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Generic, Hashable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+QUOTE_CACHE_TTL = float(os.getenv("QUOTE_CACHE_TTL", 5))
+QUOTE_CACHE_SIZE = int(os.getenv("QUOTE_CACHE_SIZE", 512))
+FINNHUB_CALLS_PER_MINUTE = float(os.getenv("FINNHUB_CALLS_PER_MINUTE", 60))
+FINNHUB_BURST = int(os.getenv("FINNHUB_BURST", 10))
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. `acquire()` blocks until a token is available
+    instead of failing, so callers queue up behind the provider quota;
+    async callers use `acquire_async()`, which waits on the event loop rather
+    than parking an executor thread.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int) -> None:
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token now; returns how long the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # reserve the token now (possibly going negative) so waiters queue in order
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self) -> float:
+        """Take one token; returns the seconds spent waiting for it."""
+        wait = self.reserve()
+        if wait > 0:
+            logger.debug("Rate limit reached – waiting %.2fs for a token", wait)
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        wait = self.reserve()
+        if wait > 0:
+            logger.debug("Rate limit reached – waiting %.2fs for a token", wait)
+            await asyncio.sleep(wait)
+        return wait
+
+
+class QuoteCache(Generic[K, V]):
+    """
+    TTL + LRU cache with single-flight loading.
+
+    Concurrent `get()` calls for the same key while it is being fetched wait
+    for that one upstream call instead of issuing their own. Every upstream
+    call first takes a token from `limiter`. `None` results are not cached.
+    `get_async()` is the same from the event loop: the token is awaited
+    there and only the (blocking) fetch itself runs in a worker thread. A
+    cancelled async caller only stops waiting; the shared load carries on.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[K], Optional[V]],
+        *,
+        ttl: float = QUOTE_CACHE_TTL,
+        max_size: int = QUOTE_CACHE_SIZE,
+        limiter: Optional[TokenBucket] = None,
+    ) -> None:
+        self.fetch = fetch
+        self.ttl = ttl
+        self.max_size = max_size
+        self.limiter = limiter
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._inflight: dict[K, Future] = {}
+        self._loads: set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.coalesced = 0
+
+    def get(self, key: K, fetch: Optional[Callable[[K], Optional[V]]] = None) -> Optional[V]:
+        hit, value, pending, leader = self._lookup(key)
+        if hit:
+            return value
+        if not leader:
+            return pending.result()
+
+        try:
+            if self.limiter is not None:
+                self.limiter.acquire()
+            value = (fetch or self.fetch)(key)
+        except BaseException as e:
+            self._fail(key, pending, e)
+            raise
+        return self._store(key, pending, value)
+
+    async def get_async(self, key: K, fetch: Optional[Callable[[K], Optional[V]]] = None) -> Optional[V]:
+        hit, value, pending, leader = self._lookup(key)
+        if hit:
+            return value
+        if leader:
+            # the load is a task of its own: a caller that is cancelled – the
+            # one that started it or any other – leaves it running for the rest
+            load = asyncio.create_task(self._load_async(key, pending, fetch))
+            self._loads.add(load)
+            load.add_done_callback(self._loads.discard)
+        # shielded: cancelling one waiter must not cancel the shared `pending`
+        return await asyncio.shield(asyncio.wrap_future(pending))
+
+    async def _load_async(self, key: K, pending: Future, fetch: Optional[Callable[[K], Optional[V]]]) -> None:
+        try:
+            if self.limiter is not None:
+                await self.limiter.acquire_async()
+            value = await asyncio.to_thread(fetch or self.fetch, key)
+        except asyncio.CancelledError:
+            # the loop is shutting down; waiters get a plain error, not a cancellation
+            self._fail(key, pending, RuntimeError("quote fetch was cancelled"))
+            raise
+        except Exception as e:
+            self._fail(key, pending, e)
+            return
+        self._store(key, pending, value)
+
+    def _lookup(self, key: K) -> tuple[bool, Optional[V], Optional[Future], bool]:
+        """`(hit, value, pending, leader)`; the leader must `_store` or `_fail` `pending`."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1], None, False
+
+            pending = self._inflight.get(key)
+            if pending is not None:
+                self.coalesced += 1
+                return False, None, pending, False
+            self.misses += 1
+            pending = self._inflight[key] = Future()
+            return False, None, pending, True
+
+    def _fail(self, key: K, pending: Future, error: BaseException) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+        if not pending.done():
+            pending.set_exception(error)
+
+    def _store(self, key: K, pending: Future, value: Optional[V]) -> Optional[V]:
+        with self._lock:
+            self._inflight.pop(key, None)
+            if value is not None:
+                self._entries[key] = (time.monotonic(), value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        if not pending.done():
+            pending.set_result(value)
+        return value
+
+    def invalidate(self, key: K) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+# One quota per process: every MarketDataManager shares it.
+finnhub_limiter = TokenBucket(FINNHUB_CALLS_PER_MINUTE, FINNHUB_BURST)
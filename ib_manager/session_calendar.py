@@ -0,0 +1,195 @@
+import bisect
+import logging
+import threading
+from array import array
+from datetime import date, datetime, time, timedelta
+from typing import NamedTuple, Optional
+
+import pandas_market_calendars as mcal
+import pytz
+
+logger = logging.getLogger(__name__)
+
+EASTERN = pytz.timezone("US/Eastern")
+PRE_MARKET_OPEN = time(4, 0)           # 04:00 ET
+POST_MARKET_LENGTH = timedelta(hours=4)  # 16:00 → 20:00, 13:00 → 17:00 on early closes
+
+
+class Session(NamedTuple):
+    """One trading day; all datetimes are tz-aware US/Eastern."""
+
+    date: date
+    pre_open: datetime
+    open: datetime
+    close: datetime
+    post_close: datetime
+
+    @property
+    def early_close(self) -> bool:
+        return self.close.time() < time(16, 0)
+
+
+class SessionCalendar:
+    """
+    Precomputed exchange sessions for fast open/close lookups.
+
+    The regular schedule (holidays and early closes included) is pulled from
+    `pandas_market_calendars` once per `days`-long window and flattened into
+    sorted `array('q')` columns of epoch seconds. `is_open`, `next_open` and
+    `next_close` are a binary search over those columns; `session_for` is a
+    dict lookup. A query outside the table grows it by another `days` in that
+    direction – it never drops what is covered, so mixing historical
+    (backtest) and live queries does not rebuild it back and forth.
+    """
+
+    def __init__(self, exchange: str = "NYSE", *, days: int = 366) -> None:
+        self.exchange = exchange
+        self.days = days
+        self._lock = threading.Lock()
+        self._start: Optional[date] = None
+        self._end: Optional[date] = None
+        self._pre_open = array("q")
+        self._open = array("q")
+        self._close = array("q")
+        self._post_close = array("q")
+        self._index: dict[int, int] = {}     # date ordinal → row
+
+    # ───────────────────── building ─────────────────────
+    def _build(self, start: date, end: date) -> None:
+        sched = mcal.get_calendar(self.exchange).schedule(start_date=start, end_date=end)
+
+        pre_open, reg_open, reg_close, post_close = (array("q") for _ in range(4))
+        index: dict[int, int] = {}
+        for i, (ts_open, ts_close) in enumerate(zip(sched["market_open"], sched["market_close"])):
+            day = ts_open.tz_convert(EASTERN).date()
+            pre = EASTERN.localize(datetime.combine(day, PRE_MARKET_OPEN))
+            pre_open.append(int(pre.timestamp()))
+            reg_open.append(int(ts_open.timestamp()))
+            reg_close.append(int(ts_close.timestamp()))
+            post_close.append(int((ts_close + POST_MARKET_LENGTH).timestamp()))
+            index[day.toordinal()] = i
+
+        self._pre_open, self._open, self._close, self._post_close = (
+            pre_open, reg_open, reg_close, post_close
+        )
+        self._index = index
+        self._start, self._end = start, end
+        logger.info("%s session table built: %s → %s (%d sessions)",
+                    self.exchange, start, end, len(index))
+
+    def _covers(self, day: date) -> bool:
+        # leave a week of slack so next_open / next_close never run off the end
+        return self._end is not None and self._start <= day <= self._end - timedelta(days=7)
+
+    def _ensure(self, day: date) -> None:
+        if not self._covers(day):
+            with self._lock:
+                if not self._covers(day):
+                    self._build(*self._extent(day))
+
+    def _extent(self, day: date) -> tuple[date, date]:
+        """Table range after extending it (in whole `days` chunks) to cover `day`."""
+        if self._end is None:
+            start = day - timedelta(days=7)
+            return start, start + timedelta(days=self.days)
+        start, end = self._start, self._end
+        if day < start:
+            start = day - timedelta(days=self.days)
+        if day > end - timedelta(days=7):
+            end = day + timedelta(days=self.days)
+        return start, end
+
+    @staticmethod
+    def _epoch(ts: Optional[datetime]) -> tuple[int, date]:
+        if ts is None:
+            ts = datetime.now(pytz.utc)
+        elif ts.tzinfo is None:
+            ts = pytz.utc.localize(ts)
+        return int(ts.timestamp()), ts.astimezone(EASTERN).date()
+
+    def _row(self, i: int) -> Session:
+        def et(sec: int) -> datetime:
+            return datetime.fromtimestamp(sec, EASTERN)
+
+        open_ = et(self._open[i])
+        return Session(
+            date=open_.date(),
+            pre_open=et(self._pre_open[i]),
+            open=open_,
+            close=et(self._close[i]),
+            post_close=et(self._post_close[i]),
+        )
+
+    # ───────────────────── queries ─────────────────────
+    def is_open(self, ts: Optional[datetime] = None, *, extended: bool = True) -> bool:
+        """
+        True if `ts` (default now; naive = UTC) falls inside a session –
+        04:00 ET → close + 4h when `extended`, else the regular session.
+        """
+        t, day = self._epoch(ts)
+        self._ensure(day)
+        opens, closes = (self._pre_open, self._post_close) if extended else (self._open, self._close)
+        i = bisect.bisect_right(opens, t) - 1
+        return i >= 0 and t <= closes[i]
+
+    def next_open(self, ts: Optional[datetime] = None, *, extended: bool = False) -> datetime:
+        """First session open strictly after `ts`."""
+        t, day = self._epoch(ts)
+        self._ensure(day)
+        opens = self._pre_open if extended else self._open
+        i = bisect.bisect_right(opens, t)
+        return datetime.fromtimestamp(opens[i], EASTERN)
+
+    def next_close(self, ts: Optional[datetime] = None, *, extended: bool = False) -> datetime:
+        """First session close at or after `ts` (the current one while open)."""
+        t, day = self._epoch(ts)
+        self._ensure(day)
+        closes = self._post_close if extended else self._close
+        i = bisect.bisect_left(closes, t)
+        return datetime.fromtimestamp(closes[i], EASTERN)
+
+    def session_for(self, day: date) -> Optional[Session]:
+        """The session on `day`, or None for weekends and exchange holidays."""
+        self._ensure(day)
+        i = self._index.get(day.toordinal())
+        return None if i is None else self._row(i)
+
+
+_calendars: dict[str, SessionCalendar] = {}
+
+
+def get_session_calendar(exchange: str = "NYSE") -> SessionCalendar:
+    """Process-wide calendar per exchange (built lazily on first query)."""
+    cal = _calendars.get(exchange)
+    if cal is None:
+        cal = _calendars.setdefault(exchange, SessionCalendar(exchange))
+    return cal
+
+
+if __name__ == "__main__":
+    # Benchmark against the per-call pandas schedule used before.
+    #   python -m ib_manager.session_calendar
+    import timeit
+
+    logging.basicConfig(level=logging.INFO)
+
+    def legacy_is_market_open() -> bool:
+        now_et = datetime.now(EASTERN)
+        sched = mcal.get_calendar("NYSE").schedule(start_date=now_et.date(), end_date=now_et.date())
+        if sched.empty:
+            return False
+        reg_open = sched.iloc[0]["market_open"].tz_convert(EASTERN)
+        reg_close = sched.iloc[0]["market_close"].tz_convert(EASTERN)
+        return reg_open.replace(hour=4, minute=0) <= now_et <= reg_close.replace(hour=20, minute=0)
+
+    cal = get_session_calendar()
+    build = timeit.timeit(lambda: cal._build(*cal._extent(date.today())), number=1)
+    print(f"is_open now: legacy={legacy_is_market_open()} table={cal.is_open()}")
+
+    n_legacy, n_new = 50, 200_000
+    legacy = timeit.timeit(legacy_is_market_open, number=n_legacy) / n_legacy
+    new = timeit.timeit(cal.is_open, number=n_new) / n_new
+    print(f"table build (one-off): {build * 1e3:9.2f} ms")
+    print(f"legacy is_market_open: {legacy * 1e6:9.2f} µs/call")
+    print(f"SessionCalendar.is_open: {new * 1e6:7.2f} µs/call  ({legacy / new:,.0f}x)")
+    print(f"next_open={cal.next_open()}  next_close={cal.next_close()}")
@@ -0,0 +1,318 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Awaitable, Callable, Optional
+
+from ib_insync import IB
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from database.db_manager import DBManager
+from ib_manager.ib_connector import fill_row, order_row, sync_changed_orders
+
+# ──────────── Setup Logging ────────────
+log = logging.getLogger("IBKR-Trade-Capture")
+# rows given up on after CAPTURE_MAX_RETRIES, one JSON object per line
+dead_letter = logging.getLogger("IBKR-Trade-Capture.dead-letter")
+
+# ──────────── Constants ────────────
+IB_STREAMING_CAPTURE = os.getenv("IB_STREAMING_CAPTURE", "true").lower() in ("1", "true", "yes")
+CAPTURE_FLUSH_INTERVAL = float(os.getenv("CAPTURE_FLUSH_INTERVAL", 0.2))
+CAPTURE_MAX_BATCH = int(os.getenv("CAPTURE_MAX_BATCH", 500))
+CAPTURE_MAX_RETRIES = int(os.getenv("CAPTURE_MAX_RETRIES", 8))
+CAPTURE_BACKOFF_MAX = float(os.getenv("CAPTURE_BACKOFF_MAX", 60))
+
+
+def _transient(e: Exception) -> bool:
+    """Database unreachable / connection lost – the rows themselves are fine."""
+    return isinstance(e, (OperationalError, InterfaceError)) or getattr(e, "connection_invalidated", False)
+
+
+class BatchingWriter:
+    """
+    Coalesces order / fill rows and writes them in one transaction per batch.
+
+    A batch is flushed `flush_interval` seconds after its first row arrives,
+    or immediately once it holds `max_batch` rows. Rows are keyed by their
+    natural key, so repeated status updates of one order collapse into the
+    latest one, and orders whose fingerprint did not change are dropped
+    before the write. Orders are written before fills (`executed_trades.perm_id`
+    references `orders.ibkr_perm_id`).
+
+    A failed batch is retried with exponential backoff. When the database
+    rejects the rows themselves (constraint / data errors) the batch is split
+    until the offending rows are isolated, so the rest still commits; a row
+    that has failed `CAPTURE_MAX_RETRIES` times goes to the dead-letter log.
+    """
+
+    def __init__(
+        self,
+        *,
+        flush_interval: float = CAPTURE_FLUSH_INTERVAL,
+        max_batch: int = CAPTURE_MAX_BATCH,
+    ) -> None:
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._orders: dict[int, dict] = {}
+        self._trades: dict[tuple, dict] = {}
+        self._pending = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._attempts: dict[tuple, int] = {}        # (kind, key) → failed writes
+        self._failed_flushes = 0                      # consecutive, drives the backoff
+
+    # ───────────────────── producer side ─────────────────────
+    def put_order(self, row: dict) -> None:
+        self._orders[row["ibkr_perm_id"]] = row
+        self._kick()
+
+    def put_trade(self, row: dict) -> None:
+        self._trades[(row["perm_id"], row["fill_time"])] = row
+        self._kick()
+
+    def _kick(self) -> None:
+        self._pending.set()
+        if len(self._orders) + len(self._trades) >= self.max_batch:
+            self._full.set()
+
+    # ───────────────────── lifecycle ─────────────────────
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="capture-writer")
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    # ───────────────────── consumer side ─────────────────────
+    async def _run(self) -> None:
+        while True:
+            await self._pending.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+            if self._failed_flushes:
+                await asyncio.sleep(self._backoff())
+
+    def _backoff(self) -> float:
+        return min(CAPTURE_BACKOFF_MAX, self.flush_interval * 2 ** self._failed_flushes)
+
+    async def flush(self) -> None:
+        self._pending.clear()
+        self._full.clear()
+        if not self._orders and not self._trades:
+            return
+
+        orders, self._orders = self._orders, {}
+        trades, self._trades = self._trades, {}
+        # orders first: a fill needs its order row
+        rows = [("order", k, v) for k, v in orders.items()] + [("trade", k, v) for k, v in trades.items()]
+        transient = None
+        try:
+            failed = await asyncio.to_thread(self._write_isolating, rows)
+        except Exception as e:                        # transient: the whole batch is retried
+            transient = e
+            failed = [(row, e) for row in rows]
+
+        failed_keys = {(kind, key) for (kind, key, _), _ in failed}
+        for kind, key, _ in rows:
+            if (kind, key) not in failed_keys:
+                self._attempts.pop((kind, key), None)
+        self._failed_flushes = self._failed_flushes + 1 if failed else 0
+        if transient is not None:
+            log.warning("Capture flush failed (%s) – %d row(s) retried in %.1fs",
+                        type(transient).__name__, len(rows), self._backoff())
+        for (kind, key, row), error in failed:
+            attempts = self._attempts.get((kind, key), 0) + 1
+            if attempts >= CAPTURE_MAX_RETRIES:
+                self._attempts.pop((kind, key), None)
+                dead_letter.error(json.dumps({"kind": kind, "row": row, "error": repr(error)}, default=str))
+                continue
+            self._attempts[(kind, key)] = attempts
+            # a newer version of the row may have arrived meanwhile
+            (self._orders if kind == "order" else self._trades).setdefault(key, row)
+        if self._orders or self._trades:
+            self._pending.set()
+        log.debug("Flushed %d row(s), %d failed", len(rows) - len(failed), len(failed))
+
+    @classmethod
+    def _write_isolating(cls, rows: list[tuple]) -> list[tuple]:
+        """
+        Write `rows`, bisecting on non-transient errors; returns the
+        `(row, error)` pairs that could not be written. Transient errors raise.
+        """
+        try:
+            cls._write([r for kind, _, r in rows if kind == "order"],
+                       [r for kind, _, r in rows if kind == "trade"])
+            return []
+        except Exception as e:
+            if _transient(e):
+                raise
+            if len(rows) == 1:
+                log.warning("Capture row rejected %s %s: %s", rows[0][0], rows[0][1], e)
+                return [(rows[0], e)]
+        mid = len(rows) // 2
+        return cls._write_isolating(rows[:mid]) + cls._write_isolating(rows[mid:])
+
+    @staticmethod
+    def _write(orders: list[dict], trades: list[dict]) -> None:
+        with DBManager() as db:
+            sync_changed_orders(db, orders)
+            db.sync_executed_trades(trades)
+
+
+class TradeEventCapture:
+    """Forwards one IB connection's order / execution events to a `BatchingWriter`."""
+
+    def __init__(
+        self, ib: IB, *, user_id: int, writer: BatchingWriter, on_reconnect: Optional[Callable[[], None]] = None
+    ) -> None:
+        self.ib = ib
+        self.user_id = user_id
+        self.writer = writer
+        self.on_reconnect = on_reconnect
+        # set on every reconnect until a catch-up sync went through
+        self.needs_sync = True
+        self.connects = 0
+        self._attached = False
+
+    def attach(self) -> None:
+        if self._attached:
+            return
+        self.ib.orderStatusEvent += self._on_order_status
+        self.ib.execDetailsEvent += self._on_exec_details
+        self.ib.commissionReportEvent += self._on_commission_report
+        self.ib.connectedEvent += self._on_connected
+        self._attached = True
+        log.info("Streaming capture attached for user %d", self.user_id)
+
+    def detach(self) -> None:
+        if not self._attached:
+            return
+        self.ib.orderStatusEvent -= self._on_order_status
+        self.ib.execDetailsEvent -= self._on_exec_details
+        self.ib.commissionReportEvent -= self._on_commission_report
+        self.ib.connectedEvent -= self._on_connected
+        self._attached = False
+
+    # ───────────────────── event handlers ─────────────────────
+    def _on_connected(self) -> None:
+        # executions re-fetched on connect raise no execDetailsEvent: fills
+        # made while the gateway was away only arrive through a sync
+        log.info("Gateway reconnected for user %d – catch-up sync due", self.user_id)
+        self.needs_sync = True
+        self.connects += 1
+        if self.on_reconnect is not None:
+            self.on_reconnect()
+
+    def _on_order_status(self, trade) -> None:
+        if trade.order.permId:
+            self.writer.put_order(order_row(trade, user_id=self.user_id))
+
+    def _on_exec_details(self, trade, fill) -> None:
+        if not trade.order.permId:
+            return
+        # the order row must exist before its fill (FK on perm_id)
+        self.writer.put_order(order_row(trade, user_id=self.user_id))
+        self.writer.put_trade(fill_row(trade, fill, user_id=self.user_id))
+
+    def _on_commission_report(self, trade, fill, report) -> None:
+        # the fill is final once its commission report arrives
+        self._on_exec_details(trade, fill)
+
+
+class TradeCaptureHub:
+    """
+    One capture per pooled connection, all sharing a single writer.
+
+    `catch_up(user, ib)` is the full order / fill sync and returns whether it
+    stored everything; the hub runs it (one at a time per user) whenever a
+    captured connection comes back after a disconnect. Until one succeeds,
+    `ensure` keeps asking the caller for it.
+    """
+
+    def __init__(
+        self,
+        writer: Optional[BatchingWriter] = None,
+        *,
+        catch_up: Optional[Callable[[object, IB], Awaitable[bool]]] = None,
+    ) -> None:
+        self.writer = writer or BatchingWriter()
+        self.catch_up = catch_up
+        self._captures: dict[int, TradeEventCapture] = {}
+        self._catch_ups: dict[int, asyncio.Task] = {}
+
+    async def start(self) -> None:
+        await self.writer.start()
+
+    async def close(self) -> None:
+        for task in self._catch_ups.values():
+            task.cancel()
+        for capture in self._captures.values():
+            capture.detach()
+        self._captures.clear()
+        await self.writer.close()
+
+    def ensure(self, user, ib: IB) -> bool:
+        """
+        Attach capture to `ib` once; pooled `IB` objects survive reconnects.
+        Returns True while a catch-up sync is due – right after attaching
+        (events fired during the initial handshake were missed) and after a
+        reconnect whose background catch-up has not succeeded yet.
+        """
+        capture = self._captures.get(user.id)
+        if capture is None or capture.ib is not ib:
+            if capture is not None:
+                capture.detach()
+            capture = TradeEventCapture(
+                ib, user_id=user.id, writer=self.writer, on_reconnect=lambda: self._schedule_catch_up(user)
+            )
+            self._captures[user.id] = capture
+            capture.attach()
+        return capture.needs_sync and user.id not in self._catch_ups
+
+    def synced(self, user_id: int) -> None:
+        """The caller ran the catch-up sync `ensure` asked for."""
+        capture = self._captures.get(user_id)
+        if capture is not None:
+            capture.needs_sync = False
+
+    def detach(self, user_id: int) -> None:
+        """Stop capturing `user_id` (e.g. its connection is handed to another replica)."""
+        task = self._catch_ups.pop(user_id, None)
+        if task is not None:
+            task.cancel()
+        capture = self._captures.pop(user_id, None)
+        if capture is not None:
+            capture.detach()
+            log.info("Streaming capture detached for user %d", user_id)
+
+    def _schedule_catch_up(self, user) -> None:
+        if self.catch_up is None or user.id in self._catch_ups:
+            return
+        task = asyncio.create_task(self._run_catch_up(user), name=f"capture-catch-up-{user.id}")
+        self._catch_ups[user.id] = task
+        task.add_done_callback(lambda t, uid=user.id: self._catch_ups.pop(uid, None))
+
+    async def _run_catch_up(self, user) -> None:
+        capture = self._captures.get(user.id)
+        if capture is None:
+            return
+        connects = capture.connects
+        try:
+            if not await self.catch_up(user, capture.ib):
+                # needs_sync stays set: the next cycle's `ensure` retries it
+                log.warning("Catch-up sync after reconnect failed for user %d", user.id)
+                return
+            # another reconnect while syncing needs another pass
+            capture.needs_sync = capture.connects != connects
+            log.info("Catch-up sync after reconnect done for user %d", user.id)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # needs_sync stays set: the next cycle's `ensure` retries it
+            log.exception("Catch-up sync after reconnect failed for user %d", user.id)
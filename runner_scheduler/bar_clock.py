@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+import numpy as np
+
+from database.db_manager import DBManager
+from database.models import Runner, User
+from ib_manager.bar_aggregator import DAY_SECONDS, bucket_bounds
+from ib_manager.connection_pool import IBConnectionPool
+from ib_manager.session_calendar import SessionCalendar, get_session_calendar
+from runner_scheduler.intent_executor import place_intents
+from runner_scheduler.timer_wheel import Timer, TimerWheel
+from strategy_engine.strategy_manager import RunnerPosition, StrategyManager
+
+# ──────────── Setup Logging ────────────
+log = logging.getLogger("Bar-Clock")
+
+# ──────────── Constants ────────────
+BAR_CLOCK_TICK = float(os.getenv("BAR_CLOCK_TICK", 1.0))
+BAR_CLOSE_GRACE = float(os.getenv("BAR_CLOSE_GRACE", 2.0))       # let the vendor publish the bar
+RUNNER_REFRESH_INTERVAL = float(os.getenv("RUNNER_REFRESH_INTERVAL", 60))
+JITTER_REPORT_INTERVAL = float(os.getenv("JITTER_REPORT_INTERVAL", 300))
+
+GroupKey = tuple[str, int]
+
+
+def _epoch(ts: Optional[datetime]) -> Optional[int]:
+    if ts is None:
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp())
+
+
+def _utc(t: int) -> datetime:
+    return datetime.fromtimestamp(t, timezone.utc)
+
+
+def next_boundary(
+    time_frame: int,
+    after: float,
+    *,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    calendar: SessionCalendar,
+    max_skips: int = 32,
+) -> Optional[int]:
+    """
+    First close (epoch seconds) after `after` of a `time_frame`-minute bar
+    that overlaps the extended session and the runner's [start, end] window;
+    None once the window is over. Intraday bars close on their epoch-aligned
+    boundaries, daily bars at the extended session close.
+    """
+    after = int(after)
+    seconds = time_frame * 60
+    for _ in range(max_skips):
+        if seconds >= DAY_SECONDS:
+            t = int(calendar.next_close(_utc(after + 1), extended=True).timestamp())
+            bar_start = t - seconds
+        else:
+            bar_start, t = bucket_bounds(after, time_frame)
+        if end is not None and bar_start > end:
+            return None
+        if start is not None and t <= start:
+            after = start
+            continue
+        if seconds >= DAY_SECONDS or calendar.is_open(_utc(t - 1), extended=True):
+            return t
+        # closed: jump to the first boundary of the next session
+        after = int(calendar.next_open(_utc(t), extended=True).timestamp())
+    return None
+
+
+def _fingerprint(r: Runner) -> tuple:
+    return r.stock.upper(), r.time_frame, r.time_range_from, r.time_range_to
+
+
+class BarClock:
+    """
+    Fires runner evaluation on each runner's own bar boundaries.
+
+    Every active runner holds one timer in a `TimerWheel` set to its next
+    bar close (inside its trading window and the exchange session); when
+    timers fire, the due runners are evaluated grouped by (stock, time
+    frame) and re-armed for their following boundary. Runners are re-read
+    every `refresh_interval` seconds. Groups returned by `exclude` (already
+    evaluated on live bar close) and users this replica does not `owns` are
+    skipped at fire time. The delay between a timer's deadline and its
+    firing is kept as jitter and logged.
+    """
+
+    def __init__(
+        self,
+        ib_pool: IBConnectionPool,
+        strategy_manager: StrategyManager,
+        *,
+        exclude: Callable[[], set[GroupKey]] = set,
+        owns: Callable[[int], bool] = lambda user_id: True,
+        tick: float = BAR_CLOCK_TICK,
+        grace: float = BAR_CLOSE_GRACE,
+        refresh_interval: float = RUNNER_REFRESH_INTERVAL,
+    ) -> None:
+        self.ib_pool = ib_pool
+        self.strategy_manager = strategy_manager
+        self.exclude = exclude
+        self.owns = owns
+        self.grace = grace
+        self.refresh_interval = refresh_interval
+        self.calendar = get_session_calendar("NYSE")
+        self.wheel = TimerWheel(tick=tick, now=time.time())
+        self._runners: dict[int, Runner] = {}
+        self._timers: dict[int, Timer] = {}
+        self._users: dict[int, User] = {}
+        self._jitter: deque[float] = deque(maxlen=10_000)
+        self._task: Optional[asyncio.Task] = None
+        self._tasks: set[asyncio.Task] = set()
+
+    # ───────────────────── lifecycle ─────────────────────
+    async def start(self) -> None:
+        await self.refresh()
+        self._task = asyncio.create_task(self._run(), name="bar-clock")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # ───────────────────── registration ─────────────────────
+    async def refresh(self) -> None:
+        """Arm new runners, re-arm changed ones, drop deactivated ones."""
+        def load():
+            with DBManager() as db:
+                return db.get_users_with_ib(), db.get_all_active_runners()
+
+        users, runners = await asyncio.to_thread(load)
+        self._users = {u.id: u for u in users if self.owns(u.id)}
+        active = {r.id: r for r in runners if r.user_id in self._users}
+
+        for rid in list(self._runners):
+            if rid not in active:
+                self._disarm(rid)
+        now = time.time()
+        for rid, runner in active.items():
+            old = self._runners.get(rid)
+            if old is None or _fingerprint(old) != _fingerprint(runner):
+                self._disarm(rid)
+                self._arm(runner, now)
+            else:
+                self._runners[rid] = runner          # pick up budget / stop changes
+        log.info("Bar clock: %d runner(s) armed", len(self._timers))
+
+    def _arm(self, runner: Runner, after: float) -> None:
+        self._runners[runner.id] = runner
+        t = next_boundary(runner.time_frame, after, start=_epoch(runner.time_range_from),
+                          end=_epoch(runner.time_range_to), calendar=self.calendar)
+        if t is None:
+            self._timers.pop(runner.id, None)
+            return
+        self._timers[runner.id] = self.wheel.schedule(t + self.grace, (runner.id, t))
+
+    def _disarm(self, runner_id: int) -> None:
+        self._runners.pop(runner_id, None)
+        timer = self._timers.pop(runner_id, None)
+        if timer is not None:
+            self.wheel.cancel(timer)
+
+    # ───────────────────── firing ─────────────────────
+    async def _run(self) -> None:
+        next_refresh = time.monotonic() + self.refresh_interval
+        next_report = time.monotonic() + JITTER_REPORT_INTERVAL
+        tick = self.wheel.tick
+        while True:
+            now = time.time()
+            await asyncio.sleep(tick - now % tick)
+            now = time.time()
+
+            due: dict[GroupKey, list[Runner]] = defaultdict(list)
+            for timer in self.wheel.advance(now):
+                rid, boundary = timer.payload
+                self._jitter.append(now - timer.deadline)
+                runner = self._runners.get(rid)
+                if runner is None or self._timers.get(rid) is not timer:
+                    continue
+                due[(runner.stock.upper(), runner.time_frame)].append(runner)
+                self._arm(runner, boundary)
+            if due:
+                self._spawn(self._fire(due, now))
+
+            mono = time.monotonic()
+            if mono >= next_refresh:
+                next_refresh = mono + self.refresh_interval
+                try:
+                    await self.refresh()
+                except Exception:
+                    log.exception("Bar clock refresh failed")
+            if mono >= next_report:
+                next_report = mono + JITTER_REPORT_INTERVAL
+                if self._jitter:
+                    log.info("Bar clock jitter: %s", self.jitter_stats())
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fire(self, due: dict[GroupKey, list[Runner]], now: float) -> None:
+        skip = self.exclude()
+        runners = [r for key, group in due.items() if key not in skip
+                   for r in group if self.owns(r.user_id)]
+        if not runners:
+            return
+
+        def evaluate():
+            with DBManager() as db:
+                raw = db.get_runner_positions(runner_ids=[r.id for r in runners])
+            positions = {rid: RunnerPosition(**p) for rid, p in raw.items()}
+            return self.strategy_manager.evaluate(runners, positions=positions, now=now)
+
+        try:
+            intents = await asyncio.to_thread(evaluate)
+        except Exception:
+            log.exception("Bar-boundary evaluation of %d runner(s) failed", len(runners))
+            return
+        await place_intents(self.ib_pool, self._users, intents, trigger="bar boundary")
+
+    def jitter_stats(self) -> dict:
+        """Timer lateness over the last fired timers, in milliseconds."""
+        if not self._jitter:
+            return {"samples": 0}
+        ms = np.asarray(self._jitter) * 1e3
+        return {
+            "samples": len(ms),
+            "p50_ms": round(float(np.percentile(ms, 50)), 1),
+            "p99_ms": round(float(np.percentile(ms, 99)), 1),
+            "max_ms": round(float(ms.max()), 1),
+        }
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Iterator, Sequence
+
+from database.models import User
+
+# ──────────── Setup Logging ────────────
+log = logging.getLogger("Cycle-Runner")
+
+# ──────────── Constants ────────────
+SCHEDULER_MAX_CONCURRENCY = int(os.getenv("SCHEDULER_MAX_CONCURRENCY", 8))
+SCHEDULER_USER_TIMEOUT = float(os.getenv("SCHEDULER_USER_TIMEOUT", 300))
+
+
+@dataclass
+class UserCycleReport:
+    """Outcome and per-stage timings of one user's pass through the pipeline."""
+
+    user_id: int
+    username: str
+    status: str = "pending"          # ok | skipped | timeout | error
+    duration: float = 0.0
+    stages: dict[str, float] = field(default_factory=dict)
+    error: str | None = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time a pipeline stage; the duration is recorded even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def skip(self, reason: str) -> None:
+        self.status = "skipped"
+        self.error = reason
+
+
+UserPipeline = Callable[[User, UserCycleReport], Awaitable[None]]
+
+
+class CycleRunner:
+    """
+    Fans a scheduler cycle out as one isolated asyncio task per user.
+
+    At most `max_concurrency` users are processed at the same time, each
+    pipeline run is bounded by `user_timeout` seconds, and a failure or
+    timeout of one user never affects the others.
+    """
+
+    def __init__(
+        self,
+        pipeline: UserPipeline,
+        *,
+        max_concurrency: int = SCHEDULER_MAX_CONCURRENCY,
+        user_timeout: float = SCHEDULER_USER_TIMEOUT,
+    ) -> None:
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be >= 1")
+        self.pipeline = pipeline
+        self.max_concurrency = max_concurrency
+        self.user_timeout = user_timeout
+
+    async def run(self, users: Sequence[User]) -> list[UserCycleReport]:
+        if not users:
+            return []
+
+        start = time.perf_counter()
+        sem = asyncio.Semaphore(self.max_concurrency)
+        tasks = [
+            asyncio.create_task(self._run_user(user, sem), name=f"cycle-user-{user.id}")
+            for user in users
+        ]
+        reports = await asyncio.gather(*tasks)
+
+        self._log_summary(reports, time.perf_counter() - start)
+        return reports
+
+    async def _run_user(self, user: User, sem: asyncio.Semaphore) -> UserCycleReport:
+        report = UserCycleReport(user_id=user.id, username=user.username)
+        async with sem:
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(self.pipeline(user, report), timeout=self.user_timeout)
+                if report.status == "pending":
+                    report.status = "ok"
+            except asyncio.TimeoutError:
+                report.status = "timeout"
+                report.error = f"timed out after {self.user_timeout:.0f}s"
+                log.error("User %s pipeline timed out after %.0fs", user.id, self.user_timeout)
+            except Exception as e:
+                report.status = "error"
+                report.error = repr(e)
+                log.exception("User %s pipeline failed", user.id)
+            finally:
+                report.duration = time.perf_counter() - start
+        return report
+
+    @staticmethod
+    def _log_summary(reports: Sequence[UserCycleReport], elapsed: float) -> None:
+        for r in reports:
+            stages = " ".join(f"{name}={secs:.2f}s" for name, secs in r.stages.items())
+            log.info(
+                "user=%s id=%s status=%s total=%.2fs %s%s",
+                r.username,
+                r.user_id,
+                r.status,
+                r.duration,
+                stages,
+                f" error={r.error}" if r.error else "",
+            )
+
+        slowest = max(reports, key=lambda r: r.duration)
+        counts: dict[str, int] = {}
+        for r in reports:
+            counts[r.status] = counts.get(r.status, 0) + 1
+        log.info(
+            "Cycle finished in %.2fs for %d user(s) %s – slowest user %s (%.2fs)",
+            elapsed,
+            len(reports),
+            counts,
+            slowest.user_id,
+            slowest.duration,
+        )
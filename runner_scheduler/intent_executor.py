@@ -0,0 +1,53 @@
+import asyncio
+import logging
+from collections import defaultdict
+
+from database.models import User
+from ib_manager.connection_pool import IBConnectionPool
+from ib_manager.ib_connector import IBBusinessManager
+from strategy_engine.strategy_manager import OrderIntent
+
+# ──────────── Setup Logging ────────────
+log = logging.getLogger("Intent-Executor")
+
+
+async def place_intents(
+    ib_pool: IBConnectionPool,
+    users: dict[int, User],
+    intents: list[OrderIntent],
+    *,
+    trigger: str,
+) -> None:
+    """
+    Place runner intents through each owner's pooled gateway connection.
+    A user's intents are submitted together; the order router paces them.
+    """
+    by_user: dict[int, list[OrderIntent]] = defaultdict(list)
+    for intent in intents:
+        by_user[intent.user_id].append(intent)
+    await asyncio.gather(*(
+        _place_for_user(ib_pool, users.get(uid), uid, batch, trigger=trigger)
+        for uid, batch in by_user.items()
+    ))
+
+
+async def _place_for_user(
+    ib_pool: IBConnectionPool,
+    user: User | None,
+    user_id: int,
+    intents: list[OrderIntent],
+    *,
+    trigger: str,
+) -> None:
+    if user is None:
+        log.warning("No IB user %d – %d intent(s) dropped", user_id, len(intents))
+        return
+    for intent in intents:
+        log.info("Runner %d → %s %s x%s (%s) on %s", intent.runner_id, intent.action,
+                 intent.symbol, intent.quantity, intent.reason, trigger)
+    try:
+        async with ib_pool.lease(user) as ib:
+            manager = IBBusinessManager(user, ib=ib)
+            await asyncio.gather(*(manager.place_order_intent(intent) for intent in intents))
+    except Exception:
+        log.exception("Placing %d intent(s) for user %d failed", len(intents), user_id)
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import os
+from collections import Counter, defaultdict
+from typing import Callable, Optional
+
+import numpy as np
+
+from database.db_manager import DBManager
+from database.models import Runner, User
+from ib_manager.bar_aggregator import BarAggregator, ClosedBar
+from ib_manager.connection_pool import IBConnectionPool
+from runner_scheduler.intent_executor import place_intents
+from strategy_engine.indicators import IndicatorFrame
+from strategy_engine.streaming_indicators import StreamingFrame
+from strategy_engine.strategy_manager import RunnerPosition, StrategyManager
+
+# ──────────── Setup Logging ────────────
+log = logging.getLogger("Live-Bars")
+
+# ──────────── Constants ────────────
+IB_LIVE_BARS = os.getenv("IB_LIVE_BARS", "true").lower() in ("1", "true", "yes")
+
+GroupKey = tuple[str, int]
+
+
+def seed_frame(frame: Optional[IndicatorFrame], *, keep: int) -> StreamingFrame:
+    """Streaming frame from the closed bars of `StrategyManager.load_frame`."""
+    if frame is None:
+        return StreamingFrame({c: np.empty(0) for c in StreamingFrame.COLUMNS}, keep=keep)
+    return StreamingFrame({c: getattr(frame, c) for c in StreamingFrame.COLUMNS}, keep=keep)
+
+
+class LiveBarFeed:
+    """
+    Evaluates runners the moment one of their bars closes.
+
+    Every symbol with an active runner is streamed by a `BarAggregator` on
+    the pooled gateway of one of the users trading it – the least loaded
+    connected one – so subscriptions are spread over the gateways and one
+    user's outage only moves its symbols elsewhere. When a carrying gateway
+    disconnects its symbols fail over right away; symbols nobody can carry
+    are left to the periodic cycle. Each closed bar is appended to the
+    group's `StreamingFrame` (seeded from history), whose indicators update
+    incrementally, and only that (symbol, time frame) group is evaluated.
+    Resulting intents are placed through the owning user's pooled
+    connection. `refresh` re-reads the active runners once per cycle.
+    """
+
+    def __init__(
+        self,
+        ib_pool: IBConnectionPool,
+        strategy_manager: StrategyManager,
+        *,
+        owns: Callable[[int], bool] = lambda user_id: True,
+    ) -> None:
+        self.ib_pool = ib_pool
+        self.strategy_manager = strategy_manager
+        self.owns = owns
+        self._aggregators: dict[int, BarAggregator] = {}     # user_id → aggregator on its gateway
+        self._carriers: dict[str, int] = {}                  # symbol → user_id streaming it
+        self._assigning = asyncio.Lock()
+        self._users: dict[int, User] = {}
+        self._groups: dict[GroupKey, list[Runner]] = {}
+        self._frames: dict[GroupKey, StreamingFrame] = {}
+        self._locks: dict[GroupKey, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def streamed(self) -> set[GroupKey]:
+        """Groups evaluated here rather than by the periodic cycle."""
+        return {key for key in self._groups if key[0] in self._carriers}
+
+    async def refresh(self, users: list[User]) -> None:
+        self._users = {u.id: u for u in users}
+        with DBManager() as db:
+            runners = await asyncio.to_thread(db.get_all_active_runners)
+        groups: dict[GroupKey, list[Runner]] = defaultdict(list)
+        for r in runners:
+            if r.user_id in self._users:
+                groups[(r.stock.upper(), r.time_frame)].append(r)
+        self._groups = dict(groups)
+
+        for key in list(self._frames):
+            if key not in self._groups:
+                del self._frames[key]
+        keep = self.strategy_manager.history_bars
+        for key in self._groups:
+            if key not in self._frames:
+                frame = await asyncio.to_thread(self.strategy_manager.load_frame, *key)
+                if frame is not None:
+                    self._frames[key] = seed_frame(frame, keep=keep)
+
+        self.forget([uid for uid in self._aggregators if uid not in self._users])
+        await self._assign()
+
+    def forget(self, user_ids) -> None:
+        """Stop streaming over the gateways of `user_ids`; their symbols move on the next assignment."""
+        for uid in user_ids:
+            agg = self._aggregators.pop(uid, None)
+            if agg is None:
+                continue
+            agg.ib.disconnectedEvent -= self._failover
+            agg.close()
+            for symbol in [s for s, u in self._carriers.items() if u == uid]:
+                del self._carriers[symbol]
+
+    async def drop_users(self, user_ids) -> None:
+        """`user_ids` are handled elsewhere now: leave their gateways and move their symbols."""
+        for uid in user_ids:
+            self._users.pop(uid, None)
+        self.forget(user_ids)
+        await self._assign()
+
+    def close(self) -> None:
+        self.forget(list(self._aggregators))
+
+    # ───────────────────── gateway assignment ─────────────────────
+    def _up(self, user_id: int) -> bool:
+        user = self._users.get(user_id)
+        conn = self.ib_pool.get(user) if user is not None else None
+        return conn is not None and conn.is_connected
+
+    async def _aggregator(self, user_id: int) -> Optional[BarAggregator]:
+        agg = self._aggregators.get(user_id)
+        if agg is not None:
+            return agg if self._up(user_id) else None
+        try:
+            async with self.ib_pool.lease(self._users[user_id]) as ib:
+                agg = BarAggregator(ib)
+        except ConnectionError as e:
+            log.warning("Gateway of user %s unavailable for bars: %s", user_id, e)
+            return None
+        agg.closedBarEvent += self._on_bar
+        agg.ib.disconnectedEvent += self._failover
+        self._aggregators[user_id] = agg
+        return agg
+
+    async def _assign(self) -> None:
+        """Put every wanted symbol on a connected gateway of a user trading it, least loaded first."""
+        async with self._assigning:
+            wanted: dict[str, set[int]] = defaultdict(set)
+            candidates: dict[str, set[int]] = defaultdict(set)
+            for (symbol, time_frame), runners in self._groups.items():
+                wanted[symbol].add(time_frame)
+                candidates[symbol].update(r.user_id for r in runners if self.owns(r.user_id))
+
+            for symbol, uid in list(self._carriers.items()):
+                if uid not in candidates.get(symbol, ()) or not self._up(uid):
+                    del self._carriers[symbol]
+            load = Counter(self._carriers.values())
+            for symbol in sorted(wanted):
+                if symbol in self._carriers:
+                    continue
+                for uid in sorted(candidates[symbol], key=lambda u: (load[u], u)):
+                    if await self._aggregator(uid) is not None:
+                        self._carriers[symbol] = uid
+                        load[uid] += 1
+                        break
+                else:
+                    log.warning("No connected gateway streams %s; left to the periodic cycle", symbol)
+
+            for uid, agg in self._aggregators.items():
+                agg.sync({s: wanted[s] for s, carrier in self._carriers.items() if carrier == uid})
+            if self._carriers:
+                log.info("Streaming bars for %d symbol(s) over %d gateway(s)",
+                         len(self._carriers), len(set(self._carriers.values())))
+
+    # ───────────────────── bar close ─────────────────────
+    def _failover(self) -> None:
+        self._spawn(self._assign())
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _on_bar(self, bar: ClosedBar) -> None:
+        self._spawn(self._handle(bar))
+
+    async def _handle(self, bar: ClosedBar) -> None:
+        key = (bar.symbol, bar.time_frame)
+        runners = [r for r in self._groups.get(key, ()) if self.owns(r.user_id)]
+        if not runners:
+            return
+        async with self._locks[key]:
+            try:
+                frame = self._frames.get(key)
+                if frame is None:
+                    frame = self._frames[key] = seed_frame(None, keep=self.strategy_manager.history_bars)
+                if not frame.append(bar.t, bar.o, bar.h, bar.l, bar.c, bar.v):
+                    return          # already seen, e.g. streamed twice during a failover
+                with DBManager() as db:
+                    raw = await asyncio.to_thread(db.get_runner_positions, runner_ids=[r.id for r in runners])
+                positions = {rid: RunnerPosition(**p) for rid, p in raw.items()}
+                intents = self.strategy_manager.evaluate(runners, positions=positions, frames={key: frame})
+            except Exception:
+                log.exception("Evaluating %s [%s min] on bar close failed", *key)
+                return
+
+        await place_intents(self.ib_pool, self._users, intents, trigger=f"{bar.time_frame}-min bar close")
@@ -1,10 +1,21 @@
 import asyncio
+import functools
 import logging
+import time
 from dotenv import load_dotenv
 from database.db_manager import DBManager
 from database.models import User
+from ib_manager.connection_pool import IBConnectionPool
+from ib_manager.contract_cache import ContractKey, contract_cache
 from ib_manager.gateway_manager import container_exists
 from ib_manager.ib_connector import IBBusinessManager
+from ib_manager.order_router import order_router
+from ib_manager.trade_event_capture import IB_STREAMING_CAPTURE, TradeCaptureHub
+from runner_scheduler.cycle_runner import CycleRunner, UserCycleReport
+from runner_scheduler.bar_clock import BarClock
+from runner_scheduler.live_bars import IB_LIVE_BARS, LiveBarFeed
+from runner_scheduler.sharding import SCHEDULER_SHARDING, ShardCoordinator
+from strategy_engine.strategy_manager import StrategyManager
 
 # Load environment variables from .env file
 load_dotenv()
@@ -16,12 +27,6 @@ logging.basicConfig(
 )
 log = logging.getLogger("Scheduler")  
 
-async def connect_to_ib_gateway(user: User) -> IBBusinessManager:
-    log.info(f"Attempting to connect and fetch data for user {user.id}")
-    business_manager = IBBusinessManager(user)
-    await business_manager.connect()
-    return business_manager
-
 async def fetch_and_store_snapshot(user: User, db: DBManager, business_manager: IBBusinessManager):
     if not db.get_today_snapshot(user.id):
         log.debug("Fetching account snapshot for %s", user.username)
@@ -39,8 +44,7 @@ async def fetch_open_positions(user: User, db: DBManager, business_manager: IBBu
     if positions:
         db.update_open_positions(user_id=user.id, positions=positions)
 
-async def place_test_order(user: User, business_manager: IBBusinessManager):
-    db = DBManager()
+async def place_test_order(user: User, db: DBManager, business_manager: IBBusinessManager):
     existing_runner_id = db.get_existing_runner_id(user_id=user.id)
     if existing_runner_id is None:
         log.warning("No existing runner ID found for user %s", user.username)
@@ -48,48 +52,149 @@ async def place_test_order(user: User, business_manager: IBBusinessManager):
     await business_manager.place_test_aggressive_limit(user_id=user.id, runner_id=existing_runner_id)
     await asyncio.sleep(2)
 
-async def sync_orders_and_trades(user: User, business_manager: IBBusinessManager):
-    await business_manager.sync_orders_from_ibkr(user_id=user.id)
+async def sync_orders_and_trades(user: User, business_manager: IBBusinessManager) -> bool:
+    """True only if both orders and executed trades were stored."""
+    orders_ok = await business_manager.sync_orders_from_ibkr(user_id=user.id)
     await asyncio.sleep(2)
 
-    business_manager.sync_executed_trades(user_id=user.id)
+    trades = await asyncio.to_thread(business_manager.sync_executed_trades, user_id=user.id)
     await asyncio.sleep(2)
+    return orders_ok and trades is not None
 
-async def main_loop():
-    db = DBManager()
-
-    while True:
-        log.info("Starting a new loop iteration...")
-        users = DBManager().get_users_with_ib()
-        if not users:
-            log.warning("No users with IB accounts found.")
+async def catch_up_after_reconnect(user: User, ib) -> bool:
+    """Run by `TradeCaptureHub` when a captured gateway connection comes back."""
+    return await sync_orders_and_trades(user, IBBusinessManager(user, ib=ib))
 
-        for user in users:
-            # Step 1: Start container if needed
-            if not container_exists(user.id):
-                log.warning(f"Static IB Gateway container missing: {user.id}")
-                # skip current iteration if container is missing
-                continue 
+async def warm_contracts(users, ib_pool: IBConnectionPool):
+    """Qualify every symbol of an active runner that is not cached yet (or is stale)."""
+    if not users:
+        return
+    with DBManager() as db:
+        symbols = {r.stock for r in db.get_all_active_runners()}
+    keys = [ContractKey.stock(s) for s in symbols]
+    async with ib_pool.lease(users[0]) as ib:
+        count = await contract_cache.warm(ib, keys, pace=functools.partial(order_router.pace, ib))
+    log.info("Contract cache warm: %d symbol(s), %d (re)qualified", len(keys), count)
+
+async def process_user(
+    user: User,
+    report: UserCycleReport,
+    *,
+    ib_pool: IBConnectionPool,
+    capture_hub: TradeCaptureHub | None,
+):
+    """Full per-user pipeline; runs as its own task under `CycleRunner`."""
+    # Step 1: Skip users whose gateway container is missing
+    with report.stage("container"):
+        exists = await asyncio.to_thread(container_exists, user.id)
+    if not exists:
+        log.warning(f"Static IB Gateway container missing: {user.id}")
+        report.skip("container missing")
+        return
 
-            # Step 2: Connect to IB Gateway
-            business_manager = await connect_to_ib_gateway(user)
+    with DBManager() as db:
+        # Step 2: Lease a pooled IB Gateway connection (handshake only on first use)
+        log.info(f"Leasing IB connection for user {user.id}")
+        started = time.perf_counter()
+        async with ib_pool.lease(user) as ib:
+            report.stages["connect"] = time.perf_counter() - started
+            business_manager = IBBusinessManager(user, ib=ib)
+            needs_sync = capture_hub is None or capture_hub.ensure(user, ib)
 
             # Step 3: Fetch and store snapshot
-            await fetch_and_store_snapshot(user, db, business_manager)
+            with report.stage("snapshot"):
+                await fetch_and_store_snapshot(user, db, business_manager)
 
             # Step 4: Fetch open positions
-            await fetch_open_positions(user, db, business_manager)
+            with report.stage("positions"):
+                await fetch_open_positions(user, db, business_manager)
 
             # Step 5: Place test order
-            await place_test_order(user, business_manager)
-
-            # Step 6: Sync orders and executed trades
-            await sync_orders_and_trades(user, business_manager)
+            with report.stage("test_order"):
+                await place_test_order(user, db, business_manager)
+
+            # Step 6: Sync orders and executed trades – with streaming capture
+            # only to catch up on what happened before it was attached (or
+            # while the gateway was away and the reconnect catch-up failed)
+            if needs_sync:
+                with report.stage("sync"):
+                    synced = await sync_orders_and_trades(user, business_manager)
+                if synced and capture_hub is not None:
+                    capture_hub.synced(user.id)
+        # Step 7: Leaving the lease returns the connection to the pool (stays connected)
 
-            # Step 7: Disconnect from IB Gateway
-            business_manager.disconnect()
-
-        log.info("Sleeping before next iteration...")
-        ## sleep for 30 minutes 
-        await asyncio.sleep(1800)
-       
+async def main_loop():
+    ib_pool = IBConnectionPool()
+    await ib_pool.start()
+    capture_hub = TradeCaptureHub(catch_up=catch_up_after_reconnect) if IB_STREAMING_CAPTURE else None
+    if capture_hub is not None:
+        await capture_hub.start()
+        # routed orders and captured events land in the same rows
+        order_router.use_writer(capture_hub.writer)
+    live_feed: LiveBarFeed | None = None
+
+    async def hand_over(user_ids: frozenset[int]) -> None:
+        # the new owner connects with the same client ids
+        if live_feed is not None:
+            await live_feed.drop_users(user_ids)
+        for user_id in user_ids:
+            if capture_hub is not None:
+                capture_hub.detach(user_id)
+            ib_pool.release(user_id)
+
+    # With sharding on, this replica only handles the users it holds a lease for
+    shards = ShardCoordinator(on_lost=hand_over) if SCHEDULER_SHARDING else None
+    if shards is not None:
+        await shards.start()
+    owns = shards.owns if shards is not None else (lambda user_id: True)
+    strategy_manager = StrategyManager()
+    live_feed = LiveBarFeed(ib_pool, strategy_manager, owns=owns) if IB_LIVE_BARS else None
+    # Runners are evaluated on their own bar boundaries, not once per cycle
+    bar_clock = BarClock(
+        ib_pool, strategy_manager, owns=owns,
+        exclude=(lambda: live_feed.streamed) if live_feed is not None else set,
+    )
+    await bar_clock.start()
+    cycle_runner = CycleRunner(
+        functools.partial(process_user, ib_pool=ib_pool, capture_hub=capture_hub)
+    )
+
+    try:
+        while True:
+            log.info("Starting a new loop iteration...")
+            with DBManager() as db:
+                users = db.get_users_with_ib()
+            if shards is not None:
+                users = shards.filter(users)
+            if not users:
+                log.warning("No users with IB accounts found.")
+
+            # Qualify runner symbols ahead of time so orders skip the round trip
+            try:
+                await warm_contracts(users, ib_pool)
+            except Exception:
+                log.exception("Contract cache warm-up failed")
+
+            # Stream bars for every active runner; those groups react at bar close
+            if live_feed is not None:
+                try:
+                    await live_feed.refresh(users)
+                except Exception:
+                    log.exception("Live bar feed refresh failed")
+
+            await cycle_runner.run(users)
+
+            log.info("Sleeping before next iteration...")
+            ## sleep for 30 minutes 
+            await asyncio.sleep(1800)
+    finally:
+        log.info("Shutting down: flushing order rows and closing connections")
+        if live_feed is not None:
+            live_feed.close()
+        await bar_clock.close()
+        await order_router.close()
+        if capture_hub is not None:
+            await capture_hub.close()
+        if shards is not None:
+            await shards.close()
+        await ib_pool.close()
@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import logging
+import os
+import socket
+import time
+from typing import Awaitable, Callable, Iterable, Optional, Sequence
+
+from database.db_manager import DBManager
+from database.models import User
+
+# ──────────── Setup Logging ────────────
+log = logging.getLogger("Shard-Coordinator")
+
+# ──────────── Constants ────────────
+SCHEDULER_SHARDING = os.getenv("SCHEDULER_SHARDING", "false").lower() in ("1", "true", "yes")
+SCHEDULER_REPLICA_ID = os.getenv("SCHEDULER_REPLICA_ID") or f"{socket.gethostname()}-{os.getpid()}"
+SHARD_HEARTBEAT_INTERVAL = float(os.getenv("SHARD_HEARTBEAT_INTERVAL", 10))
+SHARD_LEASE_TTL = float(os.getenv("SHARD_LEASE_TTL", 30))
+SHARD_LEASE_MARGIN = float(os.getenv("SHARD_LEASE_MARGIN", 5))   # s before expiry we stop trusting a lease
+
+
+def _weight(replica_id: str, user_id: int) -> int:
+    digest = hashlib.blake2b(f"{replica_id}:{user_id}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def owner_of(user_id: int, replicas: Sequence[str]) -> Optional[str]:
+    """Rendezvous (highest-random-weight) owner: a replica leaving only moves its own users."""
+    return max(replicas, key=lambda r: _weight(r, user_id), default=None)
+
+
+class ShardCoordinator:
+    """
+    Splits IB users across scheduler replicas.
+
+    Every replica heartbeats into `scheduler_replicas`; the live replicas
+    (heartbeat younger than `lease_ttl`) split users by rendezvous hashing.
+    A replica only works on users whose row in `user_leases` it holds: a
+    lease is taken when free, expired or already ours, renewed on every
+    heartbeat and released as soon as the user hashes elsewhere. A replica
+    that dies stops renewing, so its users are picked up by the others
+    within `lease_ttl` seconds. Lease times come from the database clock.
+
+    Leases only count while they are certainly still ours: once `lease_ttl`
+    minus `lease_margin` has passed since the last successful heartbeat
+    started, `owns` / `filter` answer nothing, so a replica cut off from the
+    database stops before another one may take its users over. `on_lost` is
+    awaited with the users this replica gave up, to hand their gateway
+    connections over cleanly.
+    """
+
+    def __init__(
+        self,
+        replica_id: str = SCHEDULER_REPLICA_ID,
+        *,
+        heartbeat_interval: float = SHARD_HEARTBEAT_INTERVAL,
+        lease_ttl: float = SHARD_LEASE_TTL,
+        lease_margin: float = SHARD_LEASE_MARGIN,
+        on_lost: Optional[Callable[[frozenset[int]], Awaitable[None]]] = None,
+    ) -> None:
+        if heartbeat_interval * 2 > lease_ttl:
+            raise ValueError("lease_ttl must cover at least two heartbeats")
+        if heartbeat_interval + lease_margin >= lease_ttl:
+            raise ValueError("lease_margin leaves no time between heartbeats")
+        self.replica_id = replica_id
+        self.heartbeat_interval = heartbeat_interval
+        self.lease_ttl = lease_ttl
+        self.lease_margin = lease_margin
+        self.on_lost = on_lost
+        self._owned: frozenset[int] = frozenset()
+        self._valid_until = 0.0                     # monotonic deadline of the held leases
+        self._replicas: list[str] = []
+        self._task: Optional[asyncio.Task] = None
+
+    # ───────────────────── lifecycle ─────────────────────
+    async def start(self) -> None:
+        await self.heartbeat()
+        self._task = asyncio.create_task(self._run(), name="shard-heartbeat")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._owned = frozenset()
+        self._valid_until = 0.0
+
+        def leave():
+            with DBManager() as db:
+                db.remove_replica(replica_id=self.replica_id)
+
+        await asyncio.to_thread(leave)
+        log.info("Replica %s left; its users will be rebalanced", self.replica_id)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.heartbeat()
+            except Exception:
+                log.exception("Shard heartbeat failed")
+                if self._owned and not self._valid():
+                    # the leases may be someone else's by now
+                    log.warning("Replica %s: leases of %d user(s) lapsed", self.replica_id, len(self._owned))
+                    lost, self._owned = self._owned, frozenset()
+                    await self._lose(lost)
+
+    # ───────────────────── assignment ─────────────────────
+    async def heartbeat(self) -> None:
+        started = time.monotonic()
+        owned, replicas = await asyncio.to_thread(self._heartbeat)
+        self._valid_until = started + self.lease_ttl - self.lease_margin
+        gained, lost = owned - self._owned, self._owned - owned
+        if gained or lost or replicas != self._replicas:
+            log.info("Replica %s: %d live replica(s), owns %d user(s) (+%d −%d)",
+                     self.replica_id, len(replicas), len(owned), len(gained), len(lost))
+        self._owned, self._replicas = owned, replicas
+        await self._lose(lost)
+
+    async def _lose(self, user_ids: frozenset[int]) -> None:
+        if not user_ids or self.on_lost is None:
+            return
+        try:
+            await self.on_lost(user_ids)
+        except Exception:
+            log.exception("Handing over %d lost user(s) failed", len(user_ids))
+
+    def _heartbeat(self) -> tuple[frozenset[int], list[str]]:
+        with DBManager() as db:
+            db.heartbeat_replica(replica_id=self.replica_id)
+            replicas = sorted(set(db.get_live_replicas(ttl=self.lease_ttl)) | {self.replica_id})
+            wanted = [u.id for u in db.get_users_with_ib() if owner_of(u.id, replicas) == self.replica_id]
+            held = db.acquire_user_leases(replica_id=self.replica_id, user_ids=wanted, ttl=self.lease_ttl)
+            db.release_user_leases(replica_id=self.replica_id, keep=held)
+        return frozenset(held), replicas
+
+    def _valid(self) -> bool:
+        return time.monotonic() < self._valid_until
+
+    def owns(self, user_id: int) -> bool:
+        return self._valid() and user_id in self._owned
+
+    def filter(self, users: Iterable[User]) -> list[User]:
+        if not self._valid():
+            return []
+        return [u for u in users if u.id in self._owned]
@@ -0,0 +1,93 @@
+import math
+from typing import Any, Sequence
+
+
+class Timer:
+    __slots__ = ("deadline", "due", "payload", "cancelled")
+
+    def __init__(self, deadline: float, due: int, payload: Any) -> None:
+        self.deadline = deadline      # epoch seconds requested
+        self.due = due                # tick it expires on
+        self.payload = payload
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+
+class TimerWheel:
+    """
+    Hierarchical hashed timer wheel (Varghese & Lauck).
+
+    Level 0 has `levels[0]` one-tick slots, each higher level's slot spans a
+    full turn of the level below; deadlines past the top level wait in an
+    overflow list. `schedule` and `cancel` are O(1) whatever the number of
+    timers; `advance` does O(1) work per tick plus one re-placement per timer
+    each time it cascades down a level. With the defaults (1 s tick,
+    64·64·64·64) a timer reaches the overflow list only beyond ~194 days.
+    """
+
+    def __init__(self, *, tick: float = 1.0, levels: Sequence[int] = (64, 64, 64, 64), now: float) -> None:
+        self.tick = tick
+        self.sizes = tuple(levels)
+        self.spans = [math.prod(self.sizes[:i]) for i in range(len(self.sizes) + 1)]   # ticks per slot, per level
+        self.wheels: list[list[list[Timer]]] = [[[] for _ in range(n)] for n in self.sizes]
+        self.overflow: list[Timer] = []
+        self.current = int(now // tick)
+        self.pending = 0
+
+    def __len__(self) -> int:
+        return self.pending
+
+    def schedule(self, deadline: float, payload: Any) -> Timer:
+        due = max(math.ceil(deadline / self.tick), self.current + 1)
+        timer = Timer(deadline, due, payload)
+        self._place(timer)
+        self.pending += 1
+        return timer
+
+    def cancel(self, timer: Timer) -> None:
+        if not timer.cancelled:
+            timer.cancel()
+            self.pending -= 1
+
+    def _place(self, timer: Timer) -> None:
+        delta = timer.due - self.current
+        for level, size in enumerate(self.sizes):
+            if delta < self.spans[level + 1]:
+                self.wheels[level][(timer.due // self.spans[level]) % size].append(timer)
+                return
+        self.overflow.append(timer)
+
+    def _cascade(self) -> None:
+        t = self.current
+        for level in range(1, len(self.sizes)):
+            if t % self.spans[level]:
+                return
+            slot = self.wheels[level][(t // self.spans[level]) % self.sizes[level]]
+            self.wheels[level][(t // self.spans[level]) % self.sizes[level]] = []
+            for timer in slot:
+                if not timer.cancelled:
+                    self._place(timer)
+        if t % self.spans[-1] == 0:
+            overflow, self.overflow = self.overflow, []
+            for timer in overflow:
+                if not timer.cancelled:
+                    self._place(timer)
+
+    def advance(self, now: float) -> list[Timer]:
+        """Move to `now`; return the timers that expired on the way, in tick order."""
+        target = int(now // self.tick)
+        expired: list[Timer] = []
+        while self.current < target:
+            self.current += 1
+            self._cascade()
+            slots = self.wheels[0]
+            idx = self.current % self.sizes[0]
+            slot, slots[idx] = slots[idx], []
+            for timer in slot:
+                if not timer.cancelled:
+                    timer.cancelled = True        # fired: a later cancel() is a no-op
+                    self.pending -= 1
+                    expired.append(timer)
+        return expired
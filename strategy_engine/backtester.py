@@ -0,0 +1,310 @@
+"""
+Vectorised backtester for runner configurations.
+
+    python -m strategy_engine.backtester --runner-id 12 --user-id 1
+    python -m strategy_engine.backtester --stock AAPL --strategy Fibonacci \
+        --time-frame 5 --stop-loss -2 --take-profit 3 --budget 10000 \
+        --start 2023-01-01 --end 2024-12-31
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import numpy as np
+
+from strategy_engine.indicators import IndicatorFrame
+from strategy_engine.strategies import get_strategy
+from strategy_engine.strategy_manager import resample, resolution_for
+
+logger = logging.getLogger(__name__)
+
+TRADING_MINUTES_PER_YEAR = 252 * 390
+
+
+@dataclass(frozen=True)
+class BacktestConfig:
+    """The subset of `Runner` fields that drive a backtest."""
+
+    stock: str
+    strategy: str
+    budget: float
+    time_frame: int
+    stop_loss: float                       # percent; sign ignored (UI sends -10..0)
+    take_profit: float                     # percent
+    exit_strategy: str = "strategy"
+    commission_ratio: Optional[float] = None   # percent of notional per side
+    time_range_from: Optional[datetime] = None
+    time_range_to: Optional[datetime] = None
+
+    @classmethod
+    def from_runner(cls, runner) -> "BacktestConfig":
+        return cls(**{f: getattr(runner, f) for f in cls.__dataclass_fields__})
+
+
+@dataclass
+class BacktestResult:
+    trades: list[dict]
+    equity_t: np.ndarray
+    equity: np.ndarray
+    stats: dict = field(default_factory=dict)
+
+    def to_dict(self, *, max_points: int = 1000) -> dict:
+        step = max(1, len(self.equity) // max_points) if max_points else 1
+        return {
+            "stats": self.stats,
+            "trades": self.trades,
+            "equity_curve": [
+                {"t": int(t), "equity": round(float(e), 2)}
+                for t, e in zip(self.equity_t[::step], self.equity[::step])
+            ],
+        }
+
+
+def _epoch(ts: Optional[datetime]) -> Optional[int]:
+    if ts is None:
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp())
+
+
+def _next_true(mask: np.ndarray) -> np.ndarray:
+    """For every bar, the index of the first True at or after it (len if none)."""
+    n = len(mask)
+    idx = np.where(mask, np.arange(n), n)
+    return np.minimum.accumulate(idx[::-1])[::-1]
+
+
+def _first_touch(low, high, stop_px, take_px, lo: int, hi: int, chunk: int = 256) -> Optional[int]:
+    """First index in [lo, hi) whose bar touches the stop or the target.
+
+    Scans in doubling chunks so a trade that exits early never pays for a
+    mask over the rest of the series.
+    """
+    while lo < hi:
+        end = min(hi, lo + chunk)
+        hit = (low[lo:end] <= stop_px) | (high[lo:end] >= take_px)
+        if hit.any():
+            return lo + int(np.argmax(hit))
+        lo, chunk = end, chunk * 2
+    return None
+
+
+def run_backtest(config: BacktestConfig, frame: IndicatorFrame) -> BacktestResult:
+    """
+    Replay `frame` under `config`.
+
+    Entry and strategy-exit signals come from the strategy for the whole
+    series at once. Entries fill at the signal bar's close; stop loss /
+    take profit are checked against each following bar's low / high and fill
+    at their level (the stop wins when both are touched in one bar); strategy
+    exits and the `time_range_to` expiry fill at the close. One position at
+    a time, sized from the cash on hand (budget plus realized P&L, fees
+    included); the run stops once that is used up. The walk is per trade,
+    every scan inside it is a NumPy search.
+    """
+    strategy = get_strategy(config.strategy)
+    if strategy is None:
+        raise ValueError(f"Unknown strategy: {config.strategy!r}")
+
+    n = len(frame)
+    t, h, l, c = frame.t, frame.h, frame.l, frame.c
+    if n == 0:
+        return BacktestResult([], t, np.empty(0), _stats(config, [], np.empty(0), t))
+    entry_sig, exit_sig = strategy.signals(frame)
+    entry_sig[: strategy.warmup] = False
+
+    start_ts, end_ts = _epoch(config.time_range_from), _epoch(config.time_range_to)
+    in_window = np.ones(n, dtype=bool)
+    if start_ts is not None:
+        in_window &= t >= start_ts
+    if end_ts is not None:
+        in_window &= t <= end_ts
+    entries = np.flatnonzero(entry_sig & in_window)
+
+    # forced exits that do not depend on the entry price
+    forced = np.zeros(n, dtype=bool)
+    strategy_exit = "strategy" in (config.exit_strategy or "")
+    expiry_exit = end_ts is not None and "expired date" in (config.exit_strategy or "")
+    if strategy_exit:
+        forced |= exit_sig
+    if expiry_exit:
+        forced |= t >= end_ts
+    forced[-1] = True                          # close out at the end of the data
+    next_forced = _next_true(forced)
+
+    stop_pct = abs(config.stop_loss) / 100
+    take_pct = config.take_profit / 100
+    fee = (config.commission_ratio or 0.0) / 100
+
+    trades: list[dict] = []
+    cash = config.budget
+    cursor = 0
+    while cash > 0:
+        k = np.searchsorted(entries, cursor)
+        if k >= len(entries):
+            break
+        i = int(entries[k])
+        px_in = c[i]
+        # room for both sides' fees: a losing exit costs less than the entry
+        qty = np.floor(cash / (px_in * (1 + 2 * fee)))
+        if qty < 1 or i == n - 1:
+            cursor = i + 1
+            continue
+
+        stop_px, take_px = px_in * (1 - stop_pct), px_in * (1 + take_pct)
+        bound = int(next_forced[i + 1])
+        j = _first_touch(l, h, stop_px, take_px, i + 1, bound + 1)
+        if j is not None:
+            if l[j] <= stop_px:
+                px_out, reason = min(stop_px, frame.o[j]), "stop_loss"
+            else:
+                px_out, reason = max(take_px, frame.o[j]), "take_profit"
+        else:
+            j = bound
+            px_out = c[j]
+            reason = ("exit_signal" if strategy_exit and exit_sig[j]
+                      else "expired" if expiry_exit and t[j] >= end_ts
+                      else "end_of_data")
+
+        costs = fee * qty * (px_in + px_out)
+        pnl = qty * (px_out - px_in) - costs
+        cash += pnl
+        trades.append({
+            "entry_time": int(t[i]), "entry_price": round(float(px_in), 4),
+            "exit_time": int(t[j]), "exit_price": round(float(px_out), 4),
+            "quantity": float(qty), "pnl": round(float(pnl), 2),
+            "return_pct": round(float(pnl / (qty * px_in) * 100), 3),
+            "bars": j - i, "reason": reason,
+            "_i": i, "_j": j, "_px": px_in, "_pnl": pnl,
+        })
+        cursor = j + 1
+
+    equity = _equity_curve(config.budget, c, trades)
+    for tr in trades:
+        del tr["_i"], tr["_j"], tr["_px"], tr["_pnl"]
+    return BacktestResult(trades, t, equity, _stats(config, trades, equity, t))
+
+
+def _equity_curve(budget: float, close: np.ndarray, trades: list[dict]) -> np.ndarray:
+    n = len(close)
+    qty = np.zeros(n + 1)
+    cost = np.zeros(n + 1)
+    realized = np.zeros(n)
+    for tr in trades:
+        i, j, q = tr["_i"], tr["_j"], tr["quantity"]
+        qty[i] += q
+        qty[j] -= q
+        # unrounded prices / P&L, so the curve matches the cash sizing used
+        cost[i] += q * tr["_px"]
+        cost[j] -= q * tr["_px"]
+        realized[j] += tr["_pnl"]
+    held, basis = np.cumsum(qty[:n]), np.cumsum(cost[:n])
+    return budget + np.cumsum(realized) + held * close - basis
+
+
+def _stats(config: BacktestConfig, trades: list[dict], equity: np.ndarray, t: np.ndarray) -> dict:
+    pnl = np.array([tr["pnl"] for tr in trades])
+    stats = {
+        "bars": int(len(equity)),
+        "start": int(t[0]) if len(t) else None,
+        "end": int(t[-1]) if len(t) else None,
+        "trades": int(len(trades)),
+        "final_equity": round(float(equity[-1]), 2) if len(equity) else config.budget,
+        "total_return_pct": 0.0, "win_rate_pct": 0.0, "profit_factor": None,
+        "avg_trade_pnl": 0.0, "max_drawdown_pct": 0.0, "sharpe": None,
+        "exposure_pct": 0.0,
+    }
+    if len(equity):
+        stats["total_return_pct"] = round(float((equity[-1] / config.budget - 1) * 100), 3)
+        peak = np.maximum.accumulate(equity)
+        stats["max_drawdown_pct"] = round(float(((equity - peak) / peak).min() * -100), 3)
+        rets = np.diff(equity) / equity[:-1]
+        if len(rets) > 1 and rets.std() > 0:
+            bars_per_year = TRADING_MINUTES_PER_YEAR / min(config.time_frame, 390)
+            stats["sharpe"] = round(float(rets.mean() / rets.std() * np.sqrt(bars_per_year)), 3)
+    if len(pnl):
+        wins, losses = pnl[pnl > 0].sum(), -pnl[pnl < 0].sum()
+        stats["win_rate_pct"] = round(float((pnl > 0).mean() * 100), 2)
+        stats["profit_factor"] = round(float(wins / losses), 3) if losses > 0 else None
+        stats["avg_trade_pnl"] = round(float(pnl.mean()), 2)
+        stats["exposure_pct"] = round(sum(tr["bars"] for tr in trades) / max(1, len(equity)) * 100, 2)
+    return stats
+
+
+def load_frame(stock: str, time_frame: int, start: int, end: int, market_data=None) -> IndicatorFrame:
+    """Bars for [start, end] from the local bar store, resampled to `time_frame` minutes."""
+    from ib_manager.market_data_manager import MarketDataManager
+
+    resolution, factor = resolution_for(time_frame)
+    candles = (market_data or MarketDataManager()).get_candles_range(stock.upper(), resolution, start, end)
+    if not candles:
+        raise RuntimeError(f"No historical bars for {stock} [{resolution}]")
+    return IndicatorFrame(resample(candles, time_frame * 60) if factor > 1 else candles)
+
+
+def backtest_runner(
+    config: BacktestConfig,
+    *,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> BacktestResult:
+    """Backtest over [start, end]; defaults to the runner's time range, else the last year."""
+    end = end or config.time_range_to or datetime.now(timezone.utc)
+    start = start or config.time_range_from or (end - timedelta(days=365))
+    frame = load_frame(config.stock, config.time_frame, _epoch(start), _epoch(end))
+    return run_backtest(config, frame)
+
+
+def _parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Backtest a runner configuration.")
+    p.add_argument("--runner-id", type=int, help="load the configuration of this runner")
+    p.add_argument("--user-id", type=int, help="owner of --runner-id")
+    p.add_argument("--stock")
+    p.add_argument("--strategy", default="Fibonacci")
+    p.add_argument("--budget", type=float, default=10_000)
+    p.add_argument("--time-frame", type=int, default=5)
+    p.add_argument("--stop-loss", type=float, default=-2)
+    p.add_argument("--take-profit", type=float, default=3)
+    p.add_argument("--commission-ratio", type=float)
+    p.add_argument("--exit-strategy", default="strategy")
+    p.add_argument("--start", type=datetime.fromisoformat)
+    p.add_argument("--end", type=datetime.fromisoformat)
+    p.add_argument("--trades", action="store_true", help="print every trade")
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = _parse_args()
+
+    if args.runner_id is not None:
+        from database.db_manager import DBManager
+
+        with DBManager() as db:
+            runner = db.get_runner(user_id=args.user_id, runner_id=args.runner_id)
+        if runner is None:
+            raise SystemExit(f"Runner {args.runner_id} not found for user {args.user_id}")
+        cfg = BacktestConfig.from_runner(runner)
+    elif args.stock:
+        cfg = BacktestConfig(
+            stock=args.stock, strategy=args.strategy, budget=args.budget,
+            time_frame=args.time_frame, stop_loss=args.stop_loss, take_profit=args.take_profit,
+            exit_strategy=args.exit_strategy, commission_ratio=args.commission_ratio,
+        )
+    else:
+        raise SystemExit("Pass --runner-id/--user-id or --stock")
+
+    started = time.perf_counter()
+    result = backtest_runner(cfg, start=args.start, end=args.end)
+    elapsed = time.perf_counter() - started
+    out = {"config": asdict(cfg), "stats": result.stats, "elapsed_s": round(elapsed, 3)}
+    if args.trades:
+        out["trades"] = result.trades
+    print(json.dumps(out, indent=2, default=str))
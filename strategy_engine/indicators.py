@@ -0,0 +1,136 @@
+"""
+Vectorised indicators over whole bar columns (NumPy / pandas).
+
+pandas_ta 0.3.14b0 still imports `numpy.NaN`, which NumPy 2 removed, so the
+few indicators the strategies need are computed here with its definitions:
+EMAs are seeded with the SMA of their first `length` values and continue
+with `adjust=False`; RSI and ATR smooth with pandas_ta's `rma`, i.e.
+`ewm(alpha=1/length, adjust=True)`, and the first true range is NaN. The
+one known difference: pandas_ta adds a float epsilon to every high - low
+range when any bar has a zero range, which is left out here.
+`python -m strategy_engine.streaming_indicators` compares both with
+pandas_ta where it imports.
+"""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+
+def sma(x: np.ndarray, length: int) -> np.ndarray:
+    return pd.Series(x).rolling(length, min_periods=length).mean().to_numpy()
+
+
+def ema(x: np.ndarray, length: int) -> np.ndarray:
+    """SMA-seeded EMA from the first defined value on, as pandas_ta `ema`."""
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(len(x), np.nan)
+    defined = np.flatnonzero(~np.isnan(x))
+    if not len(defined) or len(x) - defined[0] < length:
+        return out
+    seed = defined[0] + length - 1
+    tail = x[seed:].copy()
+    tail[0] = x[defined[0]: seed + 1].mean()
+    out[seed:] = pd.Series(tail).ewm(span=length, adjust=False).mean().to_numpy()
+    return out
+
+
+def rma(x: np.ndarray, length: int) -> np.ndarray:
+    """Wilder smoothing as pandas_ta `rma`."""
+    return pd.Series(x).ewm(alpha=1.0 / length, adjust=True, min_periods=length).mean().to_numpy()
+
+
+def rsi(close: np.ndarray, length: int = 14) -> np.ndarray:
+    delta = np.diff(close, prepend=np.nan)
+    gain = rma(np.where(delta < 0, 0.0, delta), length)        # NaN stays NaN
+    loss = rma(np.where(delta > 0, 0.0, -delta), length)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return 100.0 * gain / (gain + loss)
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, length: int = 14) -> np.ndarray:
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+    tr = np.max(np.vstack([high - low, np.abs(high - prev_close), np.abs(low - prev_close)]), axis=0)
+    return rma(tr, length)
+
+
+def macd(close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(macd, signal, histogram); the signal EMA starts at the first defined MACD value."""
+    line = ema(close, fast) - ema(close, slow)
+    sig = ema(line, signal)
+    return line, sig, line - sig
+
+
+def bollinger(close: np.ndarray, length: int = 20, mult: float = 2.0) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(lower, mid, upper) bands; population standard deviation, as pandas_ta `bbands`."""
+    s = pd.Series(close)
+    mid = s.rolling(length, min_periods=length).mean()
+    dev = s.rolling(length, min_periods=length).std(ddof=0) * mult
+    return (mid - dev).to_numpy(), mid.to_numpy(), (mid + dev).to_numpy()
+
+
+def vwap(t: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray, volume: np.ndarray) -> np.ndarray:
+    """Typical-price VWAP anchored to each US/Eastern trading day."""
+    day = pd.to_datetime(t, unit="s", utc=True).tz_convert("US/Eastern").date
+    tp = (high + low + close) / 3.0
+    df = pd.DataFrame({"pv": tp * volume, "v": volume, "day": day})
+    cum = df.groupby("day", sort=False)[["pv", "v"]].cumsum()
+    return (cum["pv"] / cum["v"]).to_numpy()
+
+
+def rolling_max(x: np.ndarray, length: int) -> np.ndarray:
+    return pd.Series(x).rolling(length, min_periods=length).max().to_numpy()
+
+
+def rolling_min(x: np.ndarray, length: int) -> np.ndarray:
+    return pd.Series(x).rolling(length, min_periods=length).min().to_numpy()
+
+
+def fib_levels(high: np.ndarray, low: np.ndarray, length: int, ratios: tuple[float, ...]) -> dict[float, np.ndarray]:
+    """Retracement levels of the rolling `length`-bar swing: `swing_high - r * range`."""
+    hi, lo = rolling_max(high, length), rolling_min(low, length)
+    rng = hi - lo
+    return {r: hi - r * rng for r in ratios}
+
+
+class IndicatorFrame:
+    """
+    Bars of one (symbol, time frame) group plus a memo of derived series.
+
+    Strategies ask for indicators by name and parameters; each distinct one
+    is computed once per group no matter how many runners or strategies use it.
+    """
+
+    __slots__ = ("t", "o", "h", "l", "c", "v", "_memo")
+
+    def __init__(self, bars: dict[str, np.ndarray]) -> None:
+        self.t = np.asarray(bars["t"], dtype=np.int64)
+        self.o = np.asarray(bars["o"], dtype=np.float64)
+        self.h = np.asarray(bars["h"], dtype=np.float64)
+        self.l = np.asarray(bars["l"], dtype=np.float64)
+        self.c = np.asarray(bars["c"], dtype=np.float64)
+        self.v = np.asarray(bars["v"], dtype=np.float64)
+        self._memo: dict[tuple, object] = {}
+
+    def __len__(self) -> int:
+        return len(self.c)
+
+    def _get(self, key: tuple, compute):
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+    def ema(self, length: int) -> np.ndarray:
+        return self._get(("ema", length), lambda: ema(self.c, length))
+
+    def sma(self, length: int) -> np.ndarray:
+        return self._get(("sma", length), lambda: sma(self.c, length))
+
+    def rsi(self, length: int = 14) -> np.ndarray:
+        return self._get(("rsi", length), lambda: rsi(self.c, length))
+
+    def atr(self, length: int = 14) -> np.ndarray:
+        return self._get(("atr", length), lambda: atr(self.h, self.l, self.c, length))
+
+    def fib(self, length: int, ratios: tuple[float, ...]) -> dict[float, np.ndarray]:
+        return self._get(("fib", length, ratios), lambda: fib_levels(self.h, self.l, length, ratios))
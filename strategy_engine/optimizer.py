@@ -0,0 +1,284 @@
+"""
+Parallel parameter sweep over runner settings.
+
+    python -m strategy_engine.optimizer --runner-id 12 --user-id 1 \
+        --grid stop_loss=-1,-2,-3 take_profit=2,3,5 time_frame=5,15,30 \
+        --objective sharpe --workers 8 [--create "AAPL fib tuned"]
+
+    python -m strategy_engine.optimizer --stock AAPL --random 200 \
+        --range stop_loss=-5:-0.5 take_profit=1:10 --grid time_frame=5,15
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timedelta, timezone
+from multiprocessing import shared_memory
+from typing import Any, Optional, Sequence
+
+import numpy as np
+
+from strategy_engine.backtester import BacktestConfig, _epoch, run_backtest
+from strategy_engine.indicators import IndicatorFrame
+from strategy_engine.strategy_manager import resample, resolution_for
+
+logger = logging.getLogger(__name__)
+
+TUNABLE_FIELDS = ("stop_loss", "take_profit", "time_frame", "budget", "exit_strategy", "strategy")
+MINIMIZED_OBJECTIVES = {"max_drawdown_pct"}
+INT_FIELDS = {"time_frame"}
+
+
+# ───────────────────── search spaces ─────────────────────
+def grid_space(grid: dict[str, Sequence[Any]]) -> list[dict[str, Any]]:
+    """Cartesian product of the listed values per field."""
+    keys = list(grid)
+    return [dict(zip(keys, combo)) for combo in itertools.product(*(grid[k] for k in keys))]
+
+
+def random_space(
+    ranges: dict[str, tuple[float, float]],
+    n: int,
+    *,
+    choices: Optional[dict[str, Sequence[Any]]] = None,
+    seed: Optional[int] = None,
+) -> list[dict[str, Any]]:
+    """
+    `n` samples: uniform within each (low, high) range – integers for
+    `INT_FIELDS`, bounds included – and uniform over each choice list.
+    """
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        params = {
+            k: rng.randint(math.ceil(lo), math.floor(hi)) if k in INT_FIELDS else round(rng.uniform(lo, hi), 2)
+            for k, (lo, hi) in ranges.items()
+        }
+        params.update({k: rng.choice(list(v)) for k, v in (choices or {}).items()})
+        out.append(params)
+    return out
+
+
+# ───────────────────── shared bars (worker side) ─────────────────────
+_SHARED: dict[str, np.ndarray] = {}
+_SHM_HANDLES: list[shared_memory.SharedMemory] = []
+_FRAMES: dict[int, IndicatorFrame] = {}
+
+
+def _attach(spec: dict[str, tuple[str, str, int]], base_seconds: int) -> None:
+    """Pool initializer: map the parent's bar columns read-only, without copying."""
+    _SHARED.clear()
+    _FRAMES.clear()
+    for col, (name, dtype, length) in spec.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _SHM_HANDLES.append(shm)
+        arr = np.ndarray((length,), dtype=np.dtype(dtype), buffer=shm.buf)
+        arr.flags.writeable = False
+        _SHARED[col] = arr
+    _SHARED["_base"] = np.array(base_seconds)
+
+
+def _frame(time_frame: int) -> IndicatorFrame:
+    # one frame (and so one set of indicators) per time frame per worker
+    frame = _FRAMES.get(time_frame)
+    if frame is None:
+        base = int(_SHARED["_base"])
+        bars = {c: _SHARED[c] for c in ("t", "o", "h", "l", "c", "v")}
+        if time_frame * 60 > base:
+            bars = resample(bars, time_frame * 60)
+        frame = _FRAMES[time_frame] = IndicatorFrame(bars)
+    return frame
+
+
+def _run_shard(base: BacktestConfig, shard: list[dict[str, Any]]) -> list[tuple[dict, dict]]:
+    out = []
+    for params in shard:
+        cfg = replace(base, **params)
+        try:
+            out.append((params, run_backtest(cfg, _frame(cfg.time_frame)).stats))
+        except Exception as e:
+            out.append((params, {"error": repr(e)}))
+    return out
+
+
+# ───────────────────── driver ─────────────────────
+@dataclass
+class SweepResult:
+    params: dict[str, Any]
+    stats: dict[str, Any]
+    score: Optional[float]
+
+
+class ParameterSweep:
+    """
+    Runs a search space of runner settings through the backtester on a
+    process pool. Bars are loaded once in the parent at the finest time
+    frame the space needs and published through `SharedMemory`; workers map
+    them read-only and resample per time frame themselves. The space is
+    sorted by time frame before sharding so each shard mostly reuses one
+    frame and its indicators.
+    """
+
+    def __init__(self, base: BacktestConfig, *, workers: Optional[int] = None, objective: str = "sharpe") -> None:
+        self.base = base
+        self.workers = workers or os.cpu_count() or 1
+        self.objective = objective
+
+    def run(
+        self,
+        space: list[dict[str, Any]],
+        bars: dict[str, np.ndarray],
+        base_seconds: int,
+    ) -> list[SweepResult]:
+        for params in space:
+            bad = set(params) - set(TUNABLE_FIELDS)
+            if bad:
+                raise ValueError(f"Not tunable: {sorted(bad)}")
+
+        space = sorted(space, key=lambda p: p.get("time_frame", self.base.time_frame))
+        n_shards = min(len(space), self.workers * 4) or 1
+        size = math.ceil(len(space) / n_shards)
+        shards = [space[i : i + size] for i in range(0, len(space), size)]
+
+        handles, spec = [], {}
+        try:
+            for col in ("t", "o", "h", "l", "c", "v"):
+                arr = np.ascontiguousarray(bars[col])
+                shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+                handles.append(shm)
+                np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+                spec[col] = (shm.name, arr.dtype.str, len(arr))
+
+            started = time.perf_counter()
+            with ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_attach, initargs=(spec, base_seconds)
+            ) as pool:
+                futures = [pool.submit(_run_shard, self.base, shard) for shard in shards]
+                raw = [item for f in futures for item in f.result()]
+            logger.info("Swept %d configuration(s) in %d shard(s) on %d worker(s) in %.2fs",
+                        len(space), len(shards), self.workers, time.perf_counter() - started)
+        finally:
+            for shm in handles:
+                shm.close()
+                shm.unlink()
+
+        return self.rank(raw)
+
+    def rank(self, raw: list[tuple[dict, dict]]) -> list[SweepResult]:
+        sign = -1.0 if self.objective in MINIMIZED_OBJECTIVES else 1.0
+        results = [SweepResult(p, s, s.get(self.objective)) for p, s in raw]
+        return sorted(
+            results,
+            key=lambda r: (r.score is None, -sign * r.score if r.score is not None else 0.0),
+        )
+
+    def create_runner(self, result: SweepResult, *, user_id: int, name: str, **overrides):
+        """Persist `result`'s configuration as a new (inactive) runner."""
+        from database.db_manager import DBManager
+
+        cfg = replace(self.base, **result.params)
+        data = asdict(cfg)
+        data.update({"name": name, "activation": "inactive", **overrides})
+        with DBManager() as db:
+            return db.create_runner(user_id=user_id, data=data)
+
+
+def load_bars(stock: str, time_frames: Sequence[int], start: int, end: int) -> tuple[dict[str, np.ndarray], int]:
+    """Bars at the finest resolution every requested time frame can be built from."""
+    from ib_manager.market_data_manager import MarketDataManager
+
+    finest = math.gcd(*time_frames)
+    resolution, factor = resolution_for(finest)
+    candles = MarketDataManager().get_candles_range(stock.upper(), resolution, start, end)
+    if not candles:
+        raise RuntimeError(f"No historical bars for {stock} [{resolution}]")
+    base_seconds = finest * 60
+    bars = resample(candles, base_seconds) if factor > 1 else candles
+    return {c: np.asarray(bars[c]) for c in ("t", "o", "h", "l", "c", "v")}, base_seconds
+
+
+# ───────────────────── CLI ─────────────────────
+def _parse_value(field: str, raw: str) -> Any:
+    if field in ("exit_strategy", "strategy"):
+        return raw
+    return int(raw) if field in INT_FIELDS else float(raw)
+
+
+def _parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Sweep runner settings through the backtester.")
+    p.add_argument("--runner-id", type=int)
+    p.add_argument("--user-id", type=int)
+    p.add_argument("--stock")
+    p.add_argument("--strategy", default="Fibonacci")
+    p.add_argument("--budget", type=float, default=10_000)
+    p.add_argument("--grid", nargs="*", default=[], metavar="FIELD=V1,V2,…")
+    p.add_argument("--range", nargs="*", default=[], metavar="FIELD=LOW:HIGH")
+    p.add_argument("--random", type=int, help="random search with this many samples")
+    p.add_argument("--seed", type=int)
+    p.add_argument("--objective", default="sharpe")
+    p.add_argument("--workers", type=int)
+    p.add_argument("--start", type=datetime.fromisoformat)
+    p.add_argument("--end", type=datetime.fromisoformat)
+    p.add_argument("--top", type=int, default=10)
+    p.add_argument("--create", metavar="NAME", help="create the winning configuration as a runner")
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = _parse_args()
+
+    if args.runner_id is not None:
+        from database.db_manager import DBManager
+
+        with DBManager() as db:
+            runner = db.get_runner(user_id=args.user_id, runner_id=args.runner_id)
+        if runner is None:
+            raise SystemExit(f"Runner {args.runner_id} not found for user {args.user_id}")
+        base = BacktestConfig.from_runner(runner)
+    elif args.stock:
+        base = BacktestConfig(stock=args.stock, strategy=args.strategy, budget=args.budget,
+                              time_frame=5, stop_loss=-2, take_profit=3)
+    else:
+        raise SystemExit("Pass --runner-id/--user-id or --stock")
+
+    grid = {}
+    for item in args.grid:
+        field, values = item.split("=", 1)
+        grid[field] = [_parse_value(field, v) for v in values.split(",")]
+    ranges = {}
+    for item in args.range:
+        field, bounds = item.split("=", 1)
+        lo, hi = bounds.split(":")
+        ranges[field] = (float(lo), float(hi))
+
+    if args.random:
+        space = random_space(ranges, args.random, choices=grid, seed=args.seed)
+    else:
+        space = grid_space(grid) if grid else [{}]
+
+    end = args.end or base.time_range_to or datetime.now(timezone.utc)
+    start = args.start or base.time_range_from or (end - timedelta(days=365))
+    time_frames = sorted({p.get("time_frame", base.time_frame) for p in space})
+    bars, base_seconds = load_bars(base.stock, time_frames, _epoch(start), _epoch(end))
+
+    sweep = ParameterSweep(base, workers=args.workers, objective=args.objective)
+    results = sweep.run(space, bars, base_seconds)
+    print(json.dumps(
+        [{"params": r.params, "score": r.score, "stats": r.stats} for r in results[: args.top]],
+        indent=2, default=str,
+    ))
+
+    if args.create and results and results[0].score is not None:
+        if args.user_id is None:
+            raise SystemExit("--create needs --user-id")
+        created = sweep.create_runner(results[0], user_id=args.user_id, name=args.create)
+        print(f"Created runner id={created.id} name={created.name!r}")
@@ -0,0 +1,67 @@
+"""
+Strategy rules as whole-series boolean signals.
+
+A strategy maps an `IndicatorFrame` to `(entry, exit)` arrays aligned with
+its bars. The live engine only reads the last element; the backtester uses
+the full series. Risk exits (stop loss, take profit, expiry) are per-runner
+and handled by the callers, not here.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+import numpy as np
+
+from strategy_engine.indicators import IndicatorFrame
+
+
+def _cross_up(x: np.ndarray, level: np.ndarray) -> np.ndarray:
+    out = np.zeros(len(x), dtype=bool)
+    out[1:] = (x[:-1] < level[:-1]) & (x[1:] >= level[1:])
+    return out
+
+
+def _cross_down(x: np.ndarray, level: np.ndarray) -> np.ndarray:
+    out = np.zeros(len(x), dtype=bool)
+    out[1:] = (x[:-1] > level[:-1]) & (x[1:] <= level[1:])
+    return out
+
+
+class Strategy:
+    name: str = ""
+    warmup: int = 0           # bars needed before the first valid signal
+
+    def signals(self, frame: IndicatorFrame) -> tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError
+
+
+class FibonacciStrategy(Strategy):
+    """
+    Buy the bounce off the 61.8% retracement of the last `lookback` bars'
+    swing (close crosses back above it while RSI is not overbought); exit
+    when the close breaks below the 78.6% level.
+    """
+
+    name = "Fibonacci"
+
+    def __init__(self, lookback: int = 50, rsi_length: int = 14, rsi_max: float = 60.0) -> None:
+        self.lookback = lookback
+        self.rsi_length = rsi_length
+        self.rsi_max = rsi_max
+        self.warmup = max(lookback, rsi_length) + 1
+
+    def signals(self, frame: IndicatorFrame) -> tuple[np.ndarray, np.ndarray]:
+        levels = frame.fib(self.lookback, (0.618, 0.786))
+        rsi = frame.rsi(self.rsi_length)
+        with np.errstate(invalid="ignore"):
+            entry = _cross_up(frame.c, levels[0.618]) & (rsi < self.rsi_max)
+            exit_ = _cross_down(frame.c, levels[0.786])
+        return entry, exit_
+
+
+STRATEGIES: dict[str, Strategy] = {s.name.lower(): s for s in (FibonacciStrategy(),)}
+
+
+def get_strategy(name: str) -> Optional[Strategy]:
+    """Registered strategy for a `Runner.strategy` value (case-insensitive)."""
+    return STRATEGIES.get((name or "").strip().lower())
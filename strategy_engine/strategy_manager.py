@@ -1,9 +1,228 @@
+import logging
 import time
-from ib_insync import IB, Stock, MarketOrder
-from database.db_core import SessionLocal
-from sqlalchemy.orm import Session
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+from database.db_manager import DBManager
+from database.models import Runner
+from ib_manager.bar_aggregator import bucket_bounds
+from ib_manager.market_data_manager import MarketDataManager
+from strategy_engine.indicators import IndicatorFrame
+from strategy_engine.strategies import get_strategy
+
+logger = logging.getLogger(__name__)
+
+HISTORY_BARS = 300
+
+
+@dataclass(frozen=True)
+class OrderIntent:
+    """An order a runner wants placed; executed by the scheduler per user."""
+
+    user_id: int
+    runner_id: int
+    symbol: str
+    action: str               # BUY | SELL
+    quantity: float
+    limit_price: float
+    reason: str
+
+
+@dataclass(frozen=True)
+class RunnerPosition:
+    quantity: float = 0.0
+    avg_price: float = 0.0
+    pending_orders: int = 0
+
+
+# ───────────────────── bars ─────────────────────
+def resolution_for(time_frame: int) -> tuple[str, int]:
+    """Runner time frame (minutes) → (Finnhub resolution, bars to aggregate)."""
+    if time_frame % 1440 == 0:
+        return "D", time_frame // 1440
+    for minutes in (60, 30, 15, 5, 1):
+        if time_frame % minutes == 0:
+            return str(minutes), time_frame // minutes
+    raise ValueError(f"Unsupported time frame: {time_frame}")
+
+
+def resample(bars: dict, seconds: int) -> dict[str, np.ndarray]:
+    """Aggregate OHLCV columns into `seconds`-long, epoch-aligned buckets."""
+    t = np.asarray(bars["t"], dtype=np.int64)
+    if len(t) == 0:
+        return {k: np.asarray(bars[k]) for k in ("t", "o", "h", "l", "c", "v")}
+    bucket = t // seconds
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(t)] - 1
+    return {
+        "t": bucket[starts] * seconds,
+        "o": np.asarray(bars["o"])[starts],
+        "h": np.maximum.reduceat(np.asarray(bars["h"]), starts),
+        "l": np.minimum.reduceat(np.asarray(bars["l"]), starts),
+        "c": np.asarray(bars["c"])[ends],
+        "v": np.add.reduceat(np.asarray(bars["v"]), starts),
+    }
+
+
+def closed_bars(bars: dict, time_frame: int, now: float) -> dict[str, np.ndarray]:
+    """`bars` without a last bar that is still forming at `now`."""
+    t = np.asarray(bars["t"])
+    n = len(t)
+    if n and bucket_bounds(int(t[-1]), time_frame)[1] > now:
+        n -= 1
+    return {k: np.asarray(bars[k])[:n] for k in ("t", "o", "h", "l", "c", "v")}
+
+
+def _epoch(ts: Optional[datetime], default: float) -> float:
+    if ts is None:
+        return default
+    if ts.tzinfo is None:                 # stored naive → UTC
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
 
 class StrategyManager:
-    def should_make_the_order():
-        return True
+    """
+    Evaluates every active runner in one pass.
+
+    Runners are grouped by (stock, time_frame); each group loads its bars and
+    computes each indicator once (see `IndicatorFrame`), every distinct
+    strategy in the group derives its signal once, and the per-runner rules
+    (trading window, stop loss, take profit, expiry, strategy exit, sizing)
+    are evaluated as NumPy array operations over the group's runners. The
+    cost therefore scales with distinct symbols, not with runners.
+    """
+
+    def __init__(self, market_data: Optional[MarketDataManager] = None, *, history_bars: int = HISTORY_BARS) -> None:
+        self.market_data = market_data or MarketDataManager()
+        self.history_bars = history_bars
+
+    # ───────────────────── data ─────────────────────
+    def load_frame(self, symbol: str, time_frame: int, *, now: Optional[float] = None) -> Optional[IndicatorFrame]:
+        """
+        Closed bars up to `now`. The bar store also returns the bar still
+        forming, which a timer firing just past a boundary would otherwise
+        take for the one that closed.
+        """
+        now = time.time() if now is None else now
+        resolution, factor = resolution_for(time_frame)
+        candles = self.market_data.get_historical_candles(
+            symbol, resolution=resolution, count=self.history_bars * factor
+        )
+        if not candles:
+            return None
+        bars = resample(candles, time_frame * 60) if factor > 1 else candles
+        return IndicatorFrame(closed_bars(bars, time_frame, now))
+
+    def evaluate_active(self, *, exclude: Iterable[tuple[str, int]] = ()) -> list[OrderIntent]:
+        """Evaluate all active runners of all users against fresh bars.
+
+        Groups in `exclude` (already evaluated on live bar close) are skipped.
+        """
+        exclude = set(exclude)
+        with DBManager() as db:
+            runners = [r for r in db.get_all_active_runners()
+                       if (r.stock.upper(), r.time_frame) not in exclude]
+            positions = {
+                rid: RunnerPosition(**p)
+                for rid, p in db.get_runner_positions(runner_ids=[r.id for r in runners]).items()
+            }
+        return self.evaluate(runners, positions=positions)
+
+    # ───────────────────── evaluation ─────────────────────
+    def evaluate(
+        self,
+        runners: Sequence[Runner],
+        *,
+        positions: dict[int, RunnerPosition],
+        frames: Optional[dict[tuple[str, int], IndicatorFrame]] = None,
+        now: Optional[float] = None,
+    ) -> list[OrderIntent]:
+        now = time.time() if now is None else now
+        frames = {} if frames is None else frames
+
+        groups: dict[tuple[str, int], list[Runner]] = defaultdict(list)
+        for r in runners:
+            groups[(r.stock.upper(), r.time_frame)].append(r)
+
+        intents: list[OrderIntent] = []
+        started = time.perf_counter()
+        for key, group in groups.items():
+            frame = frames.get(key)
+            if frame is None:
+                frame = frames[key] = self.load_frame(*key, now=now)
+            if frame is None or len(frame) == 0:
+                logger.warning("No bars for %s [%s min] – skipping %d runner(s)", key[0], key[1], len(group))
+                continue
+            intents.extend(self._evaluate_group(key[0], frame, group, positions, now))
+
+        logger.info("Evaluated %d runner(s) in %d group(s) in %.1f ms → %d intent(s)",
+                    len(runners), len(groups), (time.perf_counter() - started) * 1e3, len(intents))
+        return intents
+
+    def _evaluate_group(
+        self,
+        symbol: str,
+        frame: IndicatorFrame,
+        runners: Iterable[Runner],
+        positions: dict[int, RunnerPosition],
+        now: float,
+    ) -> list[OrderIntent]:
+        runners = list(runners)
+
+        # latest entry / exit signal per distinct strategy in the group
+        latest: dict[str, tuple[bool, bool]] = {}
+        for name in {r.strategy for r in runners}:
+            strategy = get_strategy(name)
+            if strategy is None:
+                logger.warning("Unknown strategy %r – runners using it are skipped", name)
+                latest[name] = (False, False)
+            elif len(frame) < strategy.warmup:
+                latest[name] = (False, False)
+            else:
+                entry, exit_ = strategy.signals(frame)
+                latest[name] = (bool(entry[-1]), bool(exit_[-1]))
+
+        price = float(frame.c[-1])
+        pos = [positions.get(r.id, RunnerPosition()) for r in runners]
+
+        entry_sig = np.array([latest[r.strategy][0] for r in runners])
+        exit_sig = np.array([latest[r.strategy][1] for r in runners])
+        budget = np.array([r.budget for r in runners], dtype=np.float64)
+        stop_pct = np.abs(np.array([r.stop_loss for r in runners], dtype=np.float64))
+        take_pct = np.array([r.take_profit for r in runners], dtype=np.float64)
+        start_ts = np.array([_epoch(r.time_range_from, -np.inf) for r in runners])
+        end_ts = np.array([_epoch(r.time_range_to, np.inf) for r in runners])
+        exits_on_expiry = np.array(["expired date" in (r.exit_strategy or "") for r in runners])
+        exits_on_signal = np.array(["strategy" in (r.exit_strategy or "") for r in runners])
+        held = np.array([p.quantity for p in pos], dtype=np.float64)
+        avg = np.array([p.avg_price for p in pos], dtype=np.float64)
+        pending = np.array([p.pending_orders > 0 for p in pos])
+
+        holding = held > 0
+        in_window = (start_ts <= now) & (now <= end_ts)
+        qty = np.floor(budget / price)
+
+        enter = ~holding & ~pending & in_window & entry_sig & (qty >= 1)
+        stop_hit = holding & (price <= avg * (1 - stop_pct / 100))
+        take_hit = holding & (price >= avg * (1 + take_pct / 100))
+        expired = holding & exits_on_expiry & (now > end_ts)
+        signal_exit = holding & exits_on_signal & exit_sig
+        leave = ~pending & (stop_hit | take_hit | expired | signal_exit)
 
+        intents = []
+        for i in np.flatnonzero(enter):
+            r = runners[i]
+            intents.append(OrderIntent(r.user_id, r.id, symbol, "BUY", float(qty[i]),
+                                       round(price, 2), f"entry:{r.strategy}"))
+        for i in np.flatnonzero(leave):
+            r = runners[i]
+            reason = ("stop_loss" if stop_hit[i] else "take_profit" if take_hit[i]
+                      else "expired" if expired[i] else f"exit:{r.strategy}")
+            intents.append(OrderIntent(r.user_id, r.id, symbol, "SELL", float(held[i]),
+                                       round(price, 2), reason))
+        return intents
@@ -0,0 +1,470 @@
+"""
+Incremental indicators: O(1) work and no allocation per new bar.
+
+Each indicator is a `__slots__` object fed one bar at a time through
+`update(...)`, which returns the current value (NaN until warmed up, like
+the batch versions in `strategy_engine.indicators`). Windowed indicators
+(SMA, Bollinger) keep their window in a fixed-size NumPy ring buffer;
+recursive ones (EMA, RSI, ATR, MACD) only need the previous state. The
+definitions are pandas_ta's; see `strategy_engine.indicators`.
+`StreamingFrame` puts them behind the `IndicatorFrame` interface for the
+live bar feed: appending a closed bar costs O(1) per indicator in use.
+
+    python -m strategy_engine.streaming_indicators    # verify + benchmark
+"""
+from __future__ import annotations
+
+import math
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+import numpy as np
+import pytz
+
+NAN = math.nan
+EASTERN = pytz.timezone("US/Eastern")
+RESYNC_EVERY = 4096          # recompute running sums from the ring to shed float drift
+
+
+class RingBuffer:
+    """Fixed-size window over the last `size` values."""
+
+    __slots__ = ("buf", "size", "pos", "count")
+
+    def __init__(self, size: int) -> None:
+        self.buf = np.zeros(size, dtype=np.float64)
+        self.size = size
+        self.pos = 0
+        self.count = 0
+
+    @property
+    def full(self) -> bool:
+        return self.count == self.size
+
+    def push(self, x: float) -> float:
+        """Store `x`; return the value it evicted (0.0 while filling)."""
+        old = float(self.buf[self.pos]) if self.count == self.size else 0.0
+        self.buf[self.pos] = x
+        self.pos = (self.pos + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+        return old
+
+    def values(self) -> np.ndarray:
+        """Window contents, oldest first (allocates; not for the hot path)."""
+        if self.count < self.size:
+            return self.buf[: self.count].copy()
+        return np.roll(self.buf, -self.pos)
+
+
+class SMA:
+    __slots__ = ("length", "ring", "total", "value", "_since_resync")
+
+    def __init__(self, length: int) -> None:
+        self.length = length
+        self.ring = RingBuffer(length)
+        self.total = 0.0
+        self.value = NAN
+        self._since_resync = 0
+
+    def update(self, x: float) -> float:
+        self.total += x - self.ring.push(x)
+        self._since_resync += 1
+        if self._since_resync >= RESYNC_EVERY:
+            self.total = float(self.ring.buf.sum())
+            self._since_resync = 0
+        self.value = self.total / self.length if self.ring.full else NAN
+        return self.value
+
+
+class EMA:
+    """`ewm(span=length, adjust=False)` seeded with the SMA of the first `length` values."""
+
+    __slots__ = ("length", "alpha", "count", "state", "value")
+
+    def __init__(self, length: int) -> None:
+        self.length = length
+        self.alpha = 2.0 / (length + 1)
+        self.count = 0
+        self.state = 0.0
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        self.count += 1
+        if self.count < self.length:
+            self.state += x
+            return self.value
+        if self.count == self.length:
+            self.state = (self.state + x) / self.length
+        else:
+            self.state += self.alpha * (x - self.state)
+        self.value = self.state
+        return self.value
+
+
+class RMA:
+    """Wilder smoothing, `ewm(alpha=1/length, adjust=True)`: a decaying weighted mean."""
+
+    __slots__ = ("length", "decay", "count", "num", "den", "value")
+
+    def __init__(self, length: int) -> None:
+        self.length = length
+        self.decay = 1.0 - 1.0 / length
+        self.count = 0
+        self.num = 0.0
+        self.den = 0.0
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        self.count += 1
+        self.num = x + self.decay * self.num
+        self.den = 1.0 + self.decay * self.den
+        self.value = self.num / self.den if self.count >= self.length else NAN
+        return self.value
+
+
+class RSI:
+    """Wilder RSI over close-to-close changes; the first bar has none."""
+
+    __slots__ = ("length", "prev", "gain", "loss", "value")
+
+    def __init__(self, length: int = 14) -> None:
+        self.length = length
+        self.prev = NAN
+        self.gain = RMA(length)
+        self.loss = RMA(length)
+        self.value = NAN
+
+    def update(self, close: float) -> float:
+        prev, self.prev = self.prev, close
+        if prev != prev:
+            return self.value
+        delta = close - prev
+        g = self.gain.update(delta if delta > 0 else 0.0)
+        l = self.loss.update(-delta if delta < 0 else 0.0)
+        self.value = 100.0 * g / (g + l) if g + l > 0 else NAN
+        return self.value
+
+
+class ATR:
+    """Wilder-smoothed true range; the first bar has none."""
+
+    __slots__ = ("prev_close", "smooth", "value")
+
+    def __init__(self, length: int = 14) -> None:
+        self.prev_close = NAN
+        self.smooth = RMA(length)
+        self.value = NAN
+
+    def update(self, high: float, low: float, close: float) -> float:
+        pc, self.prev_close = self.prev_close, close
+        if pc != pc:
+            return self.value
+        self.value = self.smooth.update(max(high - low, abs(high - pc), abs(low - pc)))
+        return self.value
+
+
+class MACD:
+    """MACD line, signal and histogram; the signal starts at the first defined line value."""
+
+    __slots__ = ("fast", "slow", "signal_ema", "line", "signal", "hist")
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9) -> None:
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+        self.signal_ema = EMA(signal)
+        self.line = self.signal = self.hist = NAN
+
+    def update(self, close: float) -> tuple[float, float, float]:
+        self.line = self.fast.update(close) - self.slow.update(close)
+        if self.line == self.line:
+            self.signal = self.signal_ema.update(self.line)
+            self.hist = self.line - self.signal
+        return self.line, self.signal, self.hist
+
+
+class Bollinger:
+    """Bands at `mult` population standard deviations around the SMA (windowed Welford)."""
+
+    __slots__ = ("length", "mult", "ring", "mean", "m2", "lower", "mid", "upper")
+
+    def __init__(self, length: int = 20, mult: float = 2.0) -> None:
+        self.length = length
+        self.mult = mult
+        self.ring = RingBuffer(length)
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.lower = self.mid = self.upper = NAN
+
+    def update(self, x: float) -> tuple[float, float, float]:
+        if not self.ring.full:
+            self.ring.push(x)
+            n = self.ring.count
+            d = x - self.mean
+            self.mean += d / n
+            self.m2 += d * (x - self.mean)
+        else:
+            old = self.ring.push(x)
+            prev_mean = self.mean
+            self.mean += (x - old) / self.length
+            self.m2 += (x - old) * (x - self.mean + old - prev_mean)
+        if not self.ring.full:
+            return self.lower, self.mid, self.upper
+        dev = self.mult * math.sqrt(max(self.m2, 0.0) / self.length)
+        self.lower, self.mid, self.upper = self.mean - dev, self.mean, self.mean + dev
+        return self.lower, self.mid, self.upper
+
+
+class RollingMax:
+    """Max of the last `length` values (monotonic deque, amortised O(1))."""
+
+    __slots__ = ("length", "count", "window", "value")
+
+    def __init__(self, length: int) -> None:
+        self.length = length
+        self.count = 0
+        self.window: deque[tuple[int, float]] = deque()
+        self.value = NAN
+
+    def _better(self, a: float, b: float) -> bool:
+        return a >= b
+
+    def update(self, x: float) -> float:
+        i = self.count
+        self.count += 1
+        while self.window and self._better(x, self.window[-1][1]):
+            self.window.pop()
+        self.window.append((i, x))
+        if self.window[0][0] <= i - self.length:
+            self.window.popleft()
+        self.value = self.window[0][1] if self.count >= self.length else NAN
+        return self.value
+
+
+class RollingMin(RollingMax):
+    """Min of the last `length` values."""
+
+    __slots__ = ()
+
+    def _better(self, a: float, b: float) -> bool:
+        return a <= b
+
+
+class VWAP:
+    """Typical-price VWAP that resets at each US/Eastern midnight."""
+
+    __slots__ = ("day_end", "pv", "vol", "value")
+
+    def __init__(self) -> None:
+        self.day_end = -1
+        self.pv = 0.0
+        self.vol = 0.0
+        self.value = NAN
+
+    @staticmethod
+    def _next_midnight(t: int) -> int:
+        local = datetime.fromtimestamp(t, timezone.utc).astimezone(EASTERN)
+        midnight = EASTERN.localize(datetime.combine(local.date() + timedelta(days=1), datetime.min.time()))
+        return int(midnight.timestamp())
+
+    def update(self, t: int, high: float, low: float, close: float, volume: float) -> float:
+        if t >= self.day_end:                 # once per day
+            self.day_end = self._next_midnight(t)
+            self.pv = self.vol = 0.0
+        self.pv += (high + low + close) / 3.0 * volume
+        self.vol += volume
+        self.value = self.pv / self.vol if self.vol else NAN
+        return self.value
+
+
+class StreamingFrame:
+    """
+    `IndicatorFrame` that grows one closed bar at a time.
+
+    Bars and every indicator series asked for so far live in preallocated
+    columns of twice `keep` rows; `append` writes one row and feeds each
+    indicator once. When the columns fill up the last `keep` rows are moved
+    to the front, so a bar costs O(1) amortised instead of a frame copy plus
+    a recompute. An indicator requested for the first time is replayed over
+    the stored bars once. Series are read-only views of the last `keep` bars.
+    """
+
+    COLUMNS = ("t", "o", "h", "l", "c", "v")
+
+    def __init__(self, bars: dict[str, np.ndarray], *, keep: int) -> None:
+        n = len(bars["c"])
+        self.keep = keep
+        self._cap = max(2 * keep, n + keep)
+        self._cols = {c: np.empty(self._cap, dtype=np.int64 if c == "t" else np.float64) for c in self.COLUMNS}
+        for c in self.COLUMNS:
+            self._cols[c][:n] = bars[c]
+        self._n = n
+        # key → (update(row) -> outputs, output columns)
+        self._series: dict[tuple, tuple[Callable[[int], tuple], list[np.ndarray]]] = {}
+
+    @classmethod
+    def from_frame(cls, frame, *, keep: int) -> "StreamingFrame":
+        return cls({c: getattr(frame, c) for c in cls.COLUMNS}, keep=keep)
+
+    # ───────────────────── bars ─────────────────────
+    def __len__(self) -> int:
+        return min(self._n, self.keep)
+
+    def _view(self, col: np.ndarray) -> np.ndarray:
+        view = col[max(0, self._n - self.keep): self._n]
+        view.flags.writeable = False
+        return view
+
+    t = property(lambda self: self._view(self._cols["t"]))
+    o = property(lambda self: self._view(self._cols["o"]))
+    h = property(lambda self: self._view(self._cols["h"]))
+    l = property(lambda self: self._view(self._cols["l"]))
+    c = property(lambda self: self._view(self._cols["c"]))
+    v = property(lambda self: self._view(self._cols["v"]))
+
+    def append(self, t: int, o: float, h: float, l: float, c: float, v: float) -> bool:
+        """Add the bar starting at `t`; False (ignored) if it is not newer than the last one."""
+        if self._n and t <= self._cols["t"][self._n - 1]:
+            return False
+        if self._n == self._cap:
+            self._compact()
+        i = self._n
+        for col, x in zip(self.COLUMNS, (t, o, h, l, c, v)):
+            self._cols[col][i] = x
+        self._n += 1
+        for update, outs in self._series.values():
+            for out, x in zip(outs, update(i)):
+                out[i] = x
+        return True
+
+    def _compact(self) -> None:
+        lo = self._n - self.keep
+        for col in [*self._cols.values(), *(o for _, outs in self._series.values() for o in outs)]:
+            col[: self.keep] = col[lo: self._n]
+        self._n = self.keep
+
+    # ───────────────────── indicators ─────────────────────
+    def _get(self, key: tuple, make: Callable[[], Callable[[int], tuple]], width: int = 1) -> list[np.ndarray]:
+        series = self._series.get(key)
+        if series is None:
+            update = make()
+            outs = [np.empty(self._cap, dtype=np.float64) for _ in range(width)]
+            for i in range(self._n):                  # replay the stored bars once
+                for out, x in zip(outs, update(i)):
+                    out[i] = x
+            series = self._series[key] = (update, outs)
+        return [self._view(out) for out in series[1]]
+
+    def _of_close(self, key: tuple, make_indicator) -> np.ndarray:
+        close = self._cols["c"]                       # never reallocated, only compacted
+
+        def make():
+            ind = make_indicator()
+            return lambda i: (ind.update(close[i]),)
+        return self._get(key, make)[0]
+
+    def ema(self, length: int) -> np.ndarray:
+        return self._of_close(("ema", length), lambda: EMA(length))
+
+    def sma(self, length: int) -> np.ndarray:
+        return self._of_close(("sma", length), lambda: SMA(length))
+
+    def rsi(self, length: int = 14) -> np.ndarray:
+        return self._of_close(("rsi", length), lambda: RSI(length))
+
+    def atr(self, length: int = 14) -> np.ndarray:
+        c = self._cols
+
+        def make():
+            ind = ATR(length)
+            return lambda i: (ind.update(c["h"][i], c["l"][i], c["c"][i]),)
+        return self._get(("atr", length), make)[0]
+
+    def fib(self, length: int, ratios: tuple[float, ...]) -> dict[float, np.ndarray]:
+        c = self._cols
+
+        def make():
+            hi, lo = RollingMax(length), RollingMin(length)
+
+            def update(i: int) -> tuple:
+                top, bottom = hi.update(c["h"][i]), lo.update(c["l"][i])
+                return tuple(top - r * (top - bottom) for r in ratios)
+            return update
+
+        return dict(zip(ratios, self._get(("fib", length, ratios), make, width=len(ratios))))
+
+
+if __name__ == "__main__":
+    # Check every indicator against its batch counterpart, then time updates.
+    import timeit
+
+    from strategy_engine import indicators as batch
+
+    rng = np.random.default_rng(7)
+    n = 5_000
+    t = 1_700_000_000 + np.arange(n) * 300
+    c = 100 + np.cumsum(rng.normal(0, 0.5, n))
+    h = c + rng.uniform(0, 1, n)
+    l = c - rng.uniform(0, 1, n)
+    v = rng.uniform(1e3, 1e5, n)
+
+    def run(ind, *cols):
+        return np.array([ind.update(*row) for row in zip(*cols)], dtype=np.float64)
+
+    checks = {
+        "SMA(20)": (run(SMA(20), c), batch.sma(c, 20)),
+        "EMA(20)": (run(EMA(20), c), batch.ema(c, 20)),
+        "RSI(14)": (run(RSI(14), c), batch.rsi(c, 14)),
+        "ATR(14)": (run(ATR(14), h, l, c), batch.atr(h, l, c, 14)),
+        "MACD": (run(MACD(), c), np.column_stack(batch.macd(c))),
+        "Bollinger": (run(Bollinger(), c), np.column_stack(batch.bollinger(c))),
+        "VWAP": (run(VWAP(), t, h, l, c, v), batch.vwap(t, h, l, c, v)),
+        "Max(50)": (run(RollingMax(50), h), batch.rolling_max(h, 50)),
+        "Min(50)": (run(RollingMin(50), l), batch.rolling_min(l, 50)),
+    }
+    for name, (got, want) in checks.items():
+        ok = np.allclose(got, want, rtol=1e-9, atol=1e-9, equal_nan=True)
+        print(f"{name:10s} matches batch: {ok}")
+        assert ok, name
+
+    try:
+        import pandas as pd
+        np.NaN = np.nan                         # pandas_ta 0.3.14b0 imports it; NumPy 2 removed it
+        import pandas_ta as ta
+    except ImportError as e:
+        print(f"pandas_ta unavailable ({e}); compared with strategy_engine.indicators only")
+    else:
+        cs, hs, ls = pd.Series(c), pd.Series(h), pd.Series(l)
+        bb = ta.bbands(cs, length=20, std=2.0)
+        md = ta.macd(cs)
+        reference = {
+            "SMA(20)": ta.sma(cs, length=20),
+            "EMA(20)": ta.ema(cs, length=20),
+            "RSI(14)": ta.rsi(cs, length=14),
+            "ATR(14)": ta.atr(hs, ls, cs, length=14),
+            "MACD": md[["MACD_12_26_9", "MACDs_12_26_9", "MACDh_12_26_9"]],
+            "Bollinger": bb[["BBL_20_2.0", "BBM_20_2.0", "BBU_20_2.0"]],
+        }
+        for name, ref in reference.items():
+            ok = np.allclose(checks[name][0], ref.to_numpy(), rtol=1e-7, atol=1e-7, equal_nan=True)
+            print(f"{name:10s} matches pandas_ta: {ok}")
+            assert ok, name
+
+    print("\nper-update cost (µs) vs batch recompute over 300 bars (ms):")
+    window = 300
+    cases = [
+        ("SMA(20)", SMA(20), lambda i: (c[i],), lambda: batch.sma(c[:window], 20)),
+        ("EMA(20)", EMA(20), lambda i: (c[i],), lambda: batch.ema(c[:window], 20)),
+        ("RSI(14)", RSI(14), lambda i: (c[i],), lambda: batch.rsi(c[:window], 14)),
+        ("ATR(14)", ATR(14), lambda i: (h[i], l[i], c[i]), lambda: batch.atr(h[:window], l[:window], c[:window], 14)),
+        ("MACD", MACD(), lambda i: (c[i],), lambda: batch.macd(c[:window])),
+        ("Bollinger", Bollinger(), lambda i: (c[i],), lambda: batch.bollinger(c[:window])),
+        ("VWAP", VWAP(), lambda i: (int(t[i]), h[i], l[i], c[i], v[i]),
+         lambda: batch.vwap(t[:window], h[:window], l[:window], c[:window], v[:window])),
+    ]
+    for name, ind, args, recompute in cases:
+        rows = [tuple(float(x) if not isinstance(x, int) else x for x in args(i)) for i in range(n)]
+        per_update = timeit.timeit(lambda: [ind.update(*r) for r in rows], number=5) / (5 * n)
+        full = timeit.timeit(recompute, number=20) / 20
+        print(f"{name:10s} {per_update * 1e6:7.2f} µs/update   batch {full * 1e3:6.2f} ms")
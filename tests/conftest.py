@@ -0,0 +1,37 @@
+import os
+import tempfile
+
+# modules read these at import time; no test talks to a real server
+os.environ.setdefault("DATABASE_URL_DOCKER", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'ibkr-tests.db')}")
+os.environ.setdefault("CONTAINER_PORT", "4004")
+os.environ.setdefault("HOST_PORT", "4004")
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database.db_manager import DBManager
+from database.models import Base, User
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)() as s:
+        yield s
+    engine.dispose()
+
+
+@pytest.fixture
+def db(session: Session) -> DBManager:
+    return DBManager(session)
+
+
+@pytest.fixture
+def users(session: Session) -> list[User]:
+    rows = [User(id=i, username=f"user{i}", email=f"user{i}@example.com", hashed_password="x") for i in (1, 2, 3)]
+    session.add_all(rows)
+    session.commit()
+    return rows
@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from database import async_db_core
+from database.async_db_core import async_url
+from database.async_db_manager import AsyncDBManager
+from database.models import Base
+
+
+def test_async_url_swaps_the_driver():
+    pg = async_url("postgresql+psycopg2://u:p@db:5432/ibkr")
+    assert pg.drivername == "postgresql+asyncpg"
+    assert pg.query["prepared_statement_cache_size"] == str(async_db_core.DB_STATEMENT_CACHE_SIZE)
+    assert async_url("sqlite:///local.db").drivername == "sqlite+aiosqlite"
+    assert async_url("mysql+aiomysql://u@db/ibkr").drivername == "mysql+aiomysql"
+
+
+@pytest.fixture
+def fresh_engine(monkeypatch):
+    monkeypatch.setattr(async_db_core, "_async_engine", None)
+    monkeypatch.setattr(async_db_core, "_async_sessions", None)
+    yield
+    if async_db_core._async_engine is not None:
+        asyncio.run(async_db_core._async_engine.dispose())
+
+
+def test_sqlite_runs_on_aiosqlite(fresh_engine):
+    async def main():
+        engine = async_db_core.get_async_engine()
+        assert engine.url.drivername == "sqlite+aiosqlite"
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with AsyncDBManager() as db:
+            assert list(await db.get_all_order_rows(user_id=-1)) == []
+
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+from datetime import datetime
+
+import pytest
+from eventkit import Event
+
+from ib_manager import bar_aggregator
+from ib_manager.bar_aggregator import BarAggregator, bucket_bounds
+from ib_manager.session_calendar import EASTERN
+
+
+def et(*args) -> int:
+    return int(EASTERN.localize(datetime(*args)).timestamp())
+
+
+# ───────────────────── bucket bounds ─────────────────────
+def test_intraday_bars_are_epoch_aligned():
+    t = et(2024, 6, 12, 10, 7, 30)
+    assert bucket_bounds(t, 5) == (et(2024, 6, 12, 10, 5), et(2024, 6, 12, 10, 10))
+    assert bucket_bounds(et(2024, 6, 12, 10, 5), 5)[0] == et(2024, 6, 12, 10, 5)     # start is inclusive
+    assert bucket_bounds(t, 60) == (et(2024, 6, 12, 10), et(2024, 6, 12, 11))
+
+
+@pytest.mark.parametrize("day, hours", [
+    ((2024, 6, 12), 24),
+    ((2024, 3, 10), 23),            # clocks go forward
+    ((2024, 11, 3), 25),            # clocks go back
+])
+def test_daily_bars_run_from_eastern_midnight_to_midnight(day, hours):
+    start, end = bucket_bounds(et(*day, 12), 1440)
+    assert start == et(*day)
+    assert end - start == hours * 3600
+
+
+def test_a_daily_bar_covers_late_evening_and_not_the_next_day():
+    assert bucket_bounds(et(2024, 3, 10, 23, 59), 1440)[0] == et(2024, 3, 10)
+    assert bucket_bounds(et(2024, 3, 11, 0, 0), 1440)[0] == et(2024, 3, 11)
+
+
+def test_multi_day_bars_tile_the_calendar():
+    first = bucket_bounds(et(2024, 3, 9, 12), 2 * 1440)
+    following = bucket_bounds(first[1], 2 * 1440)
+    assert following[0] == first[1]
+    assert datetime.fromtimestamp(following[0], EASTERN).hour == 0
+
+
+# ───────────────────── aggregation ─────────────────────
+class FakeIB:
+    def __init__(self) -> None:
+        self.connectedEvent = Event()
+        self.requests = []
+
+    def reqRealTimeBars(self, contract, size, what, rth):
+        bars = type("Bars", (list,), {})()
+        bars.updateEvent = Event()
+        self.requests.append(contract.symbol)
+        return bars
+
+    def cancelRealTimeBars(self, bars):
+        pass
+
+
+@pytest.fixture
+def aggregator(monkeypatch):
+    monkeypatch.setattr(bar_aggregator.contract_cache, "get", lambda key: None)
+    agg = BarAggregator(FakeIB())
+    closed = []
+    agg.closedBarEvent += closed.append
+    agg.subscribe("aapl", {1, 5})
+    return agg, closed
+
+
+def test_five_second_bars_roll_up(aggregator):
+    agg, closed = aggregator
+    start = et(2024, 6, 12, 10, 0)
+    for i in range(60):                                 # 10:00:00 … 10:04:55
+        price = 100 + i % 7
+        agg.update("AAPL", start + 5 * i, price, price + 1, price - 1, price, 10)
+
+    ones = [b for b in closed if b.time_frame == 1]
+    [five] = [b for b in closed if b.time_frame == 5]
+    assert [b.t for b in ones] == [start + 60 * m for m in range(5)]
+    assert (five.t, five.o, five.h, five.l, five.c, five.v) == (start, 100, 107, 99, 100 + 59 % 7, 600)
+
+
+def test_a_gap_closes_the_bar_on_the_next_update(aggregator):
+    agg, closed = aggregator
+    start = et(2024, 6, 12, 10, 0)
+    agg.update("AAPL", start, 1, 1, 1, 1, 1)
+    assert closed == []
+    agg.update("AAPL", start + 600, 2, 2, 2, 2, 1)      # nothing for 10 minutes
+    assert sorted((b.time_frame, b.t) for b in closed) == [(1, start), (5, start)]
+
+
+def test_reconnect_requests_again_and_drops_old_handlers(aggregator):
+    agg, _ = aggregator
+    old = agg._subs["AAPL"]
+    agg.ib.connectedEvent.emit()
+    assert agg.ib.requests == ["AAPL", "AAPL"]
+    assert len(old.updateEvent) == 0 and len(agg._subs["AAPL"].updateEvent) == 1
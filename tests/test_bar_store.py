@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from ib_manager import bar_store as bar_store_module
+from ib_manager.bar_store import BarStore
+
+T0 = 1_718_200_800                      # a minute boundary, long closed
+
+
+class Feed:
+    """Minute bars for any range; `price` marks which fetch produced a bar."""
+
+    def __init__(self) -> None:
+        self.calls: list[tuple[int, int]] = []
+        self.price = 1.0
+        self.fail = False
+
+    def __call__(self, symbol, resolution, start, end):
+        self.calls.append((start, end))
+        if self.fail:
+            return None
+        t = np.arange(-(-start // 60) * 60, end + 1, 60)
+        p = np.full(len(t), self.price)
+        return {"t": t, "o": p, "h": p, "l": p, "c": p, "v": np.ones(len(t))}
+
+
+@pytest.fixture
+def store(tmp_path) -> BarStore:
+    return BarStore(tmp_path)
+
+
+def test_only_missing_ranges_are_fetched(store):
+    feed = Feed()
+    bars = store.get("aapl", "1", T0, T0 + 600, feed)
+    assert list(bars["t"]) == list(range(T0, T0 + 601, 60))
+    assert store.get("AAPL", "1", T0 + 60, T0 + 300, feed)["t"][0] == T0 + 60
+    assert len(feed.calls) == 1
+
+    feed.calls.clear()
+    bars = store.get("AAPL", "1", T0 - 600, T0 + 1200, feed)
+    assert len(bars["t"]) == 31
+    # the two gaps, each widened by a bar so the edges overlap
+    assert feed.calls == [(T0 - 600, T0), (T0 + 540, T0 + 1200)]
+
+
+def test_stored_bars_survive_a_new_process(store, tmp_path):
+    feed = Feed()
+    store.get("AAPL", "1", T0, T0 + 600, feed)
+    again = BarStore(tmp_path).get("AAPL", "1", T0, T0 + 600, feed)
+    assert len(again["t"]) == 11 and len(feed.calls) == 1
+
+
+def test_a_merge_leaves_earlier_slices_alone(store, tmp_path):
+    feed = Feed()
+    old = store.get("AAPL", "1", T0, T0 + 600, feed)
+    feed.price = 2.0
+    new = store.get("AAPL", "1", T0 - 600, T0 + 600, feed)
+
+    assert set(old["c"]) == {1.0} and len(old["t"]) == 11       # still the first generation
+    assert not old["c"].flags.writeable
+    assert new["c"][0] == 2.0 and new["c"][-1] == 1.0
+    # the overlapping edge bar was fetched again: newer data wins
+    assert new["c"][list(new["t"]).index(T0)] == 2.0
+    # only the current generation is left on disk
+    files = sorted(f.name for f in (tmp_path / "AAPL" / "1").iterdir())
+    assert files == ["c.2.npy", "h.2.npy", "l.2.npy", "meta.json", "o.2.npy", "t.2.npy", "v.2.npy"]
+
+
+def test_a_failed_fetch_stores_nothing(store):
+    feed = Feed()
+    feed.fail = True
+    assert store.get("AAPL", "1", T0, T0 + 600, feed) is None
+    feed.fail = False
+    assert len(store.get("AAPL", "1", T0, T0 + 600, feed)["t"]) == 11
+    assert len(feed.calls) == 2
+
+
+def test_the_forming_bar_is_fetched_again_once_closed(store, monkeypatch):
+    now = [T0 + 630]                                                    # minute T0+600 is forming
+    monkeypatch.setattr(bar_store_module.time, "time", lambda: now[0])
+    feed = Feed()
+    store.get("AAPL", "1", T0, now[0], feed)
+    feed.price = 2.0
+    now[0] += 60
+    bars = store.get("AAPL", "1", T0, now[0], feed)
+    assert feed.calls[1] == (T0 + 540, T0 + 690)
+    assert bars["c"][list(bars["t"]).index(T0 + 600)] == 2.0
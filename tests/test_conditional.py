@@ -0,0 +1,96 @@
+import asyncio
+import inspect
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from api_gateway.routes.runner_routes import _matches, conditional, history_page
+from database import data_versions as dv
+from database.history import DEFAULT_PAGE_SIZE, Cursor
+
+
+def request(path: str = "/api/orders", query: str = "", if_none_match: str | None = None) -> Request:
+    headers = [(b"host", b"test")]
+    if if_none_match is not None:
+        headers.append((b"if-none-match", if_none_match.encode()))
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query.encode(),
+                    "headers": headers, "scheme": "http", "server": ("test", 80)})
+
+
+class Versions:
+    """Stands in for AsyncDBManager: only the version lookup is used."""
+
+    def __init__(self, versions: dict[str, int]) -> None:
+        self.versions = versions
+
+    async def get_data_versions(self, *, user_id: int, resources):
+        return {r: self.versions.get(r, 0) for r in resources}
+
+
+def run(db, req, resources=(dv.ORDERS,)):
+    return asyncio.run(conditional(db, req, user_id=1, resources=resources))
+
+
+def test_etag_changes_with_version_user_and_query():
+    tag = dv.etag(1, {dv.ORDERS: 3}, "/api/orders", "")
+    assert tag.startswith('W/"')
+    assert tag == dv.etag(1, {dv.ORDERS: 3}, "/api/orders", "")
+    assert tag != dv.etag(1, {dv.ORDERS: 4}, "/api/orders", "")
+    assert tag != dv.etag(2, {dv.ORDERS: 3}, "/api/orders", "")
+    assert tag != dv.etag(1, {dv.ORDERS: 3}, "/api/orders", "symbol=AAPL")
+
+
+@pytest.mark.parametrize("header, hit", [
+    (None, False),
+    ('W/"abc"', True),
+    ('"abc"', True),                        # weak comparison
+    ('W/"other", W/"abc"', True),
+    ("*", True),
+    ('W/"abcd"', False),
+])
+def test_matches(header, hit):
+    assert _matches(request(if_none_match=header), 'W/"abc"') is hit
+
+
+def test_conditional_304_until_the_version_moves():
+    db = Versions({dv.ORDERS: 1})
+    headers, unchanged = run(db, request())
+    assert unchanged is None
+    assert headers["Cache-Control"] == "private, no-cache"
+
+    headers2, unchanged = run(db, request(if_none_match=headers["ETag"]))
+    assert unchanged is not None and unchanged.status_code == 304
+    assert headers2["ETag"] == headers["ETag"]
+
+    db.versions[dv.ORDERS] = 2
+    _, unchanged = run(db, request(if_none_match=headers["ETag"]))
+    assert unchanged is None
+
+
+def test_conditional_depends_on_the_query():
+    db = Versions({})
+    headers, _ = run(db, request(query="symbol=AAPL"))
+    _, unchanged = run(db, request(query="symbol=MSFT", if_none_match=headers["ETag"]))
+    assert unchanged is None
+
+
+def page(**kw):
+    args = dict(cursor=None, limit=DEFAULT_PAGE_SIZE, symbol=None, since=None, until=None)
+    return history_page(**{**args, **kw})
+
+
+def test_history_page_limits():
+    # never unbounded: without a limit the query default applies
+    assert inspect.signature(history_page).parameters["limit"].default.default == DEFAULT_PAGE_SIZE
+    assert page(limit=10).limit == 10
+    cursor = Cursor(datetime(2024, 1, 1), 5)
+    p = page(cursor=cursor.encode())
+    assert p.cursor == cursor and p.limit == DEFAULT_PAGE_SIZE
+
+
+def test_history_page_rejects_bad_cursor():
+    with pytest.raises(HTTPException) as e:
+        page(cursor="!!!")
+    assert e.value.status_code == 400
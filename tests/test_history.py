@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from database.history import DEFAULT_PAGE_SIZE, Cursor, HistoryFilter
+from database.models import Order
+
+
+def test_cursor_round_trip():
+    for cursor in (Cursor(datetime(2024, 3, 1, 12, 30, 5, 123456), 42), Cursor(None, 7)):
+        assert Cursor.decode(cursor.encode()) == cursor
+
+
+@pytest.mark.parametrize("token", ["", "!!!", "bm90LWEtY3Vyc29y"])
+def test_cursor_rejects_garbage(token):
+    with pytest.raises(ValueError):
+        Cursor.decode(token)
+
+
+def test_cursor_after():
+    assert Cursor.after([], "created_at") is None
+
+
+@pytest.fixture
+def orders(session, users):
+    base = datetime(2024, 1, 1)
+    rows = []
+    for i in range(1, 26):
+        created = None if i % 10 == 0 else base + timedelta(minutes=i // 2)   # ties and NULLs
+        rows.append(Order(id=i, user_id=1, ibkr_perm_id=1000 + i, symbol="AAPL" if i % 2 else "MSFT",
+                          action="BUY", order_type="LMT", quantity=1, status="Filled", created_at=created))
+    rows.append(Order(id=99, user_id=2, ibkr_perm_id=2000, symbol="AAPL", action="BUY", order_type="LMT",
+                      quantity=1, status="Filled", created_at=base))
+    undated = [o.id for o in rows if o.created_at is None]
+    session.add_all(rows)
+    session.commit()
+    # the column default replaces None on insert
+    session.execute(update(Order).where(Order.id.in_(undated)).values(created_at=None))
+    session.commit()
+    return rows
+
+
+def expected_order(rows):
+    # NULL timestamps first, then newest first; id breaks ties
+    nulls = sorted((o.id for o in rows if o.created_at is None), reverse=True)
+    dated = sorted((o for o in rows if o.created_at is not None), key=lambda o: (o.created_at, o.id), reverse=True)
+    return nulls + [o.id for o in dated]
+
+
+def test_keyset_pages_cover_everything_once(db, orders):
+    mine = [o for o in orders if o.user_id == 1]
+    seen, page = [], HistoryFilter(limit=4)
+    while True:
+        rows = db.get_all_orders(user_id=1, page=page)
+        seen.extend(o.id for o in rows)
+        if len(rows) < page.limit:
+            break
+        page = HistoryFilter(limit=4, cursor=Cursor.after(rows, "created_at"))
+    assert seen == expected_order(mine)
+
+
+def test_bounded_by_default(db, orders):
+    assert HistoryFilter().limit == DEFAULT_PAGE_SIZE
+    rows = db.get_all_orders(user_id=1, page=HistoryFilter(limit=None))
+    assert len(rows) == 25
+    assert rows[0].created_at is None
+
+
+def test_filters(db, orders):
+    rows = db.get_all_orders(user_id=1, page=HistoryFilter(symbol="msft", since=datetime(2024, 1, 1, 0, 5)))
+    assert rows and all(o.symbol == "MSFT" and o.created_at >= datetime(2024, 1, 1, 0, 5) for o in rows)
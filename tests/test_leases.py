@@ -0,0 +1,105 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+from database.models import UserLease
+from runner_scheduler import sharding
+from runner_scheduler.sharding import ShardCoordinator, owner_of
+
+
+def expire(session, user_id: int) -> None:
+    lease = session.get(UserLease, user_id)
+    lease.expires_at -= timedelta(hours=1)
+    session.commit()
+
+
+def test_acquire_free_own_and_expired(db, session, users):
+    assert db.acquire_user_leases(replica_id="a", user_ids=[1, 2], ttl=30) == [1, 2]
+    assert db.acquire_user_leases(replica_id="b", user_ids=[1, 2, 3], ttl=30) == [3]     # 1, 2 held by a
+    assert db.acquire_user_leases(replica_id="a", user_ids=[1], ttl=30) == [1]           # renewal
+
+    expire(session, 2)
+    assert db.acquire_user_leases(replica_id="b", user_ids=[2], ttl=30) == [2]
+    assert session.get(UserLease, 2).replica_id == "b"
+
+
+def test_release_keeps_the_listed(db, session, users):
+    db.acquire_user_leases(replica_id="a", user_ids=[1, 2, 3], ttl=30)
+    assert db.release_user_leases(replica_id="a", keep=[2]) == 2
+    assert db.acquire_user_leases(replica_id="b", user_ids=[1, 2, 3], ttl=30) == [1, 3]
+
+
+def test_leases_expire_on_the_database_clock(db, session, users):
+    db.acquire_user_leases(replica_id="a", user_ids=[1], ttl=30)
+    lease = session.get(UserLease, 1)
+    assert abs((lease.expires_at - db._db_now()) - timedelta(seconds=30)) < timedelta(seconds=2)
+
+
+def test_live_replicas(db, users):
+    db.heartbeat_replica(replica_id="a")
+    assert db.get_live_replicas(ttl=30) == ["a"]
+    db.remove_replica(replica_id="a")
+    assert db.get_live_replicas(ttl=30) == []
+
+
+def test_rendezvous_owner_is_stable():
+    replicas = ["a", "b", "c"]
+    before = {uid: owner_of(uid, replicas) for uid in range(200)}
+    after = {uid: owner_of(uid, ["a", "b"]) for uid in range(200)}
+    # only c's users move
+    assert all(after[uid] == owner for uid, owner in before.items() if owner != "c")
+    assert owner_of(1, []) is None
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(sharding.time, "monotonic", clock)
+    return clock
+
+
+def coordinator(held: list[set[int]], lost: list) -> ShardCoordinator:
+    async def on_lost(user_ids):
+        lost.append(user_ids)
+
+    c = ShardCoordinator("a", heartbeat_interval=10, lease_ttl=30, lease_margin=5, on_lost=on_lost)
+    c._heartbeat = lambda: (frozenset(held.pop(0)), ["a"])
+    return c
+
+
+def test_ownership_lapses_without_heartbeats(clock):
+    lost = []
+    c = coordinator([{1, 2}], lost)
+    asyncio.run(c.heartbeat())
+    users = [type("U", (), {"id": i})() for i in (1, 2, 3)]
+    assert c.owns(1) and not c.owns(3)
+    assert [u.id for u in c.filter(users)] == [1, 2]
+
+    clock.now += 24.9
+    assert c.owns(1)
+    clock.now += 0.2                        # past lease_ttl - lease_margin
+    assert not c.owns(1)
+    assert c.filter(users) == []
+
+
+def test_lost_users_are_handed_over(clock):
+    lost = []
+    c = coordinator([{1, 2}, {2}], lost)
+    asyncio.run(c.heartbeat())
+    asyncio.run(c.heartbeat())
+    assert lost == [frozenset({1})]
+    assert not c.owns(1) and c.owns(2)
+
+
+def test_rejects_a_margin_without_room():
+    with pytest.raises(ValueError):
+        ShardCoordinator("a", heartbeat_interval=10, lease_ttl=30, lease_margin=20)
@@ -0,0 +1,62 @@
+from contextlib import nullcontext
+
+import pytest
+
+from database.models import Order
+from ib_manager import ib_connector
+from ib_manager.ib_connector import OrderFingerprints, sync_changed_orders
+
+
+def row(perm_id: int, status: str = "Submitted", filled: float = 0, runner_id=None, user_id: int = 1) -> dict:
+    return {
+        "user_id": user_id, "runner_id": runner_id, "ibkr_perm_id": perm_id, "symbol": "AAPL",
+        "action": "BUY", "order_type": "LMT", "quantity": 10, "limit_price": 100.0, "stop_price": None,
+        "status": status, "filled_quantity": filled, "avg_fill_price": 0.0, "account": "DU1",
+    }
+
+
+@pytest.fixture
+def seeds(db, monkeypatch) -> list[int]:
+    """Routes the module's own DBManager() to the test session; counts the seeding reads."""
+    seeded = []
+    get = db.get_order_fingerprints
+
+    def get_order_fingerprints(*, user_id):
+        seeded.append(user_id)
+        return get(user_id=user_id)
+
+    monkeypatch.setattr(db, "get_order_fingerprints", get_order_fingerprints)
+    monkeypatch.setattr(ib_connector, "DBManager", lambda: nullcontext(db))
+    monkeypatch.setattr(ib_connector, "order_fingerprints", OrderFingerprints())
+    return seeded
+
+
+def test_seeded_once_per_user_from_the_table(db, session, users, seeds):
+    session.add(Order(user_id=1, **{k: v for k, v in row(1, "Filled", 10).items() if k != "user_id"}))
+    session.commit()
+    prints = OrderFingerprints()
+
+    assert prints.changed([row(1, "Filled", 10)]) == []                     # as stored
+    assert prints.changed([row(1, "Filled", 10, user_id=2)]) != []          # other user's table
+    assert prints.changed([row(1, "Cancelled", 10), row(2)]) == [row(1, "Cancelled", 10), row(2)]
+    assert seeds == [1, 2]
+
+
+def test_runner_attribution_is_always_written(users, seeds):
+    prints = OrderFingerprints()
+    prints.remember([row(1)])
+    assert prints.changed([row(1)]) == []
+    assert prints.changed([row(1, runner_id=7)]) == [row(1, runner_id=7)]
+
+
+def test_sync_sends_only_changes(db, session, users, seeds):
+    assert sync_changed_orders(db, [row(1), row(2)]) == 2
+    assert sync_changed_orders(db, [row(1), row(2)]) == 0
+    assert sync_changed_orders(db, [row(1), row(2, "Filled", 10)]) == 1
+    assert session.query(Order).filter_by(ibkr_perm_id=2).one().status == "Filled"
+
+
+def test_a_failed_write_is_resent(db, users, seeds, monkeypatch):
+    monkeypatch.setattr(db, "sync_orders", lambda orders: False)
+    assert sync_changed_orders(db, [row(1)]) == 1
+    assert sync_changed_orders(db, [row(1)]) == 1                           # not remembered
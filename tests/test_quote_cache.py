@@ -0,0 +1,98 @@
+import asyncio
+import threading
+
+import pytest
+
+from ib_manager.quote_cache import QuoteCache
+
+
+class SlowFetch:
+    """Blocks in the worker thread until released; counts upstream calls."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.release = threading.Event()
+
+    def __call__(self, key):
+        self.calls += 1
+        self.release.wait(5)
+        return f"{key}-quote"
+
+
+def test_hits_within_ttl_and_none_is_not_cached():
+    calls = []
+    cache = QuoteCache(lambda k: calls.append(k) or (None if k == "X" else 1.0), ttl=60)
+    assert cache.get("A") == cache.get("A") == 1.0
+    assert cache.get("X") is None and cache.get("X") is None
+    assert calls == ["A", "X", "X"]
+    assert cache.hits == 1
+
+
+def test_lru_evicts_the_oldest():
+    cache = QuoteCache(lambda k: k, ttl=60, max_size=2)
+    cache.get("A"), cache.get("B"), cache.get("A"), cache.get("C")
+    assert list(cache._entries) == ["A", "C"]
+
+
+def test_concurrent_misses_share_one_fetch():
+    async def main():
+        fetch = SlowFetch()
+        cache = QuoteCache(fetch)
+        waiters = [asyncio.create_task(cache.get_async("A")) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        fetch.release.set()
+        assert await asyncio.gather(*waiters) == ["A-quote"] * 3
+        assert fetch.calls == 1 and cache.coalesced == 2
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("cancelled", [0, 1], ids=["leader", "follower"])
+def test_a_cancelled_caller_does_not_fail_the_others(cancelled):
+    async def main():
+        fetch = SlowFetch()
+        cache = QuoteCache(fetch)
+        waiters = [asyncio.create_task(cache.get_async("A")) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        waiters[cancelled].cancel()
+        await asyncio.sleep(0)
+        fetch.release.set()
+        rest = [w for i, w in enumerate(waiters) if i != cancelled]
+        assert await asyncio.gather(*rest) == ["A-quote"] * 2
+        assert waiters[cancelled].cancelled()
+        assert cache.get("A") == "A-quote"                   # stored for later callers too
+        assert fetch.calls == 1
+
+    asyncio.run(main())
+
+
+def test_a_failed_fetch_reaches_every_waiter_and_is_retried():
+    async def main():
+        calls = []
+
+        def fetch(key):
+            calls.append(key)
+            if len(calls) == 1:
+                raise ConnectionError("down")
+            return 2.0
+
+        cache = QuoteCache(fetch, ttl=60)
+        results = await asyncio.gather(*(cache.get_async("A") for _ in range(2)), return_exceptions=True)
+        assert all(isinstance(r, ConnectionError) for r in results)
+        assert await cache.get_async("A") == 2.0
+        assert len(calls) == 2
+
+    asyncio.run(main())
+
+
+def test_managers_only_share_quotes_fetched_with_their_key(monkeypatch):
+    from ib_manager import market_data_manager as mdm
+
+    cache = QuoteCache(lambda key: mdm._default_manager()._fetch_current_price(key[1]))
+    monkeypatch.setattr(mdm, "_quote_cache", cache)
+    monkeypatch.setattr(mdm, "_default", None)
+    monkeypatch.setattr(mdm, "FINNHUB", "default-key")
+    monkeypatch.setattr(mdm.MarketDataManager, "_fetch_current_price", lambda self, symbol: (self.api_key, symbol))
+
+    assert mdm.MarketDataManager().get_current_price("aapl") == ("default-key", "AAPL")
+    assert mdm.MarketDataManager("own-key").get_current_price("AAPL") == ("own-key", "AAPL")
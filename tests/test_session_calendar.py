@@ -0,0 +1,66 @@
+from datetime import date, datetime
+
+import pytz
+
+from ib_manager.session_calendar import EASTERN, SessionCalendar
+
+
+def et(*args) -> datetime:
+    return EASTERN.localize(datetime(*args))
+
+
+def test_regular_and_extended_hours():
+    cal = SessionCalendar(days=60)
+    assert cal.is_open(et(2024, 6, 12, 10, 0), extended=False)
+    assert not cal.is_open(et(2024, 6, 12, 8, 0), extended=False)
+    assert cal.is_open(et(2024, 6, 12, 8, 0))                       # pre-market
+    assert cal.is_open(et(2024, 6, 12, 19, 30))                     # post-market
+    assert not cal.is_open(et(2024, 6, 12, 20, 30))
+    assert not cal.is_open(et(2024, 6, 15, 12, 0))                  # Saturday
+
+
+def test_naive_timestamps_are_utc():
+    cal = SessionCalendar(days=60)
+    assert cal.is_open(datetime(2024, 6, 12, 14, 0), extended=False)    # 10:00 ET
+
+
+def test_holiday_and_early_close():
+    cal = SessionCalendar(days=60)
+    assert cal.session_for(date(2024, 7, 4)) is None
+    s = cal.session_for(date(2024, 7, 3))
+    assert s.early_close and s.close == et(2024, 7, 3, 13, 0)
+    assert not cal.is_open(et(2024, 7, 3, 14, 0), extended=False)
+    assert cal.next_open(et(2024, 7, 3, 14, 0)) == et(2024, 7, 5, 9, 30)
+    # post-market ends 4h after the early close
+    assert cal.is_open(et(2024, 7, 3, 16, 59))
+    assert not cal.is_open(et(2024, 7, 3, 17, 30))
+
+
+def test_next_open_and_close():
+    cal = SessionCalendar(days=60)
+    friday_evening = et(2024, 6, 14, 17, 0)
+    assert cal.next_open(friday_evening) == et(2024, 6, 17, 9, 30)
+    assert cal.next_open(friday_evening, extended=True) == et(2024, 6, 17, 4, 0)
+    assert cal.next_close(et(2024, 6, 14, 11, 0)) == et(2024, 6, 14, 16, 0)
+    assert cal.next_close(et(2024, 6, 14, 11, 0), extended=True) == et(2024, 6, 14, 20, 0)
+
+
+def test_dst_switch_keeps_wall_clock_hours():
+    cal = SessionCalendar(days=60)
+    # 2024-03-08 is EST, 2024-03-11 EDT: both open at 09:30 New York time
+    assert cal.session_for(date(2024, 3, 8)).open.utcoffset() != cal.session_for(date(2024, 3, 11)).open.utcoffset()
+    assert cal.session_for(date(2024, 3, 11)).open == et(2024, 3, 11, 9, 30)
+
+
+def test_table_grows_instead_of_moving(monkeypatch):
+    cal = SessionCalendar(days=30)
+    builds = []
+    build = cal._build
+    monkeypatch.setattr(cal, "_build", lambda start, end: (builds.append((start, end)), build(start, end)))
+
+    cal.session_for(date(2024, 6, 12))
+    cal.session_for(date(2023, 6, 12))                  # far back: extends the start
+    cal.session_for(date(2024, 6, 13))                  # still covered: no rebuild
+    cal.session_for(date(2023, 6, 13))
+    assert len(builds) == 2
+    assert builds[1][0] <= date(2023, 6, 12) and builds[1][1] == builds[0][1]
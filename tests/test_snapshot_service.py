@@ -0,0 +1,170 @@
+import asyncio
+from collections import namedtuple
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+import pytest
+
+from api_gateway import snapshot_service
+from api_gateway.snapshot_service import SnapshotError, SnapshotService
+from database.models import AccountSnapshot
+from database.snapshots import SNAPSHOT_REFRESH_INTERVAL, snapshot_values
+
+Row = namedtuple("Row", list(snapshot_values(0, {})))
+
+
+class User:
+    id = 1
+
+
+class Snapshots:
+    """`AsyncDBManager()` stand-in holding one user's latest snapshot."""
+
+    def __init__(self) -> None:
+        self.row = None
+
+    def __call__(self) -> "Snapshots":
+        return self
+
+    async def __aenter__(self) -> "Snapshots":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        pass
+
+    async def get_latest_snapshot_row(self, *, user_id):
+        return self.row
+
+    async def create_account_snapshot(self, *, user_id, snapshot_data):
+        values = snapshot_values(user_id, snapshot_data)
+        self.row = Row(**values)
+        return AccountSnapshot(id=1, **values)
+
+    def put(self, age: timedelta, net_liquidation: str = "old") -> None:
+        self.row = Row(**snapshot_values(1, {"NetLiquidation (USD)": net_liquidation}, datetime.utcnow() - age))
+
+
+class Gateway:
+    """IB side: counts account requests and answers when `answer` is set."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.answer = asyncio.Event()
+        self.data = {"NetLiquidation (USD)": "new"}
+
+    @asynccontextmanager
+    async def lease(self, user):
+        yield object()
+
+    def manager(self, user, *, ib):
+        gateway = self
+
+        class Manager:
+            async def get_account_information(self):
+                gateway.calls += 1
+                await gateway.answer.wait()
+                return gateway.data
+        return Manager()
+
+
+@pytest.fixture
+def setup(monkeypatch):
+    snapshots = Snapshots()
+    monkeypatch.setattr(snapshot_service, "AsyncDBManager", snapshots)
+
+    def make():
+        gateway = Gateway()
+        monkeypatch.setattr(snapshot_service, "IBBusinessManager", gateway.manager)
+        return SnapshotService(gateway), gateway
+    return snapshots, make
+
+
+def test_concurrent_misses_share_one_refresh(setup):
+    snapshots, make = setup
+
+    async def main():
+        service, gateway = make()
+        waiters = [asyncio.create_task(service.get(User)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        gateway.answer.set()
+        results = await asyncio.gather(*waiters)
+        assert gateway.calls == 1
+        assert {r["net_liquidation"] for r in results} == {"new"}
+
+    asyncio.run(main())
+
+
+def test_a_fresh_snapshot_is_served_as_is(setup):
+    snapshots, make = setup
+
+    async def main():
+        service, gateway = make()
+        snapshots.put(timedelta(0))
+        assert (await service.get(User))["net_liquidation"] == "old"
+        service.revalidate(User)
+        assert gateway.calls == 0
+
+    asyncio.run(main())
+
+
+def test_a_stale_snapshot_is_served_while_revalidating(setup):
+    snapshots, make = setup
+
+    async def main():
+        service, gateway = make()
+        snapshots.put(timedelta(seconds=2 * SNAPSHOT_REFRESH_INTERVAL))
+        gateway.answer.set()
+        assert (await service.get(User))["net_liquidation"] == "old"        # no wait for IB
+        assert (await service.get(User))["net_liquidation"] == "old"
+        await asyncio.sleep(0.01)
+        assert gateway.calls == 1
+        assert (await service.get(User))["net_liquidation"] == "new"
+
+    asyncio.run(main())
+
+
+def test_too_old_snapshots_wait_for_the_gateway(setup, monkeypatch):
+    snapshots, make = setup
+    monkeypatch.setattr(snapshot_service, "SNAPSHOT_MAX_STALE", timedelta(minutes=1))
+
+    async def main():
+        service, gateway = make()
+        snapshots.put(timedelta(hours=1))
+        gateway.answer.set()
+        assert (await service.get(User))["net_liquidation"] == "new"
+
+    asyncio.run(main())
+
+
+def test_a_failed_refresh_backs_off(setup):
+    snapshots, make = setup
+
+    async def main():
+        service, gateway = make()
+        gateway.data = {}
+        gateway.answer.set()
+        with pytest.raises(SnapshotError):
+            await service.get(User)
+
+        snapshots.put(timedelta(seconds=2 * SNAPSHOT_REFRESH_INTERVAL))
+        await service.get(User)                     # stale, but within the retry pause
+        await asyncio.sleep(0.01)
+        assert gateway.calls == 1
+
+    asyncio.run(main())
+
+
+def test_a_hung_up_client_does_not_cancel_the_refresh(setup):
+    snapshots, make = setup
+
+    async def main():
+        service, gateway = make()
+        first = asyncio.create_task(service.get(User))
+        second = asyncio.create_task(service.get(User))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        gateway.answer.set()
+        assert (await second)["net_liquidation"] == "new"
+        assert gateway.calls == 1
+
+    asyncio.run(main())
@@ -0,0 +1,56 @@
+import numpy as np
+
+from strategy_engine.strategy_manager import StrategyManager, closed_bars, resample
+
+BOUNDARY = 1_718_200_800            # 2024-06-12 14:00 UTC, a 15-minute boundary
+
+
+def minute_bars(start: int, count: int) -> dict:
+    t = start + 60 * np.arange(count)
+    c = np.arange(count, dtype=float) + 100
+    return {"s": "ok", "t": t, "o": c, "h": c + 1, "l": c - 1, "c": c, "v": np.ones(count)}
+
+
+class MarketData:
+    """Serves 1-minute bars as candles of the asked resolution, the forming one included."""
+
+    def __init__(self, bars: dict) -> None:
+        self.bars = bars
+
+    def get_historical_candles(self, symbol, resolution, count):
+        return {"s": "ok", **resample(self.bars, int(resolution) * 60)}
+
+
+def test_the_forming_bar_is_dropped():
+    # 45 closed minutes plus the first minute of the bar that opened at BOUNDARY
+    bars = minute_bars(BOUNDARY - 45 * 60, 46)
+    frame = StrategyManager(MarketData(bars)).load_frame("AAPL", 15, now=BOUNDARY + 2)
+    assert list(frame.t) == [BOUNDARY - 45 * 60, BOUNDARY - 30 * 60, BOUNDARY - 15 * 60]
+    assert frame.c[-1] == 144                        # close of the last closed minute
+
+
+def test_the_forming_bar_is_dropped_after_resampling():
+    bars = minute_bars(BOUNDARY - 240 * 60, 241)      # 2-hour frames from hourly candles
+    frame = StrategyManager(MarketData(bars)).load_frame("AAPL", 120, now=BOUNDARY + 2)
+    assert list(frame.t) == [BOUNDARY - 240 * 60, BOUNDARY - 120 * 60]
+
+
+def test_a_closed_last_bar_is_kept():
+    bars = minute_bars(BOUNDARY - 5 * 60, 5)
+    frame = StrategyManager(MarketData(bars)).load_frame("AAPL", 5, now=BOUNDARY + 2)
+    assert len(frame) == 1 and frame.t[-1] == BOUNDARY - 5 * 60
+
+
+def test_closed_bars_on_unaggregated_candles():
+    bars = minute_bars(BOUNDARY - 3 * 60, 4)
+    assert list(closed_bars(bars, 1, BOUNDARY + 2)["t"]) == [BOUNDARY - 180, BOUNDARY - 120, BOUNDARY - 60]
+    assert len(closed_bars(bars, 1, BOUNDARY + 60)["t"]) == 4
+    assert len(closed_bars(minute_bars(0, 0), 1, BOUNDARY)["t"]) == 0
+
+
+def test_resample_aggregates_ohlcv():
+    out = resample(minute_bars(BOUNDARY, 10), 5 * 60)
+    assert list(out["t"]) == [BOUNDARY, BOUNDARY + 300]
+    assert list(out["o"]) == [100, 105] and list(out["c"]) == [104, 109]
+    assert list(out["h"]) == [105, 110] and list(out["l"]) == [99, 104]
+    assert list(out["v"]) == [5, 5]
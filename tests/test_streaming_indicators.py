@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from strategy_engine import indicators as batch
+from strategy_engine.indicators import IndicatorFrame
+from strategy_engine.streaming_indicators import (
+    ATR, EMA, MACD, RSI, SMA, VWAP, Bollinger, RingBuffer, RollingMax, RollingMin, StreamingFrame,
+)
+
+rng = np.random.default_rng(7)
+N = 600
+T = 1_700_000_000 + np.arange(N) * 300
+C = 100 + np.cumsum(rng.normal(0, 0.5, N))
+H = C + rng.uniform(0, 1, N)
+L = C - rng.uniform(0, 1, N)
+V = rng.uniform(1e3, 1e5, N)
+BARS = {"t": T, "o": C, "h": H, "l": L, "c": C, "v": V}
+
+
+def run(ind, *cols):
+    return np.array([ind.update(*row) for row in zip(*cols)], dtype=np.float64)
+
+
+@pytest.mark.parametrize("name, got, want", [
+    ("SMA", lambda: run(SMA(20), C), lambda: batch.sma(C, 20)),
+    ("EMA", lambda: run(EMA(20), C), lambda: batch.ema(C, 20)),
+    ("RSI", lambda: run(RSI(14), C), lambda: batch.rsi(C, 14)),
+    ("ATR", lambda: run(ATR(14), H, L, C), lambda: batch.atr(H, L, C, 14)),
+    ("MACD", lambda: run(MACD(), C), lambda: np.column_stack(batch.macd(C))),
+    ("Bollinger", lambda: run(Bollinger(), C), lambda: np.column_stack(batch.bollinger(C))),
+    ("VWAP", lambda: run(VWAP(), T, H, L, C, V), lambda: batch.vwap(T, H, L, C, V)),
+    ("Max", lambda: run(RollingMax(50), H), lambda: batch.rolling_max(H, 50)),
+    ("Min", lambda: run(RollingMin(50), L), lambda: batch.rolling_min(L, 50)),
+])
+def test_incremental_matches_batch(name, got, want):
+    np.testing.assert_allclose(got(), want(), rtol=1e-9, atol=1e-9, err_msg=name)
+
+
+def test_ring_buffer_returns_what_it_evicts():
+    ring = RingBuffer(3)
+    assert [ring.push(x) for x in (1, 2, 3, 4, 5)][3:] == [1, 2]
+    assert list(ring.values()) == [3, 4, 5]
+
+
+def stream(seed: int, keep: int) -> StreamingFrame:
+    return StreamingFrame({k: v[:seed] for k, v in BARS.items()}, keep=keep)
+
+
+def append_from(frame: StreamingFrame, start: int) -> None:
+    for i in range(start, N):
+        assert frame.append(T[i], C[i], H[i], L[i], C[i], V[i])
+
+
+def test_series_survive_compaction():
+    # seeded with 100 bars, 500 appends: the columns (2 * keep) compact many times
+    frame = stream(100, keep=60)
+    ema, rsi, atr = frame.ema(20), frame.rsi(14), frame.atr(14)     # fed from here on
+    assert len(ema) == 60
+    append_from(frame, 100)
+
+    full = IndicatorFrame(BARS)
+    assert len(frame) == 60
+    np.testing.assert_array_equal(frame.t, T[-60:])
+    np.testing.assert_array_equal(frame.c, C[-60:])
+    np.testing.assert_allclose(frame.ema(20), full.ema(20)[-60:], rtol=1e-9)
+    np.testing.assert_allclose(frame.rsi(14), full.rsi(14)[-60:], rtol=1e-9)
+    np.testing.assert_allclose(frame.atr(14), full.atr(14)[-60:], rtol=1e-9)
+
+
+def test_windowed_series_asked_for_late_are_replayed():
+    frame = stream(100, keep=60)
+    append_from(frame, 100)
+    full = IndicatorFrame(BARS)
+    np.testing.assert_allclose(frame.sma(20), full.sma(20)[-60:], rtol=1e-9)
+    levels = frame.fib(30, (0.382, 0.618))
+    for r, series in full.fib(30, (0.382, 0.618)).items():
+        np.testing.assert_allclose(levels[r], series[-60:], rtol=1e-9)
+
+
+def test_append_ignores_bars_that_are_not_newer():
+    frame = stream(10, keep=20)
+    assert not frame.append(T[9], 1, 1, 1, 1, 1)
+    assert not frame.append(T[5], 1, 1, 1, 1, 1)
+    assert len(frame) == 10 and frame.c[-1] == C[9]
+
+
+def test_views_are_read_only():
+    frame = stream(10, keep=20)
+    with pytest.raises(ValueError):
+        frame.c[0] = 0
+    with pytest.raises(ValueError):
+        frame.ema(5)[0] = 0
+
+
+def test_an_empty_seed_fills_up():
+    frame = StreamingFrame({c: np.empty(0) for c in StreamingFrame.COLUMNS}, keep=5)
+    assert len(frame) == 0 and len(frame.sma(3)) == 0
+    for i in range(8):
+        frame.append(T[i], C[i], H[i], L[i], C[i], V[i])
+    np.testing.assert_allclose(frame.sma(3), batch.sma(C[:8], 3)[-5:])
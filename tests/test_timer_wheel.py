@@ -0,0 +1,56 @@
+from runner_scheduler.timer_wheel import TimerWheel
+
+
+def fired(wheel: TimerWheel, now: float) -> list:
+    return [t.payload for t in wheel.advance(now)]
+
+
+def test_fires_on_its_tick_in_order():
+    wheel = TimerWheel(now=0)
+    wheel.schedule(5, "b")
+    wheel.schedule(3, "a")
+    wheel.schedule(5.5, "c")                # rounds up to tick 6
+    assert len(wheel) == 3
+    assert fired(wheel, 2) == []
+    assert fired(wheel, 5) == ["a", "b"]
+    assert fired(wheel, 6) == ["c"]
+    assert len(wheel) == 0
+
+
+def test_past_deadline_fires_on_next_tick():
+    wheel = TimerWheel(now=100)
+    wheel.schedule(50, "late")
+    assert fired(wheel, 101) == ["late"]
+
+
+def test_cancel():
+    wheel = TimerWheel(now=0)
+    keep = wheel.schedule(4, "keep")
+    drop = wheel.schedule(4, "drop")
+    wheel.cancel(drop)
+    wheel.cancel(drop)                      # twice is harmless
+    assert len(wheel) == 1
+    assert fired(wheel, 10) == ["keep"]
+    wheel.cancel(keep)                      # already fired: no-op
+    assert len(wheel) == 0
+
+
+def test_cascades_through_levels_and_overflow():
+    wheel = TimerWheel(now=0, levels=(4, 4))          # 16 ticks before the overflow list
+    deadlines = [1, 3, 4, 7, 15, 16, 17, 40, 63, 64, 100]
+    for d in deadlines:
+        wheel.schedule(d, d)
+    assert wheel.overflow                               # some did not fit the wheels
+    got = []
+    for now in range(0, 101):
+        expired = wheel.advance(now)
+        assert all(t.due == now for t in expired)
+        got.extend(t.payload for t in expired)
+    assert got == deadlines
+
+
+def test_large_jump_fires_everything_in_tick_order():
+    wheel = TimerWheel(now=0, tick=60)
+    for d in (3600, 60, 86_400, 600):
+        wheel.schedule(d, d)
+    assert fired(wheel, 86_400) == [60, 600, 3600, 86_400]
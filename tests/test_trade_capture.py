@@ -0,0 +1,151 @@
+import asyncio
+import logging
+
+import pytest
+from eventkit import Event
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from ib_manager import trade_event_capture as capture
+from ib_manager.trade_event_capture import BatchingWriter, TradeCaptureHub
+
+
+class Database:
+    """Stands in for `BatchingWriter._write`; rejects rows whose perm id is in `bad`."""
+
+    def __init__(self) -> None:
+        self.orders: dict[int, dict] = {}
+        self.trades: dict[tuple, dict] = {}
+        self.bad: set[int] = set()
+        self.down = False
+        self.writes = 0
+
+    def __call__(self, orders, trades) -> None:
+        self.writes += 1
+        if self.down:
+            raise OperationalError("INSERT", {}, ConnectionError("server closed the connection"))
+        if any(r["ibkr_perm_id"] in self.bad for r in orders) or any(r["perm_id"] in self.bad for r in trades):
+            raise IntegrityError("INSERT", {}, ValueError("violates constraint"))
+        self.orders.update((r["ibkr_perm_id"], r) for r in orders)
+        self.trades.update(((r["perm_id"], r["fill_time"]), r) for r in trades)
+
+
+@pytest.fixture
+def database(monkeypatch) -> Database:
+    database = Database()
+    monkeypatch.setattr(BatchingWriter, "_write", staticmethod(database))
+    return database
+
+
+def order(perm_id: int, status: str = "Submitted") -> dict:
+    return {"ibkr_perm_id": perm_id, "status": status}
+
+
+def trade(perm_id: int, fill_time: int = 0) -> dict:
+    return {"perm_id": perm_id, "fill_time": fill_time}
+
+
+def test_updates_of_one_order_collapse(database):
+    writer = BatchingWriter()
+    writer.put_order(order(1, "Submitted"))
+    writer.put_order(order(1, "Filled"))
+    writer.put_trade(trade(1))
+    asyncio.run(writer.flush())
+    assert database.writes == 1
+    assert database.orders == {1: order(1, "Filled")}
+    assert list(database.trades) == [(1, 0)]
+
+
+def test_a_rejected_row_is_isolated(database):
+    database.bad = {5}
+    writer = BatchingWriter()
+    for perm_id in range(1, 9):
+        writer.put_order(order(perm_id))
+        writer.put_trade(trade(perm_id))
+    asyncio.run(writer.flush())
+
+    assert sorted(database.orders) == [1, 2, 3, 4, 6, 7, 8]
+    assert len(database.trades) == 7
+    # only the two rows of order 5 wait for the next flush
+    assert list(writer._orders) == [5] and list(writer._trades) == [(5, 0)]
+    assert writer._failed_flushes == 1
+
+
+def test_transient_errors_retry_the_whole_batch(database):
+    database.down = True
+    writer = BatchingWriter()
+    writer.put_order(order(1))
+    writer.put_trade(trade(1))
+    asyncio.run(writer.flush())
+    assert database.writes == 1                             # no bisecting a dead connection
+    assert list(writer._orders) == [1] and writer._failed_flushes == 1
+    assert writer._backoff() == writer.flush_interval * 2
+
+    database.down = False
+    asyncio.run(writer.flush())
+    assert sorted(database.orders) == [1] and writer._failed_flushes == 0
+    assert writer._attempts == {}
+
+
+def test_newer_rows_win_over_a_retried_one(database):
+    database.down = True
+    writer = BatchingWriter()
+    writer.put_order(order(1, "Submitted"))
+
+    async def main():
+        flush = asyncio.create_task(writer.flush())
+        await asyncio.sleep(0)                              # batch taken, write in flight
+        writer.put_order(order(1, "Filled"))
+        await flush
+
+    asyncio.run(main())
+    assert writer._orders == {1: order(1, "Filled")}
+
+
+def test_rows_failing_every_retry_are_dead_lettered(database, monkeypatch, caplog):
+    monkeypatch.setattr(capture, "CAPTURE_MAX_RETRIES", 3)
+    database.bad = {7}
+    writer = BatchingWriter()
+    writer.put_order(order(7))
+    with caplog.at_level(logging.ERROR, logger=capture.dead_letter.name):
+        for _ in range(3):
+            asyncio.run(writer.flush())
+
+    assert writer._orders == {} and writer._attempts == {}
+    [record] = [r for r in caplog.records if r.name == capture.dead_letter.name]
+    assert '"kind": "order"' in record.getMessage() and "IntegrityError" in record.getMessage()
+
+
+class FakeIB:
+    def __init__(self) -> None:
+        self.orderStatusEvent = Event()
+        self.execDetailsEvent = Event()
+        self.commissionReportEvent = Event()
+        self.connectedEvent = Event()
+
+
+class User:
+    id = 1
+
+
+@pytest.mark.parametrize("succeeds", [True, False])
+def test_catch_up_clears_needs_sync_only_on_success(succeeds):
+    calls = []
+
+    async def catch_up(user, ib):
+        calls.append(user.id)
+        return succeeds
+
+    async def main():
+        hub = TradeCaptureHub(BatchingWriter(), catch_up=catch_up)
+        ib = FakeIB()
+        assert hub.ensure(User, ib)                         # just attached: sync due
+        hub.synced(User.id)
+        assert not hub.ensure(User, ib)
+
+        ib.connectedEvent.emit()
+        assert not hub.ensure(User, ib)                     # the catch-up is running
+        await asyncio.sleep(0.01)
+        assert calls == [1]
+        assert hub.ensure(User, ib) is not succeeds
+
+    asyncio.run(main())